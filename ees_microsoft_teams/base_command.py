@@ -10,10 +10,8 @@
     objects and methods that will can be used by commands.
 """
 
-import csv
 import functools
 import logging
-import os
 
 try:
     from functools import cached_property
@@ -27,12 +25,17 @@ from elastic_enterprise_search import __version__
 from packaging import version
 
 from .configuration import Configuration
+from .connector_queue import ConnectorQueue
+from .document_fingerprints import DocumentFingerprintStore
 from .local_storage import LocalStorage
 from .microsoft_teams_calendars import MSTeamsCalendar
 from .microsoft_teams_channels import MSTeamsChannels
 from .microsoft_teams_user_messages import MSTeamsUserMessage
+from .microsoft_teams_users import MSTeamsUsers
 from .msal_access_token import MSALAccessToken
 from .permission_sync_command import PermissionSyncCommand
+from .user_drive_cache import UserDriveCache
+from .user_mapping import get_user_mapping
 
 ENTERPRISE_V8 = version.parse("8.0")
 
@@ -116,11 +119,60 @@ class BaseCommand:
                     )
         return documents
 
+    def create_connector_queue(self):
+        """Get the queue shared by the producer and the consumer, bounded by the configured number of items and
+        bytes, or spilling the items beyond the configured bytes to the disk"""
+        return ConnectorQueue(
+            self.logger,
+            self.config.get_value("queue_max_size"),
+            self.config.get_value("queue_max_bytes"),
+            self.config.get_value("queue_spill_directory"),
+        )
+
+    def start_producer_and_consumer(self, queue):
+        """Runs the producer and the consumer of the command concurrently, so that the documents are indexed while
+        the remaining documents are fetched from Microsoft Teams
+        :param queue: Shared queue between the producer and the consumer
+        """
+        try:
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                consumer = executor.submit(self.start_consumer, queue)
+                # The producer must not wait for a consumer which has stopped
+                consumer.add_done_callback(lambda _: queue.release())
+                try:
+                    self.start_producer(queue)
+                except Exception:
+                    # Stop the consumer after it indexes the documents already fetched
+                    for _ in range(self.config.get_value("enterprise_search_sync_thread_count")):
+                        queue.end_signal()
+                    raise
+            consumer.result()
+        finally:
+            queue.close()
+
     @cached_property
     def local_storage(self):
         """Get the object for local storage to fetch and update ids stored locally"""
         return LocalStorage(self.logger)
 
+    @cached_property
+    def user_drive_cache(self):
+        """Get the object for caching the user drives used to fetch the user chat attachments"""
+        return UserDriveCache(self.logger, self.config.get_value("user_drive_cache_ttl"))
+
+    @cached_property
+    def document_fingerprint_store(self):
+        """Get the store of the fingerprints of the indexed documents, None when the unchanged documents are indexed
+        again"""
+        if self.config.get_value("skip_unchanged_documents"):
+            return DocumentFingerprintStore(self.logger, self.local_storage)
+        return None
+
+    @cached_property
+    def user_directory(self):
+        """Get the object for fetching the users, shared by the calendars and the permissions of a run"""
+        return MSTeamsUsers(self.get_access_token(is_acquire_for_client=True), self.logger, self.config)
+
     def get_access_token(self, is_acquire_for_client=False):
         """Get access token for fetching the data
         :param is_acquire_for_client: Flag for fetching the access token
@@ -142,40 +194,23 @@ class BaseCommand:
     def microsoft_calendar_object(self, access_token):
         """Get the object for fetching the calendar related data"""
         return MSTeamsCalendar(
-            access_token, self.logger, self.config, self.local_storage
+            access_token, self.logger, self.config, self.local_storage, self.user_directory
         )
 
+    @property
+    def user_mapping(self):
+        """Get the index of the users mapped in the CSV file, shared by all the objects of a run"""
+        return get_user_mapping(self.logger, self.config.get_value("microsoft_teams.user_mapping"))
+
     def get_mapped_users(self):
         """Returns mapped users from the CSV file
         """
-        rows = {}
-        mapping_sheet_path = self.config.get_value("microsoft_teams.user_mapping")
-        if (
-            mapping_sheet_path and os.path.exists(mapping_sheet_path) and os.path.getsize(mapping_sheet_path) > 0
-        ):
-            with open(mapping_sheet_path, encoding="UTF-8") as file:
-                for row in csv.reader(file):
-                    rows[row[0]] = row[1]
-        return rows
-
-    def manage_permissions(self, object_permissions, ws_user, ws_permissions):
-        """Returns the permissions differs from Workplace Search
-        :param object_permissions: Permissions of the Microsoft Teams Object
-        :param ws_user: Workplace Search user
-        :param ws_permissions: Workplace Search permissions of a user
-        """
-        mapped_users = self.get_mapped_users()
-        for ms_team_user, permissions in object_permissions.items():
-            ms_team_user = mapped_users.get(ms_team_user, ms_team_user)
-            if ms_team_user.lower() == ws_user.lower():
-                ws_permissions = set(ws_permissions).difference(permissions)
-        return list(ws_permissions)
+        return self.user_mapping.get_mapped_users()
 
     def remove_object_permissions(self, end_time):
         """Remove the permissions of the users removed from the Microsoft Teams objects
         :param end_time: End time to fetch the permissions
         """
-        deleted_permissions_list = []
         microsoft_teams_object = self.microsoft_team_channel_object(
             self.get_access_token()
         )
@@ -188,40 +223,13 @@ class BaseCommand:
 
         teams_permissions = microsoft_teams_object.get_team_members()
         user_chats_permissions, _ = user_chat_object.get_user_chats([])
-        calendar_permissions, _ = calendar_object.get_calendars([], self.config.get_value('start_time'), end_time)
+        # A user skipped on error would have all of its calendar permissions removed
+        calendar_permissions, _ = calendar_object.get_calendars(
+            [], self.config.get_value('start_time'), end_time, is_error_ignored=False
+        )
 
-        ws_user_permissions = PermissionSyncCommand(
+        PermissionSyncCommand(
             self.logger, self.config, self.workplace_search_custom_client
-        ).list_user_permissions()
-
-        for ws_user, ws_permissions in ws_user_permissions.items():
-            actual_permissions = ws_permissions
-            ws_permissions = self.manage_permissions(teams_permissions, ws_user, ws_permissions)
-            ws_permissions = self.manage_permissions(user_chats_permissions, ws_user, ws_permissions)
-            ws_permissions = self.manage_permissions(calendar_permissions, ws_user, ws_permissions)
-            deleted_permissions_list.append({"user": ws_user, "actual_permissions": actual_permissions,
-                                            "deleted_permissions": ws_permissions})
-        for permission_dict in deleted_permissions_list:
-            if permission_dict["deleted_permissions"]:
-                if self.version >= ENTERPRISE_V8:
-                    self.workplace_search_custom_client.remove_permissions(
-                        {
-                            "external_user_properties": [{'attribute_value': permission_dict['user']}],
-                            "permissions": permission_dict['deleted_permissions']
-                        }
-                    )
-                else:
-                    self.workplace_search_custom_client.remove_permissions(
-                        {"user": permission_dict['user'], "permissions": permission_dict['deleted_permissions']}
-                    )
-                self.workplace_search_custom_client.add_permissions(
-                    permission_dict['user'],
-                    list(set(permission_dict['actual_permissions']) - set(permission_dict['deleted_permissions']))
-                )
-                self.logger.debug(
-                    f"Removed permissions for {permission_dict['user']} from the Workplace Search"
-                )
-            else:
-                self.logger.debug(
-                    f"No permission found for {permission_dict['user']} to remove from Workplace Search"
-                )
+        ).reconcile_permissions(
+            [teams_permissions, user_chats_permissions, calendar_permissions], self.user_mapping
+        )
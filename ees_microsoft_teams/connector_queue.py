@@ -3,16 +3,137 @@
 # or more contributor license agreements. Licensed under the Elastic License 2.0;
 # you may not use this file except in compliance with the Elastic License 2.0.
 #
+import gzip
+import json
+import os
+import shutil
+import tempfile
 import threading
+from collections import deque
 from queue import Queue
 
+SEGMENT_SIZE = 8 * 1024 * 1024  # Size in bytes of the JSON encoded items written into a segment file
+
 
 class ConnectorQueue(Queue):
-    """Class to support additional queue operations specific to the connector"""
+    """Class to support additional queue operations specific to the connector.
+
+    The queue is bounded by the number of items and by the size of the JSON encoded items, so that the producers
+    wait for the consumers when the indexing falls behind. When a spill directory is given, the producers never wait
+    and the items exceeding the byte limit are written into compressed segment files instead, which are read back
+    in the same order.
+    """
 
-    def __init__(self, logger):
-        super(ConnectorQueue, self).__init__()
+    def __init__(self, logger, max_size=0, max_bytes=0, spill_directory=None):
+        super(ConnectorQueue, self).__init__(maxsize=max_size)
         self.logger = logger
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.spill_directory = (
+            tempfile.mkdtemp(prefix="connector_queue_", dir=spill_directory) if spill_directory else None
+        )
+        self.segments = deque()
+        self.open_segment = None
+        self.spilled_count = 0
+        self.segment_index = 0
+
+    def _init(self, maxsize):
+        self.queue = deque()
+
+    def _qsize(self):
+        return len(self.queue) + self.spilled_count
+
+    def _put(self, item):
+        # Once an item is spilled, the following items are spilled as well to keep them in order
+        if self.spill_directory and (
+            self.spilled_count or (self.max_bytes > 0 and self.total_bytes + item[1] > self.max_bytes)
+        ):
+            self.spill(*item)
+            return
+        self.total_bytes += item[1]
+        self.queue.append(item)
+
+    def _get(self):
+        if not self.queue:
+            self.load_segment()
+        item, size = self.queue.popleft()
+        self.total_bytes -= size
+        return item
+
+    def spill(self, item, size):
+        """Writes an item into the open segment file, which is closed once it reaches the segment size
+        :param item: Item to write into the segment file
+        :param size: Size of the JSON encoded item
+        """
+        if not self.open_segment:
+            path = os.path.join(self.spill_directory, f"segment_{self.segment_index:08d}.jsonl.gz")
+            self.segment_index += 1
+            self.open_segment = {"file": gzip.open(path, "wt", encoding="utf-8"), "path": path, "count": 0, "bytes": 0}
+        self.open_segment["file"].write(json.dumps(item, default=str) + "\n")
+        self.open_segment["count"] += 1
+        self.open_segment["bytes"] += size
+        self.spilled_count += 1
+        if self.open_segment["bytes"] >= SEGMENT_SIZE:
+            self.close_open_segment()
+
+    def close_open_segment(self):
+        """Closes the open segment file so that it can be read by the consumers"""
+        self.open_segment["file"].close()
+        self.segments.append((self.open_segment["path"], self.open_segment["count"]))
+        self.open_segment = None
+
+    def load_segment(self):
+        """Reads the oldest segment file into the memory and removes it from the disk"""
+        if not self.segments:
+            self.close_open_segment()
+        path, count = self.segments.popleft()
+        with gzip.open(path, "rt", encoding="utf-8") as segment_file:
+            for line in segment_file:
+                size = len(line) - 1
+                self.queue.append((json.loads(line), size))
+                self.total_bytes += size
+        os.remove(path)
+        self.spilled_count -= count
+        self.logger.debug(f"Loaded {count} items of the queue from the segment file {path}")
+
+    def close(self):
+        """Removes the segment files which are not consumed"""
+        with self.mutex:
+            if self.open_segment:
+                self.open_segment["file"].close()
+                self.open_segment = None
+            if self.spill_directory:
+                shutil.rmtree(self.spill_directory, ignore_errors=True)
+
+    def is_full(self, size):
+        """Checks if an item of the given size has to wait for the consumers. An item larger than the byte limit is
+        accepted once the queue is empty
+        :param size: Size of the JSON encoded item
+        """
+        if self.spill_directory:
+            return False
+        if self.maxsize > 0 and self._qsize() >= self.maxsize:
+            return True
+        return self.max_bytes > 0 and self._qsize() > 0 and self.total_bytes + size > self.max_bytes
+
+    def put(self, item):
+        """Put an item into the queue, waiting while the queue is full
+        :param item: Item to put into the queue
+        """
+        size = len(json.dumps(item, default=str))
+        with self.not_full:
+            while self.is_full(size):
+                self.not_full.wait()
+            self._put((item, size))
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def release(self):
+        """Removes the bounds of the queue so that the producers do not wait for the consumers which have stopped"""
+        with self.not_full:
+            self.maxsize = 0
+            self.max_bytes = 0
+            self.not_full.notify_all()
 
     def end_signal(self):
         """Send an terminate signal to indicate the queue can be closed"""
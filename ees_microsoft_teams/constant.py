@@ -30,12 +30,14 @@ DRIVE = "Drive"
 # Constants for user chats and its children objects
 CHATS = "Chats"
 USER_CHATS_MESSAGE = "User Chat Messages"
+USER_CHATS_MESSAGE_EXPORT = "User Chat Messages Export"
 USER_CHAT_TABS = "User Chat Tabs"
 USER_CHAT_DRIVE_ITEM = "User Chat Drive Item"
 USER_CHAT_DRIVE = "User Chat Drive"
 
 # Constants for calendar events
 USER = "User"
+USERS = "Users"
 CALENDAR = "Calendar"
 
 # Common Constants
@@ -47,9 +49,14 @@ MIMETYPES = [
     "audio/3gpp", "video/3gpp", "video/3gpp2", "audio/3gpp2"]
 CURRENT_TIME = (datetime.datetime.utcnow()).strftime("%Y-%m-%dT%H:%M:%SZ")
 DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+CALENDAR_VIEW_DAYS_AHEAD = 365  # Days after the sync for which the calendar events are tracked by delta sync
 
 # Constants for local storage
 LOCAL_STORAGE_DIRECTORY = os.path.join(os.path.dirname(__file__), "doc_ids")
+DOC_ID_STORAGE_PATH = os.path.join(LOCAL_STORAGE_DIRECTORY, "microsoft_teams_doc_ids.db")
 USER_CHAT_DELETION_PATH = os.path.join(LOCAL_STORAGE_DIRECTORY, "microsoft_teams_user_chat_doc_ids.json")
 CALENDAR_CHAT_DELETION_PATH = os.path.join(LOCAL_STORAGE_DIRECTORY, "microsoft_teams_calendar_doc_ids.json")
 CHANNEL_CHAT_DELETION_PATH = os.path.join(LOCAL_STORAGE_DIRECTORY, "microsoft_teams_channel_chat_doc_ids.json")
+USER_DRIVE_CACHE_PATH = os.path.join(LOCAL_STORAGE_DIRECTORY, "microsoft_teams_user_drives.json")
+USER_DIRECTORY_PATH = os.path.join(LOCAL_STORAGE_DIRECTORY, "microsoft_teams_users.json")
+CALENDAR_DELTA_LINKS_PATH = os.path.join(LOCAL_STORAGE_DIRECTORY, "microsoft_teams_calendar_delta_links.json")
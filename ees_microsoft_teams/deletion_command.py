@@ -7,9 +7,8 @@
 """
 from . import constant
 from .base_command import BaseCommand
-from .msal_access_token import MSALAccessToken
 from .sync_microsoft_teams import SyncMicrosoftTeams
-from .utils import split_documents_into_equal_chunks, is_document_in_present_data
+from .utils import split_documents_into_equal_chunks
 
 
 class DeletionCommand(BaseCommand):
@@ -66,7 +65,7 @@ class DeletionCommand(BaseCommand):
             if "channel_messages" in configuration_objects:
                 channel_messages = self.create_and_execute_jobs(
                     thread_count, sync_ms_teams_obj.fetch_channel_messages_for_deletion,
-                    (microsoft_teams_object, start_time, end_time, []),
+                    (microsoft_teams_object, start_time, end_time),
                     channels_partition_list
                 )
                 live_data.extend(channel_messages)
@@ -74,7 +73,7 @@ class DeletionCommand(BaseCommand):
             if "channel_tabs" in configuration_objects:
                 channel_tabs = self.create_and_execute_jobs(
                     thread_count, sync_ms_teams_obj.fetch_channel_tabs_for_deletion,
-                    (microsoft_teams_object, start_time, end_time, []),
+                    (microsoft_teams_object, start_time, end_time),
                     channels_partition_list
                 )
                 live_data.extend(channel_tabs)
@@ -82,7 +81,7 @@ class DeletionCommand(BaseCommand):
             if "channel_documents" in configuration_objects:
                 channel_documents = self.create_and_execute_jobs(
                     thread_count, sync_ms_teams_obj.fetch_channel_documents_for_deletion,
-                    (microsoft_teams_object, start_time, end_time, []),
+                    (microsoft_teams_object, start_time, end_time),
                     teams_partition_list
                 )
                 live_data.extend(channel_documents)
@@ -92,17 +91,15 @@ class DeletionCommand(BaseCommand):
             )
 
             queue.append_to_queue("deletion", list(delete_keys_documents))
-            storage_with_collection["global_keys"] = list(global_keys_documents)
-            storage_with_collection["delete_keys"] = []
             self.local_storage.update_storage(storage_with_collection, "teams")
 
         except Exception as exception:
             self.logger.exception(f"Error while deleting the teams or it's objects data. Error: {exception}")
         self.logger.info("Completed deleting of teams and it's objects data to the Workplace Search")
 
-    def create_jobs_for_user_chats(self, thread_count, start_time, end_time, queue):
-        """Creates jobs for deleting the user chats and its children objects
-        :param thread_count: Thread count to make partitions
+    def create_jobs_for_user_chats(self, start_time, end_time, queue):
+        """Creates jobs for deleting the user chats and its children objects. The chats are listed in a single
+        thread pool bounded by the sync thread count
         :param start_time: Start time for fetching the data
         :param end_time: End time for fetching the data
         :param queue: Shared queue for storing the data
@@ -116,19 +113,10 @@ class DeletionCommand(BaseCommand):
         sync_ms_teams_obj = SyncMicrosoftTeams("deletion_sync", self.config, self.logger, queue)
 
         try:
-            user_drive = {}
             _, chats = user_chat_object.get_user_chats(ids_list=[])
-            chats_partition_list = split_documents_into_equal_chunks(chats, thread_count)
-
-            user_attachment_token = MSALAccessToken(self.logger, self.config)
-            user_attachment_token = user_attachment_token.get_token(
-                is_acquire_for_client=True
-            )
-
-            chat_messages_documents = self.create_and_execute_jobs(
-                thread_count, sync_ms_teams_obj.fetch_user_chat_messages_for_deletion,
-                (user_chat_object, [], user_drive, start_time, end_time, user_attachment_token),
-                chats_partition_list
+            # A chat whose ids could not be listed raises, so that its objects are not deleted
+            chat_messages_documents = sync_ms_teams_obj.fetch_user_chat_messages_for_deletion(
+                user_chat_object, start_time, end_time, chats
             )
 
             deleted_data = storage_with_collection.get("delete_keys") or []
@@ -139,8 +127,6 @@ class DeletionCommand(BaseCommand):
                 chat_messages_documents, deleted_data, delete_keys_documents, global_keys_documents, "", ""
             )
             queue.append_to_queue("deletion", list(delete_keys_documents))
-            storage_with_collection["global_keys"] = list(global_keys_documents)
-            storage_with_collection["delete_keys"] = []
             self.local_storage.update_storage(storage_with_collection, "user_chats")
 
         except Exception as exception:
@@ -159,11 +145,19 @@ class DeletionCommand(BaseCommand):
         if "calendar" not in self.config.get_value("object_type_to_index"):
             return
 
+        if self.config.get_value("enable_calendar_delta_sync"):
+            self.logger.info(
+                "Skipping the deletion of the calendar events as the deleted events are removed by the calendar "
+                "delta sync"
+            )
+            return
+
         self.logger.debug("Started deleting the calendar events from Microsoft Teams...")
         storage_with_collection = self.local_storage.get_documents_from_doc_id_storage("calendar")
         try:
             calendar_object = self.microsoft_calendar_object(self.get_access_token(is_acquire_for_client=True))
-            _, documents = calendar_object.get_calendars(ids_list=[], start_time=start_time, end_time=end_time)
+            # A user skipped on error would have all of its calendar events deleted
+            documents = calendar_object.get_calendar_ids(start_time, end_time)
 
             deleted_data = storage_with_collection.get("delete_keys") or []
             global_keys_documents = storage_with_collection.get("global_keys") or []
@@ -173,8 +167,6 @@ class DeletionCommand(BaseCommand):
                 documents, deleted_data, delete_keys_documents, global_keys_documents, "", ""
             )
             queue.append_to_queue("deletion", list(delete_keys_documents))
-            storage_with_collection["global_keys"] = list(global_keys_documents)
-            storage_with_collection["delete_keys"] = []
             self.local_storage.update_storage(storage_with_collection, "calendar")
 
         except Exception as exception:
@@ -184,32 +176,36 @@ class DeletionCommand(BaseCommand):
     def remove_deleted_documents_from_global_keys(
         self, live_documents, list_ids_documents, deleted_documents, global_keys_documents, parent_id, super_parent_id
     ):
-        """ Updates the local storage with removing the keys that were deleted from Microsoft Teams
+        """ Updates the local storage with removing the keys that were deleted from Microsoft Teams. The documents are
+            traversed from the parent id down to their descendants through an index of the children by their parent id
             :param live_documents: Documents present in Microsoft Teams
-            :param list_ids_documents: Documents present in respective doc_ids.json files
+            :param list_ids_documents: Documents present in the doc-id storage, streamed once to index them by parent
             :param deleted_documents: Document list that were deleted from Microsoft Teams
-            :param global_keys_documents: Document list that are present in doc_ids.json
-            :param parent_id: Parent id of the document
+            :param global_keys_documents: Store or list of the documents of the doc-id storage, the deleted
+                documents are removed from it
+            :param parent_id: Parent id of the documents to start the traversal from
             :param super_parent_id: Super parent id of the document
         """
-        parent_items = list(filter(lambda seq: is_document_in_present_data(
-            seq, parent_id, "parent_id"), list_ids_documents))
-        for item in parent_items:
+        live_ids = {document["id"] for document in live_documents}
+        children_by_parent = {}
+        for item in list_ids_documents:
+            children_by_parent.setdefault(item["parent_id"], []).append(item)
+
+        removed_documents = []
+        expanded_parents = {parent_id}
+        stack = list(reversed(children_by_parent.get(parent_id, [])))
+        while stack:
+            item = stack.pop()
             item_id = item["id"]
-            parent_id = item["parent_id"]
-            super_parent_id = item["super_parent_id"]
-            type = item["type"]
-            present_items = list(filter(
-                lambda seq: is_document_in_present_data(seq, item_id, "id"), live_documents))
-            if(len(present_items) == 0 and type not in [
+            if item_id not in live_ids and item["type"] not in [
                     constant.CHATS, constant.USER, constant.USER_CHAT_DRIVE, constant.USER_CHAT_DRIVE_ITEM,
-                    constant.CHANNEL_DRIVE, constant.CHANNEL_ROOT, constant.CHANNEL_DRIVE_ITEM]):
+                    constant.CHANNEL_DRIVE, constant.CHANNEL_ROOT, constant.CHANNEL_DRIVE_ITEM]:
                 deleted_documents.append(item_id)
-                if item in global_keys_documents:
-                    global_keys_documents.remove(item)
+                removed_documents.append(item)
 
-            # Recursively call the function
-            self.remove_deleted_documents_from_global_keys(
-                live_documents, list_ids_documents, deleted_documents, global_keys_documents, item_id,
-                super_parent_id
-            )
+            # The children of a document are visited once even if the document is stored under several parents
+            if item_id not in expanded_parents:
+                expanded_parents.add(item_id)
+                stack.extend(reversed(children_by_parent.get(item_id, [])))
+
+        self.local_storage.remove_documents_from_doc_id_storage(global_keys_documents, removed_documents)
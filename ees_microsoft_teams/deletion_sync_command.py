@@ -10,7 +10,6 @@
 """
 from . import constant
 from .deletion_command import DeletionCommand
-from .connector_queue import ConnectorQueue
 from .sync_enterprise_search import SyncEnterpriseSearch
 
 INDEXING_TYPE = "full"
@@ -31,7 +30,7 @@ class DeletionSyncCommand(DeletionCommand):
         end_time = constant.CURRENT_TIME
 
         self.create_jobs_for_teams(thread_count, start_time, end_time, queue)
-        self.create_jobs_for_user_chats(thread_count, start_time, end_time, queue)
+        self.create_jobs_for_user_chats(start_time, end_time, queue)
         self.create_jobs_for_calendars(start_time, end_time, queue)
 
         for _ in range(self.config.get_value("enterprise_search_sync_thread_count")):
@@ -46,7 +45,7 @@ class DeletionSyncCommand(DeletionCommand):
 
         thread_count = self.config.get_value("enterprise_search_sync_thread_count")
         sync_es = SyncEnterpriseSearch(
-            self.config, self.logger, self.workplace_search_custom_client, queue
+            self.config, self.logger, self.workplace_search_custom_client, queue, self.document_fingerprint_store
         )
 
         self.create_and_execute_jobs(thread_count, sync_es.perform_sync, (), [])
@@ -55,7 +54,6 @@ class DeletionSyncCommand(DeletionCommand):
     def execute(self):
         """This function execute the start function.
         """
-        queue = ConnectorQueue(self.logger)
-        self.start_producer(queue)
-        self.start_consumer(queue)
+        queue = self.create_connector_queue()
+        self.start_producer_and_consumer(queue)
         self.logger.info("Completed Deletion sync")
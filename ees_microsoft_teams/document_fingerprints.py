@@ -0,0 +1,80 @@
+#
+# Copyright Elasticsearch B.V. and/or licensed to Elasticsearch B.V. under one
+# or more contributor license agreements. Licensed under the Elastic License 2.0;
+# you may not use this file except in compliance with the Elastic License 2.0.
+#
+"""This module stores the fingerprints of the documents indexed into the Workplace Search.
+
+    A fingerprint is a hash of the document as it is sent to the Workplace Search, including its
+    permissions, so the documents which did not change since they were indexed can be skipped. The
+    fingerprints are kept in a table of the doc-id database keyed by the document id, so only the
+    rows of the indexed and deleted documents are written and the fingerprints are never loaded at once.
+"""
+import hashlib
+import json
+import sqlite3
+
+
+def get_document_fingerprint(document):
+    """Returns a stable hash of a document. The keys and the permissions are sorted so the fingerprint does
+    not depend on their order
+    :param document: Document to be indexed
+    """
+    document = dict(document)
+    if document.get("_allow_permissions"):
+        document["_allow_permissions"] = sorted(document["_allow_permissions"], key=str)
+    payload = json.dumps(document, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).digest()
+
+
+class DocumentFingerprintStore:
+    """This class stores the fingerprints of the indexed documents by their id in the doc-id database"""
+
+    def __init__(self, logger, local_storage):
+        self.logger = logger
+        self.local_storage = local_storage
+
+    def is_unchanged(self, document_id, fingerprint):
+        """Checks if a document was already indexed with the same fingerprint
+        :param document_id: Id of the document
+        :param fingerprint: Fingerprint of the document to be indexed
+        """
+        connection = self.local_storage.get_connection()
+        with self.local_storage.lock:
+            row = connection.execute(
+                "SELECT fingerprint FROM fingerprints WHERE id = ?", (str(document_id),)
+            ).fetchone()
+        return row is not None and row[0] == fingerprint
+
+    def update(self, fingerprints):
+        """Stores the fingerprints of the documents indexed successfully. A fingerprint which could not be stored
+        only makes its document indexed again by the next sync
+        :param fingerprints: Dictionary of document id with its fingerprint
+        """
+        self.execute(
+            "INSERT OR REPLACE INTO fingerprints VALUES (?, ?)",
+            [(str(document_id), fingerprint) for document_id, fingerprint in fingerprints.items()],
+        )
+
+    def remove(self, document_ids):
+        """Removes the fingerprints of the deleted documents so they are indexed again if they are recreated
+        :param document_ids: Ids of the documents deleted from the Workplace Search
+        """
+        self.execute(
+            "DELETE FROM fingerprints WHERE id = ?", [(str(document_id),) for document_id in document_ids]
+        )
+
+    def execute(self, statement, rows):
+        """Executes a statement for the rows in a single transaction
+        :param statement: Statement taking the id and the fingerprint of a document as its parameters
+        :param rows: List of the parameters of the statement
+        """
+        if not rows:
+            return
+        connection = self.local_storage.get_connection()
+        try:
+            with self.local_storage.lock:
+                with connection:
+                    connection.executemany(statement, rows)
+        except sqlite3.Error as exception:
+            self.logger.exception(f"Error while updating the document fingerprints. Error: {exception}")
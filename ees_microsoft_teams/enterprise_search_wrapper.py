@@ -5,11 +5,15 @@
 #
 """This module perform operations related to Enterprise Search based on the Enterprise Search version
 """
+import threading
+import time
+
 import elastic_transport
-from elastic_enterprise_search import WorkplaceSearch, __version__
+from elastic_enterprise_search import PayloadTooLargeError, WorkplaceSearch, __version__
 from packaging import version
 
 ENTERPRISE_V8 = version.parse("8.0")
+PERMISSION_PAGE_SIZE = 100
 
 
 class EnterpriseSearchWrapper:
@@ -21,26 +25,46 @@ class EnterpriseSearchWrapper:
         self.host = config.get_value("enterprise_search.host_url")
         self.api_key = config.get_value("enterprise_search.api_key")
         self.ws_source = config.get_value("enterprise_search.source_id")
+        # Every batch in flight gets its own connection, kept alive in the pool for the next batches
+        self.connections_per_node = config.get_value("enterprise_search_sync_thread_count") * config.get_value(
+            "enterprise_search_indexing_concurrency"
+        )
         if self.version >= ENTERPRISE_V8:
             if hasattr(args, "user") and args.user:
-                self.workplace_search_client = WorkplaceSearch(
+                self.workplace_search_client = self.create_workplace_search_client(
                     self.host, basic_auth=(args.user, args.password)
                 )
             else:
-                self.workplace_search_client = WorkplaceSearch(
+                self.workplace_search_client = self.create_workplace_search_client(
                     self.host,
                     bearer_auth=self.api_key,
                 )
         else:
             if hasattr(args, "user") and args.user:
-                self.workplace_search_client = WorkplaceSearch(
+                self.workplace_search_client = self.create_workplace_search_client(
                     f"{self.host}/api/ws/v1/sources",
                     http_auth=(args.user, args.password),
                 )
             else:
-                self.workplace_search_client = WorkplaceSearch(
+                self.workplace_search_client = self.create_workplace_search_client(
                     f"{self.host}/api/ws/v1/sources", http_auth=self.api_key
                 )
+        self.indexing_metrics = {"batches": 0, "documents": 0, "total_latency": 0.0, "max_latency": 0.0}
+        self.indexing_metrics_lock = threading.Lock()
+
+    def create_workplace_search_client(self, host, **auth):
+        """Creates the Workplace Search client with a connection pool sized for the batches indexed in parallel
+        :param host: Url of the Workplace Search
+        :param auth: Authentication arguments of the client
+        """
+        try:
+            return WorkplaceSearch(host, connections_per_node=self.connections_per_node, **auth)
+        except TypeError as exception:
+            self.logger.warning(
+                "Could not size the connection pool of the Workplace Search client, using the default pool. "
+                f"Error: {exception}"
+            )
+            return WorkplaceSearch(host, **auth)
 
     def add_permissions(self, user_name, permission_list):
         """Add one or more permission for a given user. Permissions are added atop the existing.
@@ -98,20 +122,32 @@ class EnterpriseSearchWrapper:
             )
 
     def list_permissions(self):
-        """List permissions for one or all users"""
-        user_permission = []
+        """List permissions for all users, fetching every page of the permissions
+        Returns:
+            user_permission: Dictionary containing the permissions of all the users in its results
+        """
+        user_permission = {"results": []}
         try:
-            if self.version >= ENTERPRISE_V8:
-                user_permission = self.workplace_search_client.list_external_identities(
-                    content_source_id=self.ws_source
-                )
-            else:
-                try:
-                    user_permission = self.workplace_search_client.list_permissions(
-                        content_source_id=self.ws_source,
+            current_page = 1
+            while True:
+                if self.version >= ENTERPRISE_V8:
+                    response = self.workplace_search_client.list_external_identities(
+                        content_source_id=self.ws_source, current_page=current_page, page_size=PERMISSION_PAGE_SIZE
                     )
-                except elastic_transport.exceptions.NotFoundError:
-                    raise ValueError("Incompatible version")
+                else:
+                    try:
+                        response = self.workplace_search_client.list_permissions(
+                            content_source_id=self.ws_source,
+                            current_page=current_page,
+                            page_size=PERMISSION_PAGE_SIZE,
+                        )
+                    except elastic_transport.exceptions.NotFoundError:
+                        raise ValueError("Incompatible version")
+                user_permission["results"].extend(response.get("results") or [])
+                total_pages = ((response.get("meta") or {}).get("page") or {}).get("total_pages") or 1
+                if current_page >= total_pages:
+                    break
+                current_page += 1
             self.logger.info(
                 "Successfully retrieves all permissions from the workplace"
             )
@@ -122,6 +158,7 @@ class EnterpriseSearchWrapper:
             self.logger.exception(
                 f"Error while retrieving the permissions from the workplace. Error: {exception}"
             )
+            user_permission = {"results": []}
         return user_permission
 
     def remove_permissions(self, permission):
@@ -207,13 +244,41 @@ class EnterpriseSearchWrapper:
         :param documents: list of documents to be indexed
         :param timeout: Timeout in seconds
         """
+        started_at = time.perf_counter()
         try:
             responses = self.workplace_search_client.index_documents(
                 content_source_id=self.ws_source,
                 documents=documents,
                 request_timeout=timeout,
             )
+        except PayloadTooLargeError:
+            # The caller splits the documents into smaller requests
+            raise
         except Exception as exception:
             self.logger.exception(f"Error while indexing the files. Error: {exception}")
             raise
+        self.record_indexing_latency(len(documents), time.perf_counter() - started_at)
         return responses
+
+    def record_indexing_latency(self, document_count, latency):
+        """Records the time taken to index a batch of documents
+        :param document_count: Number of documents in the batch
+        :param latency: Time taken to index the batch in seconds
+        """
+        self.logger.debug(f"Indexed a batch of {document_count} documents in {latency:.3f} seconds")
+        with self.indexing_metrics_lock:
+            self.indexing_metrics["batches"] += 1
+            self.indexing_metrics["documents"] += document_count
+            self.indexing_metrics["total_latency"] += latency
+            self.indexing_metrics["max_latency"] = max(self.indexing_metrics["max_latency"], latency)
+
+    def log_indexing_metrics(self):
+        """Logs the number of batches indexed and the time taken to index them"""
+        with self.indexing_metrics_lock:
+            metrics = dict(self.indexing_metrics)
+        if metrics["batches"]:
+            self.logger.info(
+                f"Indexed {metrics['documents']} documents in {metrics['batches']} batches. Average batch latency: "
+                f"{metrics['total_latency'] / metrics['batches']:.3f} seconds, maximum batch latency: "
+                f"{metrics['max_latency']:.3f} seconds"
+            )
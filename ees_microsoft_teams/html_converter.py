@@ -0,0 +1,110 @@
+#
+# Copyright Elasticsearch B.V. and/or licensed to Elasticsearch B.V. under one
+# or more contributor license agreements. Licensed under the Elastic License 2.0;
+# you may not use this file except in compliance with the Elastic License 2.0.
+#
+"""This module converts the HTML body of the Microsoft Teams messages into plain text.
+
+    Most of the message bodies are either plain text or use a handful of simple tags such
+    as div, p, at-mentions and emojis. Those are handled without building a parse tree, and
+    any content the fast paths can not convert exactly is handed over to BeautifulSoup.
+"""
+import re
+
+from bs4 import BeautifulSoup
+
+# Tags whose content is plain text for BeautifulSoup's html.parser, so that dropping the tag
+# markup gives the same text as walking the parse tree
+TEAMS_MARKUP_TAGS = frozenset([
+    "a", "at", "attachment", "b", "blockquote", "br", "code", "del", "div", "em", "emoji", "font", "h1", "h2",
+    "h3", "h4", "h5", "h6", "hr", "i", "img", "ins", "li", "ol", "p", "s", "span", "strike", "strong", "sub",
+    "sup", "table", "tbody", "td", "tfoot", "th", "thead", "tr", "u", "ul",
+])
+
+# Character references supported by the fast path, any other reference falls back to BeautifulSoup
+CHARACTER_REFERENCES = {
+    "&amp;": "&",
+    "&lt;": "<",
+    "&gt;": ">",
+    "&quot;": '"',
+    "&apos;": "'",
+    "&#39;": "'",
+    "&nbsp;": "\xa0",
+    "&#160;": "\xa0",
+}
+
+TAG_PATTERN = re.compile(
+    r"<(/?)([a-zA-Z][a-zA-Z0-9]*)"
+    r"(?:\s+[^\s\"'<>/=]+(?:\s*=\s*(?:\"[^\"]*\"|'[^']*'|[^\s\"'<>=`]+))?)*"
+    r"\s*/?>"
+)
+CHARACTER_REFERENCE_PATTERN = re.compile(r"&[#a-zA-Z][#a-zA-Z0-9]*;?")
+
+# Characters making up the whitespace-only strings which BeautifulSoup collapses into a single space or new line
+ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+
+
+def convert_with_beautiful_soup(content):
+    """Converts the HTML content into text by parsing it with BeautifulSoup
+    :param content: HTML content to be converted
+    Returns:
+        text: Text of the HTML content
+    """
+    soup = BeautifulSoup(content, "html.parser")
+    return soup.get_text().strip()
+
+
+def collapse_whitespace(text):
+    """Collapses the text between two tags the way BeautifulSoup does, i.e. a text made of ASCII spaces only is
+    replaced by a new line if it contains one, by a single space otherwise
+    :param text: Text between two tags
+    """
+    if not text or text.strip(ASCII_SPACES):
+        return text
+    return "\n" if "\n" in text else " "
+
+
+def strip_teams_markup(content):
+    """Removes the common Microsoft Teams markup from the content in a single pass
+    :param content: HTML content to be converted
+    Returns:
+        text: Text of the HTML content or None if the content contains markup not supported by the fast path
+    """
+    parts = []
+    position = 0
+    for tag in TAG_PATTERN.finditer(content):
+        if tag.group(2).lower() not in TEAMS_MARKUP_TAGS:
+            return None
+        parts.append(collapse_whitespace(content[position: tag.start()]))
+        position = tag.end()
+    parts.append(collapse_whitespace(content[position:]))
+    text = "".join(parts)
+
+    # Left over angle brackets are comments, declarations or malformed tags
+    if "<" in text:
+        return None
+    if "&" in text:
+        for reference in CHARACTER_REFERENCE_PATTERN.findall(text):
+            if reference not in CHARACTER_REFERENCES:
+                return None
+        text = CHARACTER_REFERENCE_PATTERN.sub(lambda reference: CHARACTER_REFERENCES[reference.group(0)], text)
+    return text
+
+
+def convert_html_to_text(content):
+    """Converts the HTML content of a Microsoft Teams message into text
+    :param content: HTML content to be converted
+    Returns:
+        text: Text of the HTML content
+    """
+    if not isinstance(content, str):
+        return convert_with_beautiful_soup(content)
+
+    # Plain text messages do not need any conversion
+    if "<" not in content and "&" not in content:
+        return content.strip()
+
+    text = strip_teams_markup(content)
+    if text is None:
+        return convert_with_beautiful_soup(content)
+    return text.strip()
@@ -15,7 +15,6 @@ from collections import defaultdict
 
 from . import constant
 from .checkpointing import Checkpoint
-from .connector_queue import ConnectorQueue
 from .sync_enterprise_search import SyncEnterpriseSearch
 from .sync_microsoft_teams import SyncMicrosoftTeams
 from .ingest_command import IngestCommand
@@ -66,7 +65,6 @@ class IncrementalSyncCommand(IngestCommand):
         self.create_jobs_for_user_chats(
             INDEXING_TYPE,
             sync_microsoft_teams,
-            thread_count,
             user_chats_start_time,
             user_chats_end_time,
             queue
@@ -92,10 +90,12 @@ class IncrementalSyncCommand(IngestCommand):
 
         thread_count = self.config.get_value("enterprise_search_sync_thread_count")
         sync_es = SyncEnterpriseSearch(
-            self.config, self.logger, self.workplace_search_custom_client, queue
+            self.config, self.logger, self.workplace_search_custom_client, queue, self.document_fingerprint_store
         )
 
         self.create_and_execute_jobs(thread_count, sync_es.perform_sync, (), [])
+        sync_es.log_indexing_result()
+        self.workplace_search_custom_client.log_indexing_metrics()
         self.logger.info("Completed indexing of the Microsoft Teams objects")
 
         # The reason for adding all the permissions in every run rather than appending the latest changes is
@@ -113,9 +113,8 @@ class IncrementalSyncCommand(IngestCommand):
 
     def execute(self):
         """This function execute the start function."""
-        queue = ConnectorQueue(self.logger)
+        queue = self.create_connector_queue()
         self.local_storage.create_local_storage_directory()
 
-        self.start_producer(queue)
-        self.start_consumer(queue)
+        self.start_producer_and_consumer(queue)
         self.logger.info("Completed Incremental sync")
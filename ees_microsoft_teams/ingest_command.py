@@ -5,14 +5,79 @@
 #
 """This module is used to create multithreading jobs for Microsoft Teams objects.
 """
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
 from .base_command import BaseCommand
 from .msal_access_token import MSALAccessToken
-from .utils import split_documents_into_equal_chunks
 
 
 class IngestCommand(BaseCommand):
     """ This class creates the multithreading jobs for Teams, User Chats and Calendars objects
     """
+    def create_and_execute_pipelined_jobs_for_teams(
+        self,
+        thread_count,
+        sync_microsoft_teams,
+        microsoft_teams_object,
+        start_time,
+        end_time,
+        ids_list,
+        teams,
+    ):
+        """Creates a thread pool in which the children objects of every team are fetched as soon as they are
+        discovered. The channels of a team are followed by the jobs for its channel messages and tabs without
+        waiting for the channels of the remaining teams.
+        :param thread_count: Total number of threads to be spawned
+        :param sync_microsoft_teams: Object for fetching the Microsoft Teams object
+        :param microsoft_teams_object: Object for fetching the teams and its children
+        :param start_time: Start time for fetching the data
+        :param end_time: End time for fetching the data
+        :param ids_list: Document ids list from respective doc id file
+        :param teams: List of teams to fetch the children objects
+        """
+        configuration_objects = self.config.get_value("object_type_to_index")
+        with ThreadPoolExecutor(max_workers=thread_count) as executor:
+            channel_jobs = set()
+            pending_jobs = set()
+            for team in teams:
+                channel_job = executor.submit(
+                    sync_microsoft_teams.fetch_channels, microsoft_teams_object, ids_list, [team]
+                )
+                channel_jobs.add(channel_job)
+                pending_jobs.add(channel_job)
+                if "channel_documents" in configuration_objects:
+                    pending_jobs.add(executor.submit(
+                        sync_microsoft_teams.fetch_channel_documents,
+                        microsoft_teams_object, start_time, end_time, ids_list, [team]
+                    ))
+
+            while pending_jobs:
+                completed_jobs, pending_jobs = wait(pending_jobs, return_when=FIRST_COMPLETED)
+                for job in completed_jobs:
+                    try:
+                        channels = job.result()
+                    except Exception as exception:
+                        self.logger.exception(
+                            f"Error while fetching the data from Microsoft Teams. Error {exception}"
+                        )
+                        continue
+                    if job not in channel_jobs or not channels:
+                        continue
+                    for channels_by_team in channels:
+                        for team_id, channel_list in channels_by_team.items():
+                            for channel in channel_list:
+                                team_channels = [{team_id: [channel]}]
+                                if "channel_messages" in configuration_objects:
+                                    pending_jobs.add(executor.submit(
+                                        sync_microsoft_teams.fetch_channel_messages,
+                                        microsoft_teams_object, start_time, end_time, ids_list, team_channels
+                                    ))
+                                if "channel_tabs" in configuration_objects:
+                                    pending_jobs.add(executor.submit(
+                                        sync_microsoft_teams.fetch_channel_tabs,
+                                        microsoft_teams_object, start_time, end_time, ids_list, team_channels
+                                    ))
+
     def create_jobs_for_teams(
         self,
         indexing_type,
@@ -56,66 +121,16 @@ class IngestCommand(BaseCommand):
 
             teams = sync_microsoft_teams.fetch_teams(microsoft_teams_object, ids_list)
 
-            configuration_objects = self.config.get_value("object_type_to_index")
-
-            teams_partition_list = split_documents_into_equal_chunks(
-                teams, thread_count
-            )
-
-            channels = self.create_and_execute_jobs(
+            self.create_and_execute_pipelined_jobs_for_teams(
                 thread_count,
-                sync_microsoft_teams.fetch_channels,
-                (
-                    microsoft_teams_object,
-                    ids_list
-                ),
-                teams_partition_list,
+                sync_microsoft_teams,
+                microsoft_teams_object,
+                start_time,
+                end_time,
+                ids_list,
+                teams,
             )
 
-            channels_partition_list = split_documents_into_equal_chunks(
-                channels, thread_count
-            )
-
-            if "channel_messages" in configuration_objects:
-                self.create_and_execute_jobs(
-                    thread_count,
-                    sync_microsoft_teams.fetch_channel_messages,
-                    (
-                        microsoft_teams_object,
-                        start_time,
-                        end_time,
-                        ids_list
-                    ),
-                    channels_partition_list,
-                )
-
-            if "channel_tabs" in configuration_objects:
-                self.create_and_execute_jobs(
-                    thread_count,
-                    sync_microsoft_teams.fetch_channel_tabs,
-                    (
-                        microsoft_teams_object,
-                        start_time,
-                        end_time,
-                        ids_list
-                    ),
-                    channels_partition_list,
-                )
-
-            if "channel_documents" in configuration_objects:
-                self.create_and_execute_jobs(
-                    thread_count,
-                    sync_microsoft_teams.fetch_channel_documents,
-                    (
-                        microsoft_teams_object,
-                        start_time,
-                        end_time,
-                        ids_list
-                    ),
-                    teams_partition_list,
-                )
-
-            storage_with_collection["global_keys"] = list(ids_list)
             self.local_storage.update_storage(
                 storage_with_collection, "teams"
             )
@@ -134,15 +149,14 @@ class IngestCommand(BaseCommand):
         self,
         indexing_type,
         sync_microsoft_teams,
-        thread_count,
         start_time,
         end_time,
         queue,
     ):
-        """Creates jobs for fetching the user chats and its children objects
+        """Creates jobs for fetching the user chats and its children objects. The chats are fetched in a single
+        thread pool bounded by the sync thread count
         :param indexing_type: The type of the indexing i.e. Full or Incremental
         :param sync_microsoft_teams: Object for fetching the Microsoft Teams object
-        :param thread_count: Thread count to make partitions
         :param start_time: Start time for fetching the data
         :param end_time: End time for fetching the data
         :param queue: Shared queue for storing the data
@@ -170,34 +184,35 @@ class IngestCommand(BaseCommand):
             if self.config.get_value("enable_document_permission"):
                 sync_microsoft_teams.sync_permissions(user_permissions)
 
-            chats_partition_list = split_documents_into_equal_chunks(
-                chats, thread_count
-            )
+            chats = user_chat_object.get_active_chats(chats, start_time)
 
             user_attachment_token = MSALAccessToken(self.logger, self.config)
             user_attachment_token = user_attachment_token.get_token(
                 is_acquire_for_client=True
             )
-            user_drive = {}
+            user_drive = self.user_drive_cache
 
-            self.create_and_execute_jobs(
-                thread_count,
-                sync_microsoft_teams.fetch_user_chat_messages,
-                (
-                    user_chat_object,
-                    ids_list,
-                    user_drive,
-                    start_time,
-                    end_time,
-                    user_attachment_token,
-                ),
-                chats_partition_list,
+            exported_chat_messages = {}
+            if self.config.get_value("enable_chat_messages_export"):
+                exported_chat_messages = user_chat_object.get_exported_chat_messages(
+                    chats, start_time, end_time, user_attachment_token
+                )
+
+            sync_microsoft_teams.fetch_user_chat_messages(
+                user_chat_object,
+                ids_list,
+                user_drive,
+                start_time,
+                end_time,
+                user_attachment_token,
+                exported_chat_messages,
+                chats,
             )
 
-            storage_with_collection["global_keys"] = list(ids_list)
             self.local_storage.update_storage(
                 storage_with_collection, "user_chats"
             )
+            user_drive.save()
 
             self.logger.debug("Saving the checkpoint for User Chats")
             queue.put_checkpoint("user_chats", end_time, indexing_type)
@@ -230,17 +245,26 @@ class IngestCommand(BaseCommand):
             calendar_object = self.microsoft_calendar_object(
                 self.get_access_token(is_acquire_for_client=True)
             )
-            calendar_permissions = sync_microsoft_teams.fetch_calendars(
-                calendar_object, ids_list, start_time, end_time
-            )
+            is_delta_sync_enabled = self.config.get_value("enable_calendar_delta_sync")
+            if is_delta_sync_enabled:
+                # The full sync fetches all the events of the calendar view again to reset the delta links
+                delta_links = calendar_object.load_delta_links() if indexing_type == "incremental" else {}
+                calendar_permissions = sync_microsoft_teams.fetch_calendar_changes(
+                    calendar_object, ids_list, delta_links
+                )
+            else:
+                calendar_permissions = sync_microsoft_teams.fetch_calendars(
+                    calendar_object, ids_list, start_time, end_time
+                )
 
             if self.config.get_value("enable_document_permission"):
                 sync_microsoft_teams.sync_permissions(calendar_permissions)
 
-            storage_with_collection["global_keys"] = list(ids_list)
             self.local_storage.update_storage(
                 storage_with_collection, "calendar"
             )
+            if is_delta_sync_enabled:
+                calendar_object.save_delta_links(delta_links)
 
             self.logger.debug("Saving the checkpoint for Calendars")
             queue.put_checkpoint("calendar", end_time, indexing_type)
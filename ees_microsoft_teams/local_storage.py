@@ -3,60 +3,329 @@
 # or more contributor license agreements. Licensed under the Elastic License 2.0;
 # you may not use this file except in compliance with the Elastic License 2.0.
 #
-import copy
+"""This module stores the ids of the documents fetched from Microsoft Teams, used to find the deleted documents.
+
+    The ids are kept in an embedded SQLite database in WAL mode, keyed by the object type and the
+    document entry. The object types, document types and parent ids repeated by many entries are stored
+    once in a dictionary of strings and referenced by their integer id. The database is read through
+    memory mapping. The ids stored in the JSON files of the previous versions are migrated on the first load.
+    The entries are never loaded at once: the new entries are written through in batches and the stored
+    entries are streamed from the database. The database also holds the fingerprints of the indexed documents.
+"""
 import json
 import os
+import sqlite3
+import threading
 
 from . import constant
 
+DOCUMENT_FIELDS = ("id", "type", "parent_id", "super_parent_id")
+FETCH_SIZE = 10000  # Number of rows read at once while iterating over the stored ids
+MMAP_SIZE = 1 << 30  # Maximum number of bytes of the database read through memory mapping
+# Version of the database layout, the version 1 stored the strings in every entry, the version 2 had no index
+# of the entries by their parent and the version 3 had no fingerprints of the indexed documents
+SCHEMA_VERSION = 4
+
+
+def get_document_id_key(item):
+    """Returns the key identifying an entry of the doc-id storage
+    :param item: Dictionary containing the id, type, parent id and super parent id of a document
+    """
+    return tuple(str(item.get(field) or "") for field in DOCUMENT_FIELDS)
+
+
+class DocumentIdStore:
+    """Doc-id entries of an object type kept in the doc-id database. The entries added by the many threads crawling
+    Microsoft Teams are written to the database in batches, and iterating over the store streams the stored entries,
+    so the entries of an object type are never held in memory at once"""
+
+    def __init__(self, local_storage, object_type):
+        self.local_storage = local_storage
+        self.object_type = object_type
+        self.lock = threading.Lock()
+        self.pending_keys = set()
+
+    def add(self, item):
+        """Adds an entry, writing the pending entries to the database once a batch is complete
+        :param item: Dictionary containing the id, type, parent id and super parent id of a document
+        """
+        with self.lock:
+            self.pending_keys.add(get_document_id_key(item))
+            if len(self.pending_keys) < FETCH_SIZE:
+                return
+            keys, self.pending_keys = self.pending_keys, set()
+        self.local_storage.upsert_keys(self.object_type, keys)
+
+    def flush(self):
+        """Writes the pending entries to the database"""
+        with self.lock:
+            keys, self.pending_keys = self.pending_keys, set()
+        if keys:
+            self.local_storage.upsert_keys(self.object_type, keys)
+
+    def iterate(self, type=None, parent_id=None):
+        """Streams the stored entries, optionally only the entries of a type or of a parent
+        :param type: Type of the entries, all the types when it is None
+        :param parent_id: Parent id of the entries, all the parents when it is None
+        """
+        self.flush()
+        return self.local_storage.iterate_documents(self.object_type, type, parent_id)
+
+    def remove(self, documents):
+        """Removes the entries from the database
+        :param documents: List of dictionaries containing the id, type, parent id and super parent id of a document
+        """
+        self.flush()
+        self.local_storage.remove_documents(self.object_type, documents)
+
+    def __iter__(self):
+        return self.iterate()
+
 
 class LocalStorage:
-    """This class contains all the methods to do operations on doc_id json file"""
+    """This class contains all the methods to do operations on the doc-id storage"""
 
-    def __init__(self, logger):
+    def __init__(self, logger, storage_path=constant.DOC_ID_STORAGE_PATH):
         self.logger = logger
+        self.storage_path = storage_path
+        # Paths of the JSON files used by the previous versions, migrated into the database
         self.ids_path_dict = {
             "teams": constant.CHANNEL_CHAT_DELETION_PATH,
             "user_chats": constant.USER_CHAT_DELETION_PATH,
             "calendar": constant.CALENDAR_CHAT_DELETION_PATH
         }
+        self.lock = threading.Lock()
+        self.connection = None
+        self.string_ids = {}
 
-    def load_storage(self, object_type):
-        """This method fetches the contents of doc_id.json(local ids storage)
-        :param ids_path: Path to the respective doc_ids.json
+    def connect(self):
+        """Opens a connection to the doc-id database
+        Returns:
+            connection: Connection to the doc-id database
         """
+        os.makedirs(os.path.dirname(self.storage_path), exist_ok=True)
+        connection = sqlite3.connect(self.storage_path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        return connection
 
-        try:
-            ids_path = self.ids_path_dict.get(object_type)
-            if os.path.exists(ids_path) and os.path.getsize(ids_path) > 0:
-                with open(ids_path, encoding="utf-8") as ids_file:
-                    try:
-                        return json.load(ids_file)
-                    except ValueError as exception:
-                        self.logger.exception(
-                            f"Error while parsing the json file of the ids store from path: {ids_path}. "
-                            f"Error: {exception}"
-                        )
-        except FileNotFoundError:
-            self.logger.debug(
-                f"Local storage for ids was not found with path: {ids_path}."
+    def create_schema(self, connection):
+        """Creates the tables of the doc-id database, migrating the entries stored with the previous layout
+        :param connection: Connection to the doc-id database
+        """
+        schema_version = connection.execute("PRAGMA user_version").fetchone()[0]
+        if schema_version == SCHEMA_VERSION:
+            return
+        with connection:
+            if schema_version < 2:
+                previous_table = connection.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'doc_ids'"
+                ).fetchone()
+                if previous_table:
+                    connection.execute("ALTER TABLE doc_ids RENAME TO doc_ids_v1")
+                connection.execute("CREATE TABLE strings (id INTEGER PRIMARY KEY, value TEXT NOT NULL UNIQUE)")
+                connection.execute(
+                    "CREATE TABLE doc_ids (object_type INTEGER NOT NULL, id TEXT NOT NULL, type INTEGER NOT NULL, "
+                    "parent_id INTEGER NOT NULL, super_parent_id INTEGER NOT NULL, "
+                    "PRIMARY KEY (object_type, id, type, parent_id, super_parent_id)) WITHOUT ROWID"
+                )
+                if previous_table:
+                    for column in ("object_type", "type", "parent_id", "super_parent_id"):
+                        connection.execute(f"INSERT OR IGNORE INTO strings (value) SELECT {column} FROM doc_ids_v1")
+                    connection.execute(
+                        "INSERT OR IGNORE INTO doc_ids SELECT object_type.id, doc_ids_v1.id, type.id, parent.id, "
+                        "super_parent.id FROM doc_ids_v1 "
+                        "JOIN strings AS object_type ON object_type.value = doc_ids_v1.object_type "
+                        "JOIN strings AS type ON type.value = doc_ids_v1.type "
+                        "JOIN strings AS parent ON parent.value = doc_ids_v1.parent_id "
+                        "JOIN strings AS super_parent ON super_parent.value = doc_ids_v1.super_parent_id"
+                    )
+                    connection.execute("DROP TABLE doc_ids_v1")
+                    self.logger.info(f"Migrated the doc-id storage {self.storage_path} to the dictionary of strings")
+            # The entries of a type under a parent are looked up without scanning the whole object type
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS doc_ids_by_parent ON doc_ids (object_type, type, parent_id)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS fingerprints (id TEXT PRIMARY KEY, fingerprint BLOB NOT NULL) WITHOUT ROWID"
             )
-        return {"global_keys": []}
+            connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
 
-    def update_storage(self, ids, object_type):
-        """This method is used to update the ids stored in doc_id.json file
-        :param ids: updated ids to be stored in the doc_id.json file
-        :param ids_path: Path to the respective doc_ids.json
+    def get_connection(self):
+        """Returns the connection shared by the threads for writing into the doc-id database"""
+        with self.lock:
+            if self.connection is None:
+                connection = self.connect()
+                self.create_schema(connection)
+                self.string_ids = dict(
+                    (value, string_id) for string_id, value in connection.execute("SELECT id, value FROM strings")
+                )
+                self.connection = connection
+            return self.connection
+
+    def encode_keys(self, connection, object_type, keys, new_string_ids):
+        """Replaces the strings of the entries by their id in the dictionary of strings, adding the new strings
+        to the dictionary. It must be called while holding the lock. The ids of the new strings are staged in
+        new_string_ids and must be cached only once the transaction is committed, since a rolled back id is
+        reused by SQLite for another string
+        :param connection: Connection to the doc-id database
+        :param object_type: Object type of the ids, i.e. teams, user_chats or calendar
+        :param keys: Keys of the entries returned by get_document_id_key
+        :param new_string_ids: Dictionary of the strings added in the transaction with their id
+        Returns:
+            rows: List of the rows of the entries in the doc_ids table
+        """
+        def get_string_id(value):
+            string_id = self.string_ids.get(value) or new_string_ids.get(value)
+            if string_id is None:
+                string_id = connection.execute("INSERT INTO strings (value) VALUES (?)", (value,)).lastrowid
+                new_string_ids[value] = string_id
+            return string_id
+
+        object_type_id = get_string_id(object_type)
+        return [
+            (object_type_id, document_id, get_string_id(document_type), get_string_id(parent_id),
+             get_string_id(super_parent_id))
+            for document_id, document_type, parent_id, super_parent_id in keys
+        ]
+
+    def migrate_json_storage(self, object_type):
+        """Moves the ids stored in the JSON file of an object type by the previous versions into the database
+        :param object_type: Object type of the ids, i.e. teams, user_chats or calendar
         """
         ids_path = self.ids_path_dict.get(object_type)
-        with open(ids_path, "w", encoding="utf-8") as ids_file:
-            try:
-                json.dump(ids, ids_file, indent=4)
-            except ValueError as exception:
-                self.logger.exception(
-                    f"Error while updating the doc_id json file. Error: {exception}"
+        if not (ids_path and os.path.exists(ids_path)):
+            return
+        ids_collection = {}
+        if os.path.getsize(ids_path) > 0:
+            with open(ids_path, encoding="utf-8") as ids_file:
+                try:
+                    ids_collection = json.load(ids_file)
+                except ValueError as exception:
+                    self.logger.exception(
+                        f"Error while parsing the json file of the ids store from path: {ids_path}. "
+                        f"Error: {exception}"
+                    )
+                    return
+        self.upsert_documents(object_type, ids_collection.get("global_keys") or [])
+        os.replace(ids_path, f"{ids_path}.migrated")
+        self.logger.info(f"Migrated the ids of {object_type} from {ids_path} to {self.storage_path}")
+
+    def iterate_documents(self, object_type, type=None, parent_id=None):
+        """Streams the ids stored for an object type without loading the whole storage at once
+        :param object_type: Object type of the ids, i.e. teams, user_chats or calendar
+        :param type: Type of the documents, all the types when it is None
+        :param parent_id: Parent id of the documents, all the parents when it is None
+        """
+        self.migrate_json_storage(object_type)
+        self.get_connection()
+        query = (
+            "SELECT doc_ids.id, type.value, parent.value, super_parent.value FROM doc_ids "
+            "JOIN strings AS type ON type.id = doc_ids.type "
+            "JOIN strings AS parent ON parent.id = doc_ids.parent_id "
+            "JOIN strings AS super_parent ON super_parent.id = doc_ids.super_parent_id "
+            "WHERE doc_ids.object_type = (SELECT id FROM strings WHERE value = ?)"
+        )
+        parameters = [object_type]
+        for column, value in (("type", type), ("parent_id", parent_id)):
+            if value is not None:
+                query += f" AND doc_ids.{column} = (SELECT id FROM strings WHERE value = ?)"
+                parameters.append(str(value))
+        # A separate connection reads a consistent snapshot while the threads keep writing
+        connection = self.connect()
+        try:
+            cursor = connection.execute(query, parameters)
+            rows = cursor.fetchmany(FETCH_SIZE)
+            while rows:
+                for row in rows:
+                    yield dict(zip(DOCUMENT_FIELDS, row))
+                rows = cursor.fetchmany(FETCH_SIZE)
+        finally:
+            connection.close()
+
+    def execute_for_keys(self, statement, object_type, keys):
+        """Executes a statement for the rows of the entries in a single transaction
+        :param statement: Statement taking the columns of a row of the doc_ids table as its parameters
+        :param object_type: Object type of the ids, i.e. teams, user_chats or calendar
+        :param keys: Keys of the entries returned by get_document_id_key
+        """
+        connection = self.get_connection()
+        new_string_ids = {}
+        with self.lock:
+            with connection:
+                connection.executemany(
+                    statement, self.encode_keys(connection, object_type, keys, new_string_ids)
                 )
-                raise exception
+            self.string_ids.update(new_string_ids)
+
+    def upsert_keys(self, object_type, keys):
+        """Inserts the entries which are not stored yet
+        :param object_type: Object type of the ids, i.e. teams, user_chats or calendar
+        :param keys: Keys of the entries returned by get_document_id_key
+        """
+        self.execute_for_keys("INSERT OR IGNORE INTO doc_ids VALUES (?, ?, ?, ?, ?)", object_type, keys)
+
+    def upsert_documents(self, object_type, documents):
+        """Inserts the ids of the documents which are not stored yet
+        :param object_type: Object type of the ids, i.e. teams, user_chats or calendar
+        :param documents: List of dictionaries containing the id, type, parent id and super parent id of a document
+        """
+        self.upsert_keys(object_type, (get_document_id_key(document) for document in documents))
+
+    def remove_documents(self, object_type, documents):
+        """Removes the ids of the documents from the storage
+        :param object_type: Object type of the ids, i.e. teams, user_chats or calendar
+        :param documents: List of dictionaries containing the id, type, parent id and super parent id of a document
+        """
+        self.execute_for_keys(
+            "DELETE FROM doc_ids WHERE object_type = ? AND id = ? AND type = ? AND parent_id = ? "
+            "AND super_parent_id = ?",
+            object_type,
+            (get_document_id_key(document) for document in documents),
+        )
+
+    def load_storage(self, object_type):
+        """This method returns the store of the doc-id storage for an object type, migrating the JSON file of the
+        previous versions first
+        :param object_type: Object type of the ids, i.e. teams, user_chats or calendar
+        """
+        self.migrate_json_storage(object_type)
+        return {"global_keys": DocumentIdStore(self, object_type)}
+
+    def update_storage(self, ids, object_type):
+        """This method is used to update the ids stored in the doc-id storage. The entries added to a store are
+        already written through, so only its pending entries are written, while a list of entries replaces the
+        stored entries of the object type
+        :param ids: Dictionary containing the updated ids in its global_keys
+        :param object_type: Object type of the ids, i.e. teams, user_chats or calendar
+        """
+        global_keys = ids.get("global_keys") or []
+        try:
+            if isinstance(global_keys, DocumentIdStore):
+                global_keys.flush()
+                return
+            connection = self.get_connection()
+            new_string_ids = {}
+            with self.lock:
+                with connection:
+                    connection.execute(
+                        "DELETE FROM doc_ids WHERE object_type = (SELECT id FROM strings WHERE value = ?)",
+                        (object_type,),
+                    )
+                    connection.executemany(
+                        "INSERT OR IGNORE INTO doc_ids VALUES (?, ?, ?, ?, ?)",
+                        self.encode_keys(
+                            connection, object_type, (get_document_id_key(item) for item in global_keys),
+                            new_string_ids
+                        ),
+                    )
+                self.string_ids.update(new_string_ids)
+        except sqlite3.Error as exception:
+            self.logger.exception(
+                f"Error while updating the doc-id storage. Error: {exception}"
+            )
+            raise exception
 
     def create_local_storage_directory(self):
         """Creates a doc_id directory if not present"""
@@ -64,28 +333,44 @@ class LocalStorage:
             os.makedirs(constant.LOCAL_STORAGE_DIRECTORY)
 
     def get_documents_from_doc_id_storage(self, object_type):
-        """Returns a dictionary from doc_id file containing the document ids fetched from Microsoft Teams
-        :param ids_path: Path to the respective doc_ids.json
+        """Returns a dictionary from the doc-id storage containing the document ids fetched from Microsoft Teams
+        :param object_type: Object type of the ids, i.e. teams, user_chats or calendar
         Returns:
-            document_ids_dictionary: Dictionary containing the Microsoft Teams document ids
+            document_ids_dictionary: Dictionary containing the store of the Microsoft Teams document ids
         """
-        document_ids_dictionary = {"global_keys": [], "delete_keys": []}
-        ids_collection = self.load_storage(object_type)
-        document_ids_dictionary["delete_keys"] = copy.deepcopy(
-            ids_collection.get("global_keys")
-        )
-        if not ids_collection["global_keys"]:
-            ids_collection["global_keys"] = []
+        global_keys = self.load_storage(object_type)["global_keys"]
+        # The delete keys stream the same stored entries instead of holding a copy of them
+        return {"global_keys": global_keys, "delete_keys": global_keys}
 
-        document_ids_dictionary["global_keys"] = copy.deepcopy(
-            ids_collection["global_keys"]
+    def filter_documents(self, ids_list, type, parent_id=None):
+        """Returns the entries of a type, optionally only the entries of a parent. The entries of a store are
+        looked up in the database
+        :param ids_list: Store or list of the entries
+        :param type: Type of the entries
+        :param parent_id: Parent id of the entries, all the parents when it is None
+        """
+        if isinstance(ids_list, DocumentIdStore):
+            return ids_list.iterate(type, parent_id)
+        return (
+            item for item in list(ids_list)
+            if item["type"] == type and (parent_id is None or item["parent_id"] == parent_id)
         )
-        return document_ids_dictionary
+
+    def remove_documents_from_doc_id_storage(self, ids_list, documents):
+        """Removes entries from a store or a list of entries
+        :param ids_list: Store or list of the entries
+        :param documents: List of dictionaries containing the id, type, parent id and super parent id of a document
+        """
+        if isinstance(ids_list, DocumentIdStore):
+            ids_list.remove(documents)
+            return
+        removed_keys = {get_document_id_key(document) for document in documents}
+        if removed_keys:
+            ids_list[:] = [item for item in ids_list if get_document_id_key(item) not in removed_keys]
 
     def insert_document_into_doc_id_storage(self, ids_list, id, type, parent_id="", super_parent_id=""):
-        """ Prepares the document dictionary for deletion and insert it into the global_keys of respective doc_ids.json.
-            :param ids_list: Pass "global_keys" of microsoft_teams_user_chat_doc_ids.json,
-                microsoft_teams_channel_chat_doc_ids.json and microsoft_teams_calendar_doc_ids.json
+        """ Prepares the document dictionary for deletion and insert it into the global_keys of the doc-id storage.
+            :param ids_list: Pass "global_keys" of the user chats, channel chats or calendar ids
             :param id: Pass id of User Chat, User Chat Attachment, Calendar, Calendar Attachment, Teams, Channel Chat,
                 Channel Chat Attachment, Channel Chat Tabs and User Chat Tabs
             :param type: Pass type of each document for deletion.
@@ -93,6 +378,8 @@ class LocalStorage:
             :param super_parent_id: Pass super parent id of each document for deletion
         """
         new_item = {"id": str(id), "type": type, "parent_id": str(parent_id), "super_parent_id": str(super_parent_id)}
-        if new_item not in ids_list:
+        if isinstance(ids_list, DocumentIdStore):
+            ids_list.add(new_item)
+        elif new_item not in ids_list:
             ids_list.append(new_item)
         return ids_list
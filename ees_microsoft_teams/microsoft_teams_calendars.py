@@ -5,30 +5,41 @@
 #
 """ This module fetches all calendars events from Microsoft Teams.
 """
+import json
+import os
+import threading
 from calendar import month_name
 from collections import defaultdict
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
 
 from . import constant
 from .microsoft_teams_client import MSTeamsClient
+from .microsoft_teams_requests import ResponseException
 from .microsoft_teams_users import MSTeamsUsers
 from .utils import get_schema_fields
 
 USER_MEETING_DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
 MEETING = "Meeting"
+CALENDAR_ID_FIELDS = ["id", "isCancelled"]
 
 
 class MSTeamsCalendar:
     """Fetches calendars for all users from Microsoft Teams"""
 
-    def __init__(self, access_token, logger, config, local_storage):
+    def __init__(
+        self, access_token, logger, config, local_storage, users_obj=None,
+        delta_links_path=constant.CALENDAR_DELTA_LINKS_PATH
+    ):
         self.token = access_token
         self.local_storage = local_storage
         self.client = MSTeamsClient(logger, self.token, config)
-        self.users_obj = MSTeamsUsers(self.token, logger)
+        self.users_obj = users_obj or MSTeamsUsers(self.token, logger, config)
         self.logger = logger
         self.config = config
         self.object_type_to_index = config.get_value('object_type_to_index')
+        self.delta_links_path = delta_links_path
+        self.lock = threading.Lock()
 
     def get_calendar_detail(self, attendees, calendar):
         """This method is used to fetch the calendar details for creating body in the workplace
@@ -83,68 +94,274 @@ class MSTeamsCalendar:
                    f'{calendar["bodyPreview"]}'
         return body
 
-    def get_calendars(self, ids_list, start_time, end_time):
-        """ Fetches all calendar events from Microsoft Teams.
+    def load_delta_links(self):
+        """Loads the calendar view delta links of the users stored by the previous sync
+        Returns:
+            delta_links: Dictionary of user id with its delta link
+        """
+        if not (os.path.exists(self.delta_links_path) and os.path.getsize(self.delta_links_path) > 0):
+            return {}
+        with open(self.delta_links_path, encoding="utf-8") as delta_links_file:
+            try:
+                return json.load(delta_links_file)
+            except ValueError as exception:
+                self.logger.exception(
+                    f"Error while parsing the json file of the calendar delta links from path: "
+                    f"{self.delta_links_path}. Error: {exception}"
+                )
+                return {}
+
+    def save_delta_links(self, delta_links):
+        """Saves the calendar view delta links of the users for the next sync
+        :param delta_links: Dictionary of user id with its delta link
+        """
+        os.makedirs(os.path.dirname(self.delta_links_path), exist_ok=True)
+        with open(self.delta_links_path, "w", encoding="utf-8") as delta_links_file:
+            try:
+                json.dump(delta_links, delta_links_file)
+            except ValueError as exception:
+                self.logger.exception(f"Error while updating the calendar delta links file. Error: {exception}")
+
+    def get_user_calendar_changes(self, delta_links, user, ids_list):
+        """ Fetches the calendar events of a user changed since its delta link through the calendar view delta query.
+            All the events of the calendar view are fetched when the user has no delta link or when the delta link
+            is not accepted anymore. The deletions missed by the delta query are then found by reconciling the stored
+            events of the user against the fetched events
+            :param delta_links: Dictionary of user id with its delta link, updated with the new delta link
+            :param user: Dictionary containing the user details
+            :param ids_list: List of ids holding the stored events
+            Returns:
+                events: List of the changed calendar events
+                deleted_ids: List of the ids of the deleted calendar events
+        """
+        user_id = user["userId"]
+        window_end = datetime.utcnow() + timedelta(days=constant.CALENDAR_VIEW_DAYS_AHEAD)
+        calendar_view_url = (
+            f"{constant.GRAPH_BASE_URL}/users/{user_id}/calendarView/delta?startDateTime="
+            f"{self.config.get_value('start_time')}&endDateTime={window_end.strftime(constant.DATETIME_FORMAT)}"
+        )
+        events, delta_link = None, None
+        if delta_links.get(user_id):
+            events, delta_link = self.client.get_calendar_view_delta(delta_links[user_id])
+        is_full_view = events is None
+        if is_full_view:
+            events, delta_link = self.client.get_calendar_view_delta(calendar_view_url)
+        if events is None:
+            raise ResponseException(f"Could not fetch the calendar view delta of the user {user_id}")
+
+        with self.lock:
+            delta_links[user_id] = delta_link
+        deleted_ids = [event["id"] for event in events if "@removed" in event or event.get("isCancelled")]
+        if is_full_view:
+            # The full calendar view does not report the events deleted before it was fetched
+            live_ids = {event["id"] for event in events if "@removed" not in event and not event.get("isCancelled")}
+            deleted_ids.extend(
+                item["id"] for item in self.local_storage.filter_documents(ids_list, constant.CALENDAR, user_id)
+                if item["id"] not in live_ids
+            )
+        return [event for event in events if "@removed" not in event], deleted_ids
+
+    def get_user_calendars(self, ids_list, start_time, end_time, calendar_schema, delta_links, user):
+        """ Fetches the calendar events of a user from Microsoft Teams.
+            :param ids_list: List of ids
+            :param start_time: Starting time for fetching data
+            :param end_time: Ending time for fetching data
+            :param calendar_schema: Schema of the calendar fields
+            :param delta_links: Dictionary of user id with its delta link for fetching only the changed events, all
+                the events modified between the start time and the end time are fetched when it is None
+            :param user: Dictionary containing the user details
+            Returns:
+                calendar_ids: List of the ids of the calendar events of the user
+                documents: Documents to be indexed in Workplace Search
+                deleted_ids: List of the ids of the deleted calendar events
+        """
+        documents = []
+        calendar_ids = []
+        deleted_ids = []
+        # Logic to append calendar for deletion
+        self.local_storage.insert_document_into_doc_id_storage(ids_list, user["userId"], constant.USER, "", "")
+        if delta_links is None:
+            response = self.client.get_calendars(
+                next_url=f'{constant.GRAPH_BASE_URL}/users/{user["userId"]}/events',
+                start_time=start_time,
+                end_time=end_time
+            )
+        else:
+            response, deleted_ids = self.get_user_calendar_changes(delta_links, user, ids_list)
+
+        for calendar in response or []:
+            if not calendar['isCancelled']:
+                # Logic to append calendar for deletion
+                self.local_storage.insert_document_into_doc_id_storage(
+                    ids_list,
+                    calendar["id"],
+                    constant.CALENDAR,
+                    user["userId"],
+                    ""
+                )
+
+                calendar_dict = {"type": MEETING}
+                calendar_ids.append(calendar["id"])
+
+                attendee_list = []
+                for att in calendar['attendees']:
+                    attendee_list.append(f"{att['emailAddress']['name']}"
+                                         f"({att['emailAddress']['address']})")
+
+                attendees = ",".join(attendee_list)
+                body = self.get_calendar_detail(attendees, calendar)
+
+                for ws_field, ms_fields in calendar_schema.items():
+                    calendar_dict[ws_field] = calendar[ms_fields]
+                calendar_dict['body'] = body
+
+                if calendar['onlineMeeting']:
+                    calendar_dict['url'] = calendar["onlineMeeting"]['joinUrl']
+
+                calendar_dict["_allow_permissions"] = []
+                if self.config.get_value("enable_document_permission"):
+                    calendar_dict["_allow_permissions"] = [calendar['id']]
+                documents.append(calendar_dict)
+        return calendar_ids, documents, deleted_ids
+
+    def fetch_users_calendars(self, ids_list, start_time, end_time, is_error_ignored, delta_links):
+        """ Fetches the calendar events of all the users in a thread pool bounded by the sync thread count
             :param ids_list: List of ids
+            :param start_time: Starting time for fetching data
+            :param end_time: Ending time for fetching data
+            :param is_error_ignored: Flag to skip the users whose calendar events could not be fetched instead of
+                raising the error
+            :param delta_links: Dictionary of user id with its delta link for fetching only the changed events
             Returns:
                 permissions_dict: List of dictionaries containing calendar id and their members
                 documents: Documents to be indexed in Workplace Search
+                deleted_ids: List of the ids of the deleted calendar events
         """
         self.logger.debug("Fetching users for Calendar Events")
         users = self.users_obj.get_all_users()
         self.logger.info("Fetched the users metadata. Attempting to extract the meetings from the calendar...")
 
         documents = []
+        deleted_ids = []
         permissions_dict = defaultdict(list)
         calendar_schema = get_schema_fields("calendar", self.object_type_to_index)
 
-        for user in users:
-            # Logic to append calendar for deletion
-            self.local_storage.insert_document_into_doc_id_storage(ids_list, user["userId"], constant.USER, "", "")
-            try:
-                response = self.client.get_calendars(
-                    next_url=f'{constant.GRAPH_BASE_URL}/users/{user["userId"]}/events',
-                    start_time=start_time,
-                    end_time=end_time
-                )
+        with ThreadPoolExecutor(max_workers=self.config.get_value("ms_teams_sync_thread_count")) as executor:
+            user_jobs = {
+                executor.submit(
+                    self.get_user_calendars, ids_list, start_time, end_time, calendar_schema, delta_links, user
+                ): user
+                for user in users
+            }
+            for job in as_completed(user_jobs):
+                user = user_jobs[job]
+                try:
+                    calendar_ids, user_documents, user_deleted_ids = job.result()
+                except Exception as exception:
+                    self.logger.exception(
+                        f"Error while fetching the calendar events of the user {user['userId']} from teams. "
+                        f"Error: {exception}"
+                    )
+                    if is_error_ignored:
+                        continue
+                    for pending_job in user_jobs:
+                        pending_job.cancel()
+                    raise exception
+                if calendar_ids:
+                    permissions_dict[user["displayName"]].extend(calendar_ids)
+                documents.extend(user_documents)
+                deleted_ids.extend(user_deleted_ids)
+        return permissions_dict, documents, deleted_ids
+
+    def get_user_calendar_ids(self, start_time, end_time, user):
+        """ Lists the ids of the calendar events of a user, selecting only the fields needed to skip the cancelled
+            events
+            :param start_time: Starting time for fetching data
+            :param end_time: Ending time for fetching data
+            :param user: Dictionary containing the user details
+            Returns:
+                documents: List of dictionaries containing the ids of the calendar events
+        """
+        response = self.client.get_calendars(
+            next_url=f'{constant.GRAPH_BASE_URL}/users/{user["userId"]}/events',
+            start_time=start_time,
+            end_time=end_time,
+            fields=CALENDAR_ID_FIELDS
+        )
+        return [{"id": calendar["id"]} for calendar in response or [] if not calendar["isCancelled"]]
 
-                if not response:
-                    continue
-
-                for calendar in response:
-                    if not calendar['isCancelled']:
-                        # Logic to append calendar for deletion
-                        self.local_storage.insert_document_into_doc_id_storage(
-                            ids_list,
-                            calendar["id"],
-                            constant.CALENDAR,
-                            user["userId"],
-                            ""
-                        )
-
-                        calendar_dict = {"type": MEETING}
-                        permissions_dict[user["displayName"]].append(calendar["id"])
-
-                        attendee_list = []
-                        for att in calendar['attendees']:
-                            attendee_list.append(f"{att['emailAddress']['name']}"
-                                                 f"({att['emailAddress']['address']})")
-
-                        attendees = ",".join(attendee_list)
-                        body = self.get_calendar_detail(attendees, calendar)
-
-                        for ws_field, ms_fields in calendar_schema.items():
-                            calendar_dict[ws_field] = calendar[ms_fields]
-                        calendar_dict['body'] = body
-
-                        if calendar['onlineMeeting']:
-                            calendar_dict['url'] = calendar["onlineMeeting"]['joinUrl']
-
-                        calendar_dict["_allow_permissions"] = []
-                        if self.config.get_value("enable_document_permission"):
-                            calendar_dict["_allow_permissions"] = [calendar['id']]
-                        documents.append(calendar_dict)
-            except Exception as exception:
-                self.logger.exception(f"Error while fetching the calendar events from teams. Error: {exception}")
-                raise exception
+    def get_calendar_ids(self, start_time, end_time):
+        """ Lists the ids of the calendar events modified between the start time and the end time from Microsoft
+            Teams for the deletion sync. An error raised for a user stops the listing, since the events of a skipped
+            user would all be deleted
+            :param start_time: Starting time for fetching data
+            :param end_time: Ending time for fetching data
+            Returns:
+                documents: List of dictionaries containing the ids of the calendar events
+        """
+        users = self.users_obj.get_all_users()
+        documents = []
+        with ThreadPoolExecutor(max_workers=self.config.get_value("ms_teams_sync_thread_count")) as executor:
+            user_jobs = {
+                executor.submit(self.get_user_calendar_ids, start_time, end_time, user): user for user in users
+            }
+            for job in as_completed(user_jobs):
+                try:
+                    documents.extend(job.result())
+                except Exception as exception:
+                    self.logger.exception(
+                        f"Error while listing the calendar event ids of the user {user_jobs[job]['userId']} from "
+                        f"teams. Error: {exception}"
+                    )
+                    for pending_job in user_jobs:
+                        pending_job.cancel()
+                    raise exception
+        return documents
+
+    def get_calendars(self, ids_list, start_time, end_time, is_error_ignored=True):
+        """ Fetches all calendar events modified between the start time and the end time from Microsoft Teams.
+            :param ids_list: List of ids
+            :param start_time: Starting time for fetching data
+            :param end_time: Ending time for fetching data
+            :param is_error_ignored: Flag to skip the users whose calendar events could not be fetched instead of
+                raising the error
+            Returns:
+                permissions_dict: List of dictionaries containing calendar id and their members
+                documents: Documents to be indexed in Workplace Search
+        """
+        permissions_dict, documents, _ = self.fetch_users_calendars(
+            ids_list, start_time, end_time, is_error_ignored, None
+        )
         return permissions_dict, documents
+
+    def get_calendar_changes(self, ids_list, delta_links):
+        """ Fetches the calendar events changed and deleted since the delta links of the users from Microsoft Teams.
+            The events of the users removed from the directory are deleted as well
+            :param ids_list: List of ids, the deleted events are removed from it
+            :param delta_links: Dictionary of user id with its delta link, updated with the new delta links
+            Returns:
+                permissions_dict: List of dictionaries containing calendar id and their members
+                documents: Documents to be indexed in Workplace Search
+                deleted_ids: List of the ids of the deleted calendar events
+        """
+        permissions_dict, documents, deleted_ids = self.fetch_users_calendars(
+            ids_list, None, None, True, delta_links
+        )
+        user_ids = {user["userId"] for user in self.users_obj.get_all_users()}
+        # The users are taken from the stored events as well, since the full sync starts without any delta link
+        stored_user_ids = {
+            item["parent_id"] for item in self.local_storage.filter_documents(ids_list, constant.CALENDAR)
+        }
+        removed_user_ids = (set(delta_links) | stored_user_ids) - user_ids
+        for user_id in removed_user_ids:
+            delta_links.pop(user_id, None)
+        deleted_ids = set(deleted_ids)
+        for user_id in removed_user_ids:
+            deleted_ids.update(
+                item["id"] for item in self.local_storage.filter_documents(ids_list, constant.CALENDAR, user_id)
+            )
+        self.local_storage.remove_documents_from_doc_id_storage(ids_list, [
+            item for item in ids_list
+            if item["id"] in deleted_ids or item["id"] in removed_user_ids
+        ])
+        return permissions_dict, documents, list(deleted_ids)
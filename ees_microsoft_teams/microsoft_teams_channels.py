@@ -7,17 +7,18 @@
 """
 import dateparser
 import requests
-from iteration_utilities import unique_everseen
 from requests.exceptions import RequestException
 from tika.tika import TikaException
 
 from . import constant
 from .microsoft_teams_client import MSTeamsClient
 from .utils import (get_data_from_http_response, get_schema_fields, extract_api_response,
-                    html_to_text, url_decode)
+                    html_to_text, url_decode, deduplicate_documents)
 
 MEETING_DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
 CHANNEL_MEETINGS = "Channel Meetings"
+DRIVE_ID_FIELDS = ["id", "name"]
+DRIVE_ITEM_ID_FIELDS = ["id", "folder", "lastModifiedDateTime"]
 
 
 class MSTeamsChannels:
@@ -241,6 +242,30 @@ class MSTeamsChannels:
                         documents.append(message_data)
         return documents
 
+    def get_channel_message_ids(self, team_channels_list, start_time, end_time):
+        """ Lists the ids of the channel messages from the Microsoft Teams for the deletion sync. Unlike
+            get_channel_messages, the messages are not converted to text and their replies are not fetched
+            :param team_channels_list: List of dictionaries containing team_id as a key and
+                channels of that team as a value
+            :param start_time: Starting time for fetching data
+            :param end_time: Ending time for fetching data
+            Returns:
+                documents: List of dictionaries containing the ids of the channel messages
+        """
+        documents = []
+        for team_channel_map in team_channels_list:
+            for team_id, channel_list in team_channel_map.items():
+                for channel in channel_list:
+                    self.logger.info(f"Listing the channel message ids for channel: {channel['title']}")
+                    response = self.client.get_channel_messages(
+                        next_url=f"{constant.GRAPH_BASE_URL}/teams/{team_id}/channels/{channel['id']}/messages",
+                        channel_name=channel["title"], start_time=start_time, end_time=end_time)
+
+                    for message in response or []:
+                        if not message["deletedDateTime"]:
+                            documents.append({"id": message["id"]})
+        return documents
+
     def get_attachment_names(self, attachments):
         """Convert multiple attachment names into comma separated name
         :param attachments: Attachment object for fetching the attachment names
@@ -421,7 +446,7 @@ class MSTeamsChannels:
 
                                 if folder_documents:
                                     documents.extend(folder_documents)
-        return list(unique_everseen(documents))
+        return deduplicate_documents(documents)
 
     def get_folder_documents(
             self, team_id, drive_id, document_id, schema, documents, ids_list, parent_file_id, start_time,
@@ -470,6 +495,79 @@ class MSTeamsChannels:
             documents.append(document_data)
         return documents
 
+    def get_channel_document_ids(self, teams, start_time, end_time):
+        """ Lists the ids of the channel documents from the Microsoft Teams for the deletion sync. Unlike
+            get_channel_documents, only the fields needed to walk the folders are selected and the files are
+            neither downloaded nor extracted
+            :param teams: List of dictionaries containing the team details
+            :param start_time: Starting time for fetching data
+            :param end_time: Ending time for fetching data
+            Returns:
+                documents: List of dictionaries containing the ids of the channel documents
+        """
+        documents = []
+        for team in teams:
+            team_id = team["id"]
+            self.logger.info(f"Listing the channel document ids for team: {team['title']}")
+
+            drive_response = self.client.get_channel_drives_and_children(
+                next_url=f"{constant.GRAPH_BASE_URL}/groups/{team_id}/drives", object_type=constant.DRIVE,
+                fields=DRIVE_ID_FIELDS)
+
+            drive_response_data = get_data_from_http_response(
+                self.logger, drive_response,
+                f"Could not fetch channels document drives for team:{team_id} Error: {drive_response}",
+                f"Error while fetching channels document drives for team: {team_id} Error: {drive_response}")
+
+            for drive in drive_response_data or []:
+                drive_id = drive["id"]
+                root_response = self.client.get(
+                    url=f"{constant.GRAPH_BASE_URL}/groups/{team_id}/drives/{drive_id}/root",
+                    object_type=constant.ROOT)
+
+                if not root_response:
+                    continue
+
+                children_response = self.client.get_channel_drives_and_children(
+                    next_url=f"{constant.GRAPH_BASE_URL}/groups/{team_id}/drives/{drive_id}/items/"
+                             f"{root_response['id']}/children", object_type=constant.DRIVE,
+                    fields=DRIVE_ITEM_ID_FIELDS)
+
+                children_response_data = get_data_from_http_response(
+                    self.logger, children_response,
+                    f"Could not fetch channels document drive items for team:{team_id} Error: {children_response}",
+                    f"Error while fetching channels document drive items for team: {team_id} "
+                    f"Error: {children_response}")
+
+                for child in children_response_data or []:
+                    self.get_folder_document_ids(
+                        team_id, drive_id, child["id"], documents, start_time, end_time, team["title"])
+        return documents
+
+    def get_folder_document_ids(self, team_id, drive_id, document_id, documents, start_time, end_time, team_name):
+        """ Lists the ids of the files and the folders of a folder recursively
+            :param team_id: Team id
+            :param drive_id: Drive id
+            :param document_id: Folder id
+            :param documents: List of the ids of the channel documents, extended in place
+            :param start_time: Starting time for fetching data
+            :param end_time: Ending time for fetching data
+            :param team_name: Team name for log message
+        """
+        # The folders are listed with an explicit stack so that deeply nested folders do not exhaust the recursion
+        folder_ids = [document_id]
+        while folder_ids:
+            folder_id = folder_ids.pop()
+            folder_files_response = self.client.get_channel_documents(
+                next_url=f"{constant.GRAPH_BASE_URL}/groups/{team_id}/drives/{drive_id}/items/{folder_id}/children",
+                start_time=start_time, end_time=end_time, object_type=constant.CHANNEL_DOCUMENTS,
+                team_name=team_name, fields=DRIVE_ITEM_ID_FIELDS)
+
+            for document in folder_files_response or []:
+                documents.append({"id": document["id"]})
+                if document.get("folder") and type(document.get("folder")) != float:
+                    folder_ids.append(document["id"])
+
     def get_attachment_content(self, document):
         """ This function is used to fetch and extract the channel document from download URL
             :param document: document that contains the details of channel document
@@ -158,15 +158,16 @@ class MSTeamsClient(MSTeamsRequests):
             exception_message=f"Error while fetching tabs for channel: {channel_name}")
         return parsed_response
 
-    def get_channel_drives_and_children(self, next_url, object_type, team_name=""):
+    def get_channel_drives_and_children(self, next_url, object_type, team_name="", fields=None):
         """ Get channel documents from the Microsoft Teams with the support of pagination and filtration.
             :param next_url: URL to invoke Graph API call
             :param object_type: Object type to call the GET api
             :param team_name: Team for fetching channel documents
+            :param fields: Fields of the drives or the drive items to be selected, all the fields when it is None
         """
         response_list = {"value": []}
         try:
-            query = self.query_builder.get_query_for_drives_and_docs().strip()
+            query = self.query_builder.get_query_for_drives_and_docs(fields=fields).strip()
             url = f"{next_url}{query}"
             response_json = self.get(url=url, object_type=object_type)
             return response_json
@@ -184,18 +185,19 @@ class MSTeamsClient(MSTeamsRequests):
         )
         return parsed_response
 
-    def get_channel_documents(self, next_url, start_time, end_time, object_type, team_name=""):
+    def get_channel_documents(self, next_url, start_time, end_time, object_type, team_name="", fields=None):
         """ Get channel documents from the Microsoft Teams with the support of pagination and filtration.
             :param next_url: URL to invoke Graph API call
             :param start_time: Starting time to fetch channel documents
             :param end_time: Ending time to fetch channel documents
             :param object_type: Object type to call the GET api
             :param team_name: Team for fetching channel documents
+            :param fields: Fields of the channel documents to be selected, all the fields when it is None
         """
         response_list = {"value": []}
         while next_url:
             try:
-                query = self.query_builder.get_query_for_drives_and_docs().strip()
+                query = self.query_builder.get_query_for_drives_and_docs(fields=fields).strip()
                 url = f"{next_url}{query}"
 
                 # The hierarchy(teams > drives > root > children i.e. actual files/folders) through which channel
@@ -312,6 +314,51 @@ class MSTeamsClient(MSTeamsRequests):
 
         return parsed_response
 
+    def get_all_user_chat_messages(self, next_url, start_time, end_time, user_id):
+        """ Get the messages of all the chats of a user from the Microsoft Teams with the support of pagination and
+            filtration.
+            :param next_url: URL to invoke Graph API call
+            :param start_time: Starting time to fetch user chats messages
+            :param end_time: Ending time to fetch user chat messages
+            :param user_id: User ID to fetch the chat messages
+            Returns:
+                messages: List of the chat messages, None when the messages could not be exported
+        """
+        response_list = {"value": []}
+        is_calling_first_time = True
+        while next_url:
+            try:
+                if is_calling_first_time:
+                    query = self.query_builder.get_query_for_all_chat_messages(start_time, end_time).strip()
+                    url = f"{next_url}{query}"
+                    is_calling_first_time = False
+                else:
+                    url = next_url
+                response_json = self.get(url=url, object_type=constant.USER_CHATS_MESSAGE_EXPORT)
+                response_list["value"].extend(response_json.get("value"))
+
+                next_url = response_json.get("@odata.nextLink")
+
+                if not next_url or next_url == url:
+                    next_url = None
+
+            except Exception as unknown_exception:
+                # A partial export would miss the messages of the remaining pages
+                self.logger.exception(
+                    f"Error while exporting the Microsoft User Chats Messages for user id: {user_id}. "
+                    f"Error: {unknown_exception}"
+                )
+                return None
+
+        parsed_response = get_data_from_http_response(
+            logger=self.logger,
+            response=response_list,
+            error_message=f"Could not fetch the User Chats Messages from Microsoft Teams for user id: {user_id}",
+            exception_message=f"Error while fetching User Chats Messages from Microsoft Teams for user id: {user_id}",
+        )
+
+        return parsed_response
+
     def get_user_chat_tabs(self, next_url, start_time, end_time, chat_id):
         """ Get user chat tabs from the Microsoft Teams with the support of pagination and filtration.
             :param next_url: URL to invoke Graph API call
@@ -366,6 +413,20 @@ class MSTeamsClient(MSTeamsRequests):
             )
         return response_json
 
+    def get_shared_drive_item(self, next_url):
+        """ Get a user chat attachment file from the Microsoft Teams through its sharing url.
+            :param next_url: URL to invoke Graph API call
+        """
+        response_json = None
+        try:
+            response_json = self.get(url=next_url, object_type=constant.ATTACHMENTS)
+
+        except Exception as unknown_exception:
+            self.logger.exception(
+                f"Error while fetching the Microsoft User Chat Attachment. Error: {unknown_exception}"
+            )
+        return response_json
+
     def get_user_chat_attachment_drive_children(self, next_url):
         """ Get user chat attachments from the Microsoft Teams.
             :param next_url: URL to invoke Graph API call
@@ -389,17 +450,75 @@ class MSTeamsClient(MSTeamsRequests):
 
         return parsed_response
 
-    def get_calendars(self, next_url, start_time, end_time):
+    def get_delta_changes(self, next_url, object_type):
+        """ Get the objects changed since a delta link from the Microsoft Teams with the support of pagination.
+            :param next_url: URL to invoke Graph API call, either the delta URL or the delta link of the previous
+                crawl for fetching only the changed objects
+            :param object_type: The type of the object to get
+            Returns:
+                changes: List of the changed objects, None when the changes could not be fetched
+                delta_link: Delta link for fetching the objects changed after this crawl
+        """
+        changes = []
+        delta_link = None
+        while next_url:
+            try:
+                response_json = self.get(url=next_url, object_type=object_type)
+                if not response_json or "value" not in response_json:
+                    break
+                changes.extend(response_json["value"])
+                delta_link = response_json.get("@odata.deltaLink")
+                url, next_url = next_url, response_json.get("@odata.nextLink")
+
+                if next_url == url:
+                    next_url = None
+
+            except Exception as unknown_exception:
+                self.logger.exception(
+                    f"Error while fetching {object_type} from the Microsoft Teams. Error: {unknown_exception}"
+                )
+                break
+
+        if not delta_link:
+            self.logger.error(f"Could not fetch the {object_type} from Microsoft Teams")
+            return None, None
+        return changes, delta_link
+
+    def get_users(self, next_url):
+        """ Get the users from the Microsoft Teams through the delta query with the support of pagination.
+            :param next_url: URL to invoke Graph API call, either the delta URL or the delta link of the previous
+                crawl for fetching only the changed users
+            Returns:
+                users: List of the users, None when the users could not be fetched
+                delta_link: Delta link for fetching the users changed after this crawl
+        """
+        if "$deltatoken" not in next_url:
+            next_url = f"{next_url}{self.query_builder.get_query_for_users()}"
+        return self.get_delta_changes(next_url, constant.USERS)
+
+    def get_calendar_view_delta(self, next_url):
+        """ Get the calendar events from the Microsoft Teams through the calendar view delta query with the support
+            of pagination.
+            :param next_url: URL to invoke Graph API call, either the calendar view delta URL or the delta link of the
+                previous crawl for fetching only the changed and the deleted events
+            Returns:
+                events: List of the calendar events, None when the events could not be fetched
+                delta_link: Delta link for fetching the events changed after this crawl
+        """
+        return self.get_delta_changes(next_url, constant.CALENDAR)
+
+    def get_calendars(self, next_url, start_time, end_time, fields=None):
         """ Get calendar events from the Microsoft Teams with the support of pagination and
             filtration.
             :param next_url: URL to invoke Graph API call
             :param start_time: Starting time to fetch calendar events
             :param end_time: Ending time to fetch calendat events
+            :param fields: Fields of the calendar events to be selected, all the fields when it is None
         """
         response_list = {"value": []}
         while next_url:
             try:
-                query = self.query_builder.get_query_for_calendars(start_time, end_time).strip()
+                query = self.query_builder.get_query_for_calendars(start_time, end_time, fields=fields).strip()
                 url = f"{next_url}{query}"
                 response_json = self.get(url=url, object_type=constant.CALENDAR)
                 response_list["value"].extend(response_json.get("value"))
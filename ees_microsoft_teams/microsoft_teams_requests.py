@@ -68,14 +68,26 @@ class QueryBuilder(object):
     def get_query_for_channel_and_chat_messages(self, page_size=50):
         return f"?$top={page_size}"
 
-    def get_query_for_drives_and_docs(self, page_size=5000):
-        return f"?$top={page_size}"
+    def get_query_for_drives_and_docs(self, page_size=5000, fields=None):
+        query = f"?$top={page_size}"
+        if fields:
+            query += f"&$select={','.join(fields)}"
+        return query
 
     def get_query_for_user_chats(self, page_size=50):
         return f"&$top={page_size}"
 
-    def get_query_for_calendars(self, start_time, end_time, page_size=50):
-        return f"?$filter=lastModifiedDateTime ge {start_time} and lastModifiedDateTime le {end_time}&$top={page_size}"
+    def get_query_for_all_chat_messages(self, start_time, end_time, page_size=50):
+        return f"?$filter=lastModifiedDateTime gt {start_time} and lastModifiedDateTime lt {end_time}&$top={page_size}"
+
+    def get_query_for_calendars(self, start_time, end_time, page_size=50, fields=None):
+        query = f"?$filter=lastModifiedDateTime ge {start_time} and lastModifiedDateTime le {end_time}&$top={page_size}"
+        if fields:
+            query += f"&$select={','.join(fields)}"
+        return query
+
+    def get_query_for_users(self):
+        return "?$select=id,displayName,mail,userPrincipalName"
 
 
 class MSTeamsRequests:
@@ -147,9 +159,9 @@ class MSTeamsRequests:
         self.logger.warn("Access Token has expired. Regenerating the access token...")
         token = MSALAccessToken(self.logger, self.config)
 
-        # Unable to fetch the CALENDAR and ATTACHMENT using the access token generated via user-password flow
-        # So generating the separate access token for fetching CALENDAR and ATTACHMENT objects
-        if object_type in [constant.CALENDAR, constant.ATTACHMENTS]:
+        # Unable to fetch the CALENDAR, ATTACHMENT, USERS and exported chat messages using the access token generated
+        # via user-password flow. So generating the separate access token for fetching these objects
+        if object_type in [constant.CALENDAR, constant.ATTACHMENTS, constant.USER_CHATS_MESSAGE_EXPORT, constant.USERS]:
             self.access_token = token.get_token(is_acquire_for_client=True)
         else:
             self.access_token = token.get_token()
@@ -168,6 +180,14 @@ class MSTeamsRequests:
             response.status_code == 404
             and response_data.get("error", {}).get("code") == "NotFound"
         ):
+            # A refused export, e.g. for a user without the required license, is not an empty export
+            if object_type == constant.USER_CHATS_MESSAGE_EXPORT:
+                self.logger.error(
+                    f"Error: {response.reason}. Error while fetching {object_type} from Microsoft Teams, "
+                    f"url: {request_url}."
+                )
+                return None
+
             if object_type not in [
                 constant.CHANNELS,
                 constant.ATTACHMENTS,
@@ -6,13 +6,16 @@
 """ This module fetches all the messages, attachments, chat tabs, and meeting
     recordings from Microsoft Teams.
 """
+import functools
 from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
 import requests
 
 from . import constant
 from .microsoft_teams_client import MSTeamsClient
-from .utils import (extract_api_response, get_schema_fields, html_to_text,
-                    url_encode)
+from .utils import (encode_sharing_url, extract_api_response, get_schema_fields,
+                    html_to_text, url_encode)
 
 USER_CHAT_ATTACHMENT = "User Chat Attachments"
 MEETING_RECORDING = "Meeting Recording"
@@ -31,6 +34,29 @@ class MSTeamsUserMessage:
         self.object_type_to_index = config.get_value('object_type_to_index')
         self.local_storage = local_storage
 
+    def get_chat_files_folder(self, attachment_client, user_id):
+        """Fetches the drive of a user and its "Microsoft Teams Chat Files" folder containing the chat attachments
+        :param attachment_client: Object of Microsoft team client
+        :param user_id: Id of the user
+        Returns:
+            drive_id: Id of the drive of the user
+            item_id: Id of the chat files folder
+        """
+        user_drive_response = attachment_client.get_user_chat_attachment_drive(
+            f"{constant.GRAPH_BASE_URL}/users/{user_id}/drive"
+        )
+        if not user_drive_response:
+            return None, None
+
+        drive_id = user_drive_response["id"]
+        user_root_response_data = attachment_client.get_user_chat_attachment_drive_children(
+            f"{constant.GRAPH_BASE_URL}/drives/{drive_id}/items/root/children"
+        )
+        for child in user_root_response_data or []:
+            if child["name"] == "Microsoft Teams Chat Files":
+                return drive_id, child["id"]
+        return drive_id, None
+
     def get_attachments(
         self,
         user_id,
@@ -41,7 +67,8 @@ class MSTeamsUserMessage:
         updated_date,
         ids_list,
         user_drive,
-        attachment_client
+        attachment_client,
+        content_url=None,
     ):
         """Fetches all the attachments of a user chat
         :param user_id: Id of the user
@@ -51,53 +78,40 @@ class MSTeamsUserMessage:
         :param chat_id: Id of chat
         :param updated_date: date of chat updated
         :param ids_list: List of ids
-        :param user_drive: Dictionary of user id with drive id
+        :param user_drive: Cache of the user drives
         :param attachment_client: Object of Microsoft team client
+        :param content_url: URL of the attachment file used to resolve it directly
         Returns:
             attachment_list: Documents to be indexed in Workplace Search
         """
         try:
-            item_id = None
-
-            # Checking if the user_id is present in user_drive dictionary for saving the else iteration. If user_id is
-            # present in the dictionary then we'll directly use its drive_id for fetching attachments.
-            if user_drive.get(user_id):
-                drive_id = list(user_drive[user_id].keys())[0]
+            document = None
+            if content_url:
+                # Resolving the file from its URL costs one request, whereas searching it by name needs the drive,
+                # the chat files folder and a filtered listing of the folder
+                document = attachment_client.get_shared_drive_item(
+                    f"{constant.GRAPH_BASE_URL}/shares/{encode_sharing_url(content_url)}/driveItem"
+                )
+                if not (document and document.get("id") and document.get("parentReference")):
+                    document = None
 
+            if document:
+                drive_id = document["parentReference"].get("driveId")
+                item_id = document["parentReference"].get("id")
             else:
-                user_drive_response = attachment_client.get_user_chat_attachment_drive(
-                    f"{constant.GRAPH_BASE_URL}/users/{user_id}/drive"
+                drive_id, item_id = user_drive.get_chat_files_folder(
+                    user_id, functools.partial(self.get_chat_files_folder, attachment_client)
                 )
+            if not drive_id:
+                return []
 
-                if user_drive_response:
-                    # Logic to append user for deletion
-                    self.local_storage.insert_document_into_doc_id_storage(
-                        ids_list, user_id, constant.USER, "", ""
-                    )
-                    drive_id = user_drive_response["id"]
-                    user_drive[user_id] = {drive_id: None}
-
-                    # Logic to append user drive for deletion
-                    self.local_storage.insert_document_into_doc_id_storage(
-                        ids_list, drive_id, constant.USER_CHAT_DRIVE, user_id, ""
-                    )
-
-            if user_drive:
-                # Check that item_id is present with the drive id or not for saving the else iteration.
-                if user_drive.get(user_id).get(drive_id):
-                    item_id = user_drive.get(user_id).get(drive_id)
-
-                else:
-                    user_root_response_data = attachment_client.get_user_chat_attachment_drive_children(
-                        f"{constant.GRAPH_BASE_URL}/drives/{drive_id}/items/root/children"
-                    )
-
-                    if user_root_response_data:
-                        for child in user_root_response_data:
-                            if child["name"] == "Microsoft Teams Chat Files":
-                                item_id = child["id"]
-                                user_drive[user_id][drive_id] = item_id
-                                break
+            # Logic to append user and user drive for deletion
+            self.local_storage.insert_document_into_doc_id_storage(
+                ids_list, user_id, constant.USER, "", ""
+            )
+            self.local_storage.insert_document_into_doc_id_storage(
+                ids_list, drive_id, constant.USER_CHAT_DRIVE, user_id, ""
+            )
 
             attachment_list = []
             if not item_id:
@@ -107,13 +121,15 @@ class MSTeamsUserMessage:
             self.local_storage.insert_document_into_doc_id_storage(
                 ids_list, item_id, constant.USER_CHAT_DRIVE_ITEM, drive_id, user_id
             )
-            final_attachment_url = f"{constant.GRAPH_BASE_URL}/drives/{drive_id}/items/{item_id}/children?" \
-                f"$filter=name eq '{url_encode(attachment_name)}'"
-            attachment_response_data = attachment_client.get_user_chat_attachment_drive_children(
-                final_attachment_url)
+            if not document:
+                final_attachment_url = f"{constant.GRAPH_BASE_URL}/drives/{drive_id}/items/{item_id}/children?" \
+                    f"$filter=name eq '{url_encode(attachment_name)}'"
+                attachment_response_data = attachment_client.get_user_chat_attachment_drive_children(
+                    final_attachment_url)
+                if attachment_response_data:
+                    document = attachment_response_data[0]
 
-            if attachment_response_data:
-                document = attachment_response_data[0]
+            if document:
                 attachment_dict = {"type": USER_CHAT_ATTACHMENT}
                 is_file = document.get("file", {})
 
@@ -226,7 +242,9 @@ class MSTeamsUserMessage:
         """
         self.logger.debug("Fetching the users chats")
         documents = []
-        chat_response_data = self.client.get_user_chats(f"{constant.GRAPH_BASE_URL}/chats?$expand=members")
+        chat_response_data = self.client.get_user_chats(
+            f"{constant.GRAPH_BASE_URL}/chats?$expand=members,lastMessagePreview"
+        )
         if chat_response_data:
             self.logger.info(
                 "Fetched the user chat metadata. Attempting to extract the messages from the chats, "
@@ -246,6 +264,215 @@ class MSTeamsUserMessage:
                 documents.append(chat)
         return member_dict, documents
 
+    def get_active_chats(self, chats, start_time):
+        """Filters out the chats without any activity since the start time. The activity of a chat is taken from
+        its lastUpdatedDateTime and the creation time of its last message, the chats without both are kept
+        :param chats: List of the user chats
+        :param start_time: Starting time for fetching data
+        Returns:
+            active_chats: List of the chats updated after the start time
+        """
+        active_chats = []
+        for chat in chats:
+            last_message_preview = chat.get("lastMessagePreview") or {}
+            activity_times = [
+                activity_time[:19] for activity_time in (
+                    chat.get("lastUpdatedDateTime"), last_message_preview.get("createdDateTime")
+                ) if activity_time
+            ]
+            if not activity_times or max(activity_times) >= start_time[:19]:
+                active_chats.append(chat)
+        self.logger.info(
+            f"Skipping {len(chats) - len(active_chats)} of {len(chats)} chats without any activity since {start_time}"
+        )
+        return active_chats
+
+    def get_chat_export_users(self, chats):
+        """Selects the users whose chats cover all the given chats so that the messages of every chat are exported
+        through only one of its members
+        :param chats: Chats data for fetching chat messages
+        Returns:
+            export_users: Dictionary of user id with the ids of the chats to be exported through that user
+        """
+        chats_by_user = defaultdict(set)
+        for chat in chats:
+            for member in chat["members"]:
+                user_id = member.get("userId")
+                if user_id:
+                    chats_by_user[user_id].add(chat["id"])
+
+        uncovered_chats = set().union(*chats_by_user.values())
+        export_users = {}
+        while uncovered_chats:
+            user_id = max(chats_by_user, key=lambda user: len(chats_by_user[user] & uncovered_chats))
+            covered_chats = chats_by_user.pop(user_id) & uncovered_chats
+            export_users[user_id] = covered_chats
+            uncovered_chats -= covered_chats
+        return export_users
+
+    def get_exported_chat_messages(self, chats, start_time, end_time, export_token):
+        """Fetches the messages of the chats through the getAllMessages API of their members and routes them to
+        their chats
+        :param chats: Chats data for fetching chat messages
+        :param start_time: Starting time for fetching data
+        :param end_time: Ending time for fetching data
+        :param export_token: Application access token for fetching the messages of all the chats of a user
+        Returns:
+            exported_chat_messages: Dictionary of chat id with the messages of that chat, the chats of the users
+                whose export failed are missing
+        """
+        export_client = MSTeamsClient(self.logger, export_token, self.config)
+        exported_chat_messages = {}
+        for user_id, chat_ids in self.get_chat_export_users(chats).items():
+            self.logger.info(f"Exporting the messages of {len(chat_ids)} chats for user: {user_id}")
+            messages = export_client.get_all_user_chat_messages(
+                f"{constant.GRAPH_BASE_URL}/users/{user_id}/chats/getAllMessages",
+                start_time,
+                end_time,
+                user_id
+            )
+            if messages is None:
+                # The chats missing from the export are fetched chat by chat
+                self.logger.warning(
+                    f"Could not export the messages of the chats of user: {user_id}, fetching them chat by chat"
+                )
+                continue
+            for chat_id in chat_ids:
+                exported_chat_messages[chat_id] = []
+            for message in messages:
+                if message.get("chatId") in chat_ids:
+                    exported_chat_messages[message["chatId"]].append(message)
+        return exported_chat_messages
+
+    def get_chat_message_documents(
+        self, chat, ids_list, start_time, end_time, user_schema, exported_chat_messages
+    ):
+        """Fetches the messages and the meeting recordings of a chat. The attachments of the messages are not
+        fetched but returned as the arguments of the attachment lookups, so that they are resolved as separate tasks
+        :param chat: Chat for fetching the messages
+        :param ids_list: List of ids
+        :param start_time: Starting time for fetching data
+        :param end_time: Ending time for fetching data
+        :param user_schema: Schema of the user chat fields
+        :param exported_chat_messages: Dictionary of chat id with its messages fetched through the getAllMessages API
+        Returns:
+            documents: Documents of the chat messages and the meeting recordings
+            attachments: Arguments of the attachments to be fetched for the chat messages
+        """
+        documents, attachments = [], []
+        member_title = [member["displayName"] for member in chat["members"] if member["displayName"]]
+        title = chat.get("topic") if chat.get("topic") else ",".join(member_title)
+        chat_detail_response = exported_chat_messages.get(chat["id"])
+        if chat_detail_response is None:
+            chat_detail_response = self.client.get_user_chat_messages(
+                f'{constant.GRAPH_BASE_URL}/chats/{chat["id"]}/messages',
+                start_time,
+                end_time,
+                chat["id"]
+            )
+        for message in chat_detail_response or []:
+            if message["deletedDateTime"]:
+                continue
+            sender = message["from"]
+            user_name = ""
+            if sender and sender["user"]:
+                user_id = sender.get("user", {}).get("id")
+                user_name = sender.get("user", {}).get("displayName")
+                for attachment in message["attachments"]:
+                    name = attachment["name"]
+                    if name and attachment["contentType"] == "reference":
+                        attachments.append((
+                            user_id,
+                            title,
+                            name,
+                            attachment["id"],
+                            chat["id"],
+                            message["lastModifiedDateTime"],
+                            attachment.get("contentUrl"),
+                        ))
+            chat_message = html_to_text(self.logger, message["body"]["content"])
+            if chat_message:
+                # Logic to append chat message for deletion
+                self.local_storage.insert_document_into_doc_id_storage(
+                    ids_list,
+                    message["id"],
+                    constant.USER_CHATS_MESSAGE,
+                    chat["id"],
+                    "",
+                )
+                user_dict = {"type": constant.USER_CHATS_MESSAGE}
+                for ws_field, ms_fields in user_schema.items():
+                    user_dict[ws_field] = message[ms_fields]
+                user_dict["title"] = title
+                user_dict["body"] = (
+                    f"{user_name} - {chat_message}" if user_name else chat_message
+                )
+                user_dict["url"] = chat["webUrl"]
+
+                user_dict["_allow_permissions"] = []
+                if self.is_permission_sync_enabled:
+                    user_dict["_allow_permissions"] = [chat["id"]]
+                documents.append(user_dict)
+            else:
+                self.logger.info(
+                    f"the message for the chat {message['id']} is empty"
+                )
+            meeting_recordings = self.fetch_meeting_recording(
+                chat["id"], message
+            )
+            if meeting_recordings:
+                documents.append(meeting_recordings)
+        return documents, attachments
+
+    def get_chat_ids(self, chat, start_time, end_time):
+        """Lists the ids of the messages, the attachments and the tabs of a chat. The messages are not converted to
+        text and the attachments are taken from the messages referencing them without being downloaded
+        :param chat: Chat for listing the ids
+        :param start_time: Starting time for fetching data
+        :param end_time: Ending time for fetching data
+        Returns:
+            documents: List of dictionaries containing the ids of the chat objects
+        """
+        documents = []
+        messages = self.client.get_user_chat_messages(
+            f'{constant.GRAPH_BASE_URL}/chats/{chat["id"]}/messages',
+            start_time,
+            end_time,
+            chat["id"]
+        )
+        for message in messages or []:
+            if message["deletedDateTime"]:
+                continue
+            documents.append({"id": message["id"]})
+            for attachment in message["attachments"]:
+                if attachment["name"] and attachment["contentType"] == "reference":
+                    documents.append({"id": attachment["id"]})
+
+        tabs = self.client.get_user_chat_tabs(
+            f"{constant.GRAPH_BASE_URL}/chats/{chat['id']}/tabs",
+            start_time, end_time, chat["id"]
+        )
+        documents.extend({"id": tab["id"]} for tab in tabs or [])
+        return documents
+
+    def get_user_chat_message_ids(self, chat_response_data, start_time, end_time):
+        """Lists the ids of the user chat messages, attachments and tabs from Microsoft Teams for the deletion sync
+        in a thread pool bounded by the sync thread count
+        :param chat_response_data: Chats data for listing the ids
+        :param start_time: Starting time for fetching data
+        :param end_time: Ending time for fetching data
+        Returns:
+            documents: List of dictionaries containing the ids of the chat objects
+        """
+        documents = []
+        with ThreadPoolExecutor(max_workers=self.config.get_value("ms_teams_sync_thread_count")) as executor:
+            for chat_documents in executor.map(
+                lambda chat: self.get_chat_ids(chat, start_time, end_time), chat_response_data
+            ):
+                documents.extend(chat_documents)
+        self.logger.info("Listed the ids of the user chat messages, attachments and tabs")
+        return documents
+
     def get_user_chat_messages(
         self,
         ids_list,
@@ -254,108 +481,82 @@ class MSTeamsUserMessage:
         start_time,
         end_time,
         user_attachment_token,
+        exported_chat_messages=None,
     ):
-        """Fetches the user chat messages from Microsoft Teams
+        """Fetches the user chat messages from Microsoft Teams. The messages, the tabs and the attachments of the
+        chats are fetched as independent tasks of a thread pool bounded by the sync thread count, and the documents
+        of each task are yielded as soon as it completes. A failed task is logged and skipped without stopping the
+        other chats
         :param ids_list: List of ids
-        :param user_drive: Dictionary of dictionary
+        :param user_drive: Cache of the user drives
         :param chat_response_data: Chats data for fetching chat messages
         :param start_time: Starting time for fetching data
         :param end_time: Ending time for fetching data
         :param user_attachment_token: Access token for fetching the attachments
+        :param exported_chat_messages: Dictionary of chat id with its messages fetched through the getAllMessages
+            API, the messages of the chats missing from it are fetched chat by chat
         Returns:
-            documents: Documents to be indexed in Workplace Search
+            documents: Generator of the lists of documents to be indexed in Workplace Search
         """
-        documents = []
+        exported_chat_messages = exported_chat_messages or {}
         user_schema = get_schema_fields("user_chats", self.object_type_to_index)
         attachment_client = MSTeamsClient(
             self.logger, user_attachment_token, self.config
         )
-        for val in chat_response_data:
-            member_title = []
-            for member in val["members"]:
-                display_name = member["displayName"]
-                if display_name:
-                    member_title.append(display_name)
-            # Logic to append chat for deletion
-            try:
-                chat_detail_response = self.client.get_user_chat_messages(
-                    f'{constant.GRAPH_BASE_URL}/chats/{val["id"]}/messages',
-                    start_time,
-                    end_time,
-                    val['id']
-                )
-                if chat_detail_response:
-                    for chat in chat_detail_response:
-                        if not chat["deletedDateTime"]:
-                            title = (
-                                val.get("topic")
-                                if val.get("topic")
-                                else ",".join(member_title)
-                            )
-                            sender = chat["from"]
-                            user_name = ""
-                            if sender and sender["user"]:
-                                user_id = sender.get("user", {}).get("id")
-                                user_name = sender.get("user", {}).get("displayName")
-                                for attachment in chat["attachments"]:
-                                    name = attachment["name"]
-                                    if name and attachment["contentType"] == "reference":
-                                        attachment_document = self.get_attachments(
-                                            user_id,
-                                            title,
-                                            name,
-                                            attachment["id"],
-                                            val["id"],
-                                            chat["lastModifiedDateTime"],
-                                            ids_list,
-                                            user_drive,
-                                            attachment_client
-                                        )
-                                        if attachment_document:
-                                            documents.extend(attachment_document)
-                            content = chat["body"]["content"]
-                            chat_message = html_to_text(self.logger, content)
-                            if chat_message:
-                                # Logic to append chat message for deletion
-                                self.local_storage.insert_document_into_doc_id_storage(
-                                    ids_list,
-                                    chat["id"],
-                                    constant.USER_CHATS_MESSAGE,
-                                    val["id"],
-                                    "",
-                                )
-                                user_dict = {"type": constant.USER_CHATS_MESSAGE}
-                                for ws_field, ms_fields in user_schema.items():
-                                    user_dict[ws_field] = chat[ms_fields]
-                                user_dict["title"] = title
-                                user_dict["body"] = (
-                                    f"{user_name} - {chat_message}" if user_name else chat_message
-                                )
-                                user_dict["url"] = val["webUrl"]
-
-                                user_dict["_allow_permissions"] = []
-                                if self.is_permission_sync_enabled:
-                                    user_dict["_allow_permissions"] = [val["id"]]
-                                documents.append(user_dict)
-                            else:
-                                self.logger.info(
-                                    f"the message for the chat {chat['id']} is empty"
-                                )
-                            meeting_recordings = self.fetch_meeting_recording(
-                                val["id"], chat
-                            )
-                            if meeting_recordings:
-                                documents.append(meeting_recordings)
-            except Exception as exception:
-                self.logger.exception(
-                    f"[Fail] Error while fetching user chats details from teams. Error: {exception}"
+        failed_chats = set()
+        with ThreadPoolExecutor(max_workers=self.config.get_value("ms_teams_sync_thread_count")) as executor:
+            message_jobs = set()
+            # chat_jobs: Dictionary of the pending jobs with the id of their chat
+            chat_jobs = {}
+            for chat in chat_response_data:
+                message_job = executor.submit(
+                    self.get_chat_message_documents,
+                    chat, ids_list, start_time, end_time, user_schema, exported_chat_messages
                 )
-                raise
-            self.logger.info(
-                f"Fetched chats, attachments and meeting recordings metadata. Attempting to fetch tabs "
-                f"for chat: {val['id']}"
+                message_jobs.add(message_job)
+                chat_jobs[message_job] = chat["id"]
+                chat_jobs[executor.submit(self.fetch_tabs, chat["id"], ids_list, start_time, end_time)] = chat["id"]
+
+            pending_jobs = set(chat_jobs)
+            while pending_jobs:
+                completed_jobs, pending_jobs = wait(pending_jobs, return_when=FIRST_COMPLETED)
+                for job in completed_jobs:
+                    chat_id = chat_jobs.pop(job)
+                    try:
+                        result = job.result()
+                    except Exception as exception:
+                        self.logger.exception(
+                            f"[Fail] Error while fetching user chats details for chat: {chat_id}. Error: {exception}"
+                        )
+                        failed_chats.add(chat_id)
+                        continue
+                    if job not in message_jobs:
+                        yield result or []
+                        continue
+                    chat_documents, attachments = result
+                    yield chat_documents
+                    self.logger.info(
+                        f"Fetched chats and meeting recordings metadata. Attempting to fetch {len(attachments)} "
+                        f"attachments for chat: {chat_id}"
+                    )
+                    for user_id, title, name, attachment_id, chat_id, updated_at, content_url in attachments:
+                        attachment_job = executor.submit(
+                            self.get_attachments,
+                            user_id,
+                            title,
+                            name,
+                            attachment_id,
+                            chat_id,
+                            updated_at,
+                            ids_list,
+                            user_drive,
+                            attachment_client,
+                            content_url,
+                        )
+                        chat_jobs[attachment_job] = chat_id
+                        pending_jobs.add(attachment_job)
+        if failed_chats:
+            self.logger.warning(
+                f"Could not fetch all the objects of {len(failed_chats)} user chats: {', '.join(sorted(failed_chats))}"
             )
-            tabs_document = self.fetch_tabs(val["id"], ids_list, start_time, end_time)
-            documents.extend(tabs_document)
-            self.logger.info("Fetched the user chat tabs")
-        return documents
+        self.logger.info("Fetched the user chat messages, attachments and tabs")
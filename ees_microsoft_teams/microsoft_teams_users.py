@@ -4,45 +4,105 @@
 # you may not use this file except in compliance with the Elastic License 2.0.
 #
 """ This module is used to fetch all Microsoft Teams users.
+
+    The users are kept in a directory stored locally, which is refreshed once per run
+    with the users changed since the previous run through the delta query.
 """
 import json
-
-import requests
+import os
+import threading
 
 from . import constant
+from .microsoft_teams_client import MSTeamsClient
+from .microsoft_teams_requests import ResponseException
 
 
 class MSTeamsUsers:
-    """This class fetch Microsoft Teams users."""
+    """This class maintains the directory of Microsoft Teams users."""
 
-    def __init__(self, token, logger):
-        self.access_token = token
+    def __init__(self, token, logger, config, directory_path=constant.USER_DIRECTORY_PATH):
+        self.client = MSTeamsClient(logger, token, config)
         self.logger = logger
+        self.directory_path = directory_path
+        self.lock = threading.Lock()
+        self.users = None
+
+    def load(self):
+        """Loads the users and the delta link stored by the previous run
+        Returns:
+            directory: Dictionary containing the users by their id and the delta link
+        """
+        if not (os.path.exists(self.directory_path) and os.path.getsize(self.directory_path) > 0):
+            return {"users": {}, "delta_link": None}
+        with open(self.directory_path, encoding="utf-8") as directory_file:
+            try:
+                return json.load(directory_file)
+            except ValueError as exception:
+                self.logger.exception(
+                    f"Error while parsing the json file of the user directory from path: {self.directory_path}. "
+                    f"Error: {exception}"
+                )
+                return {"users": {}, "delta_link": None}
+
+    def save(self, directory):
+        """Saves the users and the delta link for the next run
+        :param directory: Dictionary containing the users by their id and the delta link
+        """
+        os.makedirs(os.path.dirname(self.directory_path), exist_ok=True)
+        with open(self.directory_path, "w", encoding="utf-8") as directory_file:
+            try:
+                json.dump(directory, directory_file)
+            except ValueError as exception:
+                self.logger.exception(f"Error while updating the user directory file. Error: {exception}")
+
+    def refresh(self):
+        """Applies the users changed since the stored delta link to the directory. All the users are fetched
+        when there is no delta link or when the delta link is not accepted anymore. The users stored locally are
+        used when the users could not be fetched, and an error is raised when there are none
+        Returns:
+            users: Dictionary of the users by their id
+        """
+        directory = self.load()
+        users = directory["users"]
+        changed_users, delta_link = None, None
+        if directory["delta_link"]:
+            changed_users, delta_link = self.client.get_users(directory["delta_link"])
+        if changed_users is None:
+            users = {}
+            changed_users, delta_link = self.client.get_users(f"{constant.GRAPH_BASE_URL}/users/delta")
+        if changed_users is None:
+            # Without any user, the calendar events and the permissions of all the users would be removed
+            if not directory["users"]:
+                raise ResponseException("Could not fetch the users from Azure Platform and no user is stored locally")
+            self.logger.error("Error while fetching users from Azure Platform, using the users stored locally")
+            return directory["users"]
+
+        for user in changed_users:
+            if "@removed" in user:
+                users.pop(user["id"], None)
+            else:
+                users.setdefault(user["id"], {}).update(
+                    {field: value for field, value in user.items() if not field.startswith("@")}
+                )
+        self.save({"users": users, "delta_link": delta_link})
+        self.logger.info(f"Fetched {len(changed_users)} changed users from Azure Platform")
+        return users
 
     def get_all_users(self):
-        """ Fetches all Microsoft Teams users.
+        """ Fetches all Microsoft Teams users. The directory is refreshed only on the first call of a run.
         Returns:
             user_details: List of dictionaries containing the user details.
         """
+        with self.lock:
+            if self.users is None:
+                self.users = self.refresh()
         user_details = []
-        request_header = {
-            "Authorization": f"Bearer {self.access_token}"
-        }
-        try:
-            user_response = requests.get(f'{constant.GRAPH_BASE_URL}/users', headers=request_header)
-            if user_response and user_response.status_code == requests.codes.ok:
-                user_response_data = json.loads(user_response.text)
-                for user in user_response_data["value"]:
-                    user_data = {}
-                    if user['mail']:
-                        user_data['mail'] = user['mail']
-                        user_data["userId"] = user["id"]
-                        user_data["displayName"] = user["displayName"]
-                        user_data["mailAddress"] = user["userPrincipalName"]
-                        user_details.append(user_data)
-            else:
-                self.logger.error("Error while fetching users from Azure Platform")
-        except Exception as exception:
-            self.logger.exception(exception)
-            raise exception
+        for user in self.users.values():
+            if user.get("mail"):
+                user_details.append({
+                    "mail": user["mail"],
+                    "userId": user["id"],
+                    "displayName": user.get("displayName"),
+                    "mailAddress": user.get("userPrincipalName"),
+                })
         return user_details
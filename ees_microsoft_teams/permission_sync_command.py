@@ -5,6 +5,11 @@
 #
 """This module allows to synchronize the user permissions from Microsoft Teams to the Workplace Search.
 """
+from concurrent.futures import ThreadPoolExecutor
+
+from packaging import version
+
+ENTERPRISE_V8 = version.parse("8.0")
 
 
 class PermissionSyncCommand:
@@ -31,3 +36,77 @@ class PermissionSyncCommand:
             )
         self.logger.info("Successfully retrieved all permissions from the Workplace Search")
         return user_permissions_dict
+
+    def get_desired_permissions(self, objects_permissions, user_mapping):
+        """Builds the permissions each user should have in the Workplace Search from the Microsoft Teams objects
+        :param objects_permissions: List of dictionaries of Microsoft Teams user with the permissions of an object
+        :param user_mapping: Index of the Workplace Search users mapped to the Microsoft Teams users
+        Returns:
+            desired_permissions: Dictionary of lowercased user name with the set of its permissions
+        """
+        desired_permissions = {}
+        for object_permissions in objects_permissions:
+            for ms_teams_user, permissions in object_permissions.items():
+                user_name = user_mapping.get_workplace_user(ms_teams_user).lower()
+                desired_permissions.setdefault(user_name, set()).update(permissions)
+        return desired_permissions
+
+    def get_stale_permissions(self, ws_user_permissions, desired_permissions):
+        """Compares the permissions in the Workplace Search with the desired permissions
+        :param ws_user_permissions: Dictionary of Workplace Search user with its permissions
+        :param desired_permissions: Dictionary of lowercased user name with the set of its permissions
+        Returns:
+            stale_permissions: Dictionary of Workplace Search user with the permissions to keep and the permissions
+                to remove, for the users having permissions to remove only
+        """
+        stale_permissions = {}
+        for ws_user, ws_permissions in ws_user_permissions.items():
+            ws_permissions = set(ws_permissions)
+            permissions_to_remove = ws_permissions - desired_permissions.get(ws_user.lower(), set())
+            if permissions_to_remove:
+                stale_permissions[ws_user] = (ws_permissions - permissions_to_remove, permissions_to_remove)
+            else:
+                self.logger.debug(f"No permission found for {ws_user} to remove from Workplace Search")
+        return stale_permissions
+
+    def remove_user_permissions(self, ws_user, permissions_to_keep, permissions_to_remove):
+        """Removes the stale permissions of a user from the Workplace Search
+        :param ws_user: Workplace Search user
+        :param permissions_to_keep: Permissions of the user still granted by Microsoft Teams
+        :param permissions_to_remove: Permissions of the user not granted by Microsoft Teams anymore
+        """
+        if self.workplace_search_custom_client.version >= ENTERPRISE_V8:
+            # The external identity holds all the permissions of the user, so it is updated with the remaining ones
+            # and deleted only when none remains
+            if permissions_to_keep:
+                self.workplace_search_custom_client.add_permissions(ws_user, sorted(permissions_to_keep))
+            else:
+                self.workplace_search_custom_client.remove_permissions(
+                    {"external_user_properties": [{"attribute_value": ws_user}]}
+                )
+        else:
+            self.workplace_search_custom_client.remove_permissions(
+                {"user": ws_user, "permissions": sorted(permissions_to_remove)}
+            )
+        self.logger.debug(f"Removed permissions for {ws_user} from the Workplace Search")
+
+    def reconcile_permissions(self, objects_permissions, user_mapping):
+        """Removes the permissions of the users removed from the Microsoft Teams objects. Only the users having
+        permissions to remove are updated, in parallel
+        :param objects_permissions: List of dictionaries of Microsoft Teams user with the permissions of an object
+        :param user_mapping: Index of the Workplace Search users mapped to the Microsoft Teams users
+        """
+        desired_permissions = self.get_desired_permissions(objects_permissions, user_mapping)
+        stale_permissions = self.get_stale_permissions(self.list_user_permissions(), desired_permissions)
+        if not stale_permissions:
+            return
+        with ThreadPoolExecutor(
+            max_workers=self.config.get_value("enterprise_search_sync_thread_count")
+        ) as executor:
+            futures = [
+                executor.submit(self.remove_user_permissions, ws_user, permissions_to_keep, permissions_to_remove)
+                for ws_user, (permissions_to_keep, permissions_to_remove) in stale_permissions.items()
+            ]
+            for future in futures:
+                future.result()
+        self.logger.info(f"Removed the stale permissions of {len(stale_permissions)} users from the Workplace Search")
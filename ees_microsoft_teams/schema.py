@@ -63,6 +63,21 @@ schema = {
         'type': 'boolean',
         'default': True
     },
+    'enable_chat_messages_export': {
+        'required': False,
+        'type': 'boolean',
+        'default': False
+    },
+    'enable_calendar_delta_sync': {
+        'required': False,
+        'type': 'boolean',
+        'default': False
+    },
+    'skip_unchanged_documents': {
+        'required': False,
+        'type': 'boolean',
+        'default': True
+    },
     'object_type_to_index': {
         'type': 'dict',
         'nullable': True,
@@ -209,5 +224,33 @@ schema = {
         'type': 'integer',
         'default': 5,
         'min': 1
+    },
+    'enterprise_search_indexing_concurrency': {
+        'required': False,
+        'type': 'integer',
+        'default': 2,
+        'min': 1
+    },
+    'user_drive_cache_ttl': {
+        'required': False,
+        'type': 'integer',
+        'default': 24,
+        'min': 0
+    },
+    'queue_max_size': {
+        'required': False,
+        'type': 'integer',
+        'default': 1000,
+        'min': 0
+    },
+    'queue_max_bytes': {
+        'required': False,
+        'type': 'integer',
+        'default': 104857600,
+        'min': 0
+    },
+    'queue_spill_directory': {
+        'required': False,
+        'type': 'string'
     }
 }
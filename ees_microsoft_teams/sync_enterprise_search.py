@@ -4,14 +4,20 @@
 # you may not use this file except in compliance with the Elastic License 2.0.
 #
 
-import pandas as pd
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from elastic_enterprise_search import PayloadTooLargeError
 from iteration_utilities import unique_everseen
 
 from . import constant
-from .utils import (split_documents_into_equal_chunks, split_list_into_buckets, split_documents_into_equal_bytes,
-                    is_document_in_present_data)
+from .document_fingerprints import get_document_fingerprint
+from .utils import (split_documents_into_equal_chunks, split_documents_into_batches, get_document_size,
+                    get_document_key, is_newer_version)
 
 PERMISSION_LIMIT = 1024
+DEDUPLICATION_WINDOW = 100000  # Number of the most recently indexed documents remembered to skip their duplicates
 
 
 class IndexingError(Exception):
@@ -26,99 +32,203 @@ class IndexingError(Exception):
         self.errors = errors
 
 
+class IndexingResult:
+    """Result of indexing one or more batches of documents into the Workplace Search.
+
+    Attributes:
+        total - number of documents sent by their type
+        indexed - number of documents indexed by their type
+        failed - number of documents failed by their type
+        errors - number of errors by their error message
+    """
+
+    def __init__(self):
+        self.total = Counter()
+        self.indexed = Counter()
+        self.failed = Counter()
+        self.errors = Counter()
+
+    def update(self, result):
+        """Adds the counts of another indexing result to this result
+        :param result: Indexing result to be added
+        """
+        self.total.update(result.total)
+        self.indexed.update(result.indexed)
+        self.failed.update(result.failed)
+        self.errors.update(result.errors)
+
+
 class SyncEnterpriseSearch:
     """This class allows ingesting documents to Elastic Enterprise Search."""
 
-    def __init__(self, config, logger, workplace_search_custom_client, queue):
+    def __init__(self, config, logger, workplace_search_custom_client, queue, fingerprint_store=None):
         self.logger = logger
         self.workplace_search_custom_client = workplace_search_custom_client
         self.ws_source = config.get_value("enterprise_search.source_id")
         self.enterprise_search_thread_count = config.get_value(
             "enterprise_search_sync_thread_count"
         )
+        self.indexing_concurrency = config.get_value("enterprise_search_indexing_concurrency")
         self.queue = queue
         self.checkpoint_list = []
         self.permission_list_to_index = []
         self.max_allowed_bytes = 10000000
+        self.indexed_versions = OrderedDict()
+        self.indexed_versions_lock = threading.Lock()
+        self.indexing_result = IndexingResult()
+        self.indexing_result_lock = threading.Lock()
+        # Store of the fingerprints of the indexed documents, None to index the unchanged documents again
+        self.fingerprint_store = fingerprint_store
 
-    def get_records_by_types(self, documents):
-        """This method is used to for grouping the document based on their type
-        :param documents: Document to be indexed
+    def get_indexed_version(self, key):
+        """Returns the last updated time of a document already indexed in this run
+        :param key: Type and id of the document
         Returns:
-             df_dict: Dictionary of type with its count
+            last_updated: Last updated time of the indexed document, None if the document is not indexed
         """
-        if not documents:
-            return {}
-        data_frame = pd.DataFrame(documents)
-        data_frame_size = data_frame.groupby("type").size()
-        data_frame_dict = data_frame_size.to_dict()
-        return data_frame_dict
-
-    def fetch_documents_by_id(self, response, documents):
-        """Filters the documents which are getting failed while indexing
-        :param response: Response getting from the Workplace Search
+        with self.indexed_versions_lock:
+            return self.indexed_versions.get(key)
+
+    def remember_indexed_documents(self, documents):
+        """Remembers the versions of the indexed documents to skip their duplicates arriving in the later batches.
+        Only the most recent documents are remembered to keep the memory bounded
+        :param documents: Documents indexed into the Workplace Search
+        """
+        with self.indexed_versions_lock:
+            for document in documents:
+                key = get_document_key(document)
+                self.indexed_versions[key] = document.get("last_updated") or ""
+                self.indexed_versions.move_to_end(key)
+            while len(self.indexed_versions) > DEDUPLICATION_WINDOW:
+                self.indexed_versions.popitem(last=False)
+
+    def send_documents(self, documents):
+        """Sends a batch of documents to the Workplace Search in a single request. A batch rejected as too large is
+        split in halves which are sent separately, and the byte limit of the next batches is lowered to the size of
+        the halves
         :param documents: Documents to be indexed into the Workplace Search
+        Returns:
+            results: Indexing results of the documents
         """
-        return list(filter(lambda seq: is_document_in_present_data(seq, response["id"], "id"), documents,))
+        try:
+            response = self.workplace_search_custom_client.index_documents(
+                documents, constant.CONNECTION_TIMEOUT
+            )
+        except PayloadTooLargeError:
+            if len(documents) > 1:
+                rejected_size = sum(get_document_size(document) for document in documents)
+                self.max_allowed_bytes = min(self.max_allowed_bytes, rejected_size // 2)
+                self.logger.warning(
+                    f"Workplace Search rejected a batch of {len(documents)} documents of {rejected_size} bytes as "
+                    f"too large. Splitting the batch and lowering the batch limit to {self.max_allowed_bytes} bytes"
+                )
+                middle = len(documents) // 2
+                return self.send_documents(documents[:middle]) + self.send_documents(documents[middle:])
+            document = documents[0]
+            if document.get("body"):
+                self.logger.warning(
+                    f"Workplace Search rejected the document {document.get('id')} as too large. Indexing it "
+                    "without its body"
+                )
+                document["body"] = None
+                return self.send_documents(documents)
+            return [{"id": document.get("id"), "errors": ["Payload too large"]}]
+        return response["results"]
 
-    def index_documents(self, documents):
-        """This method indexes the documents to the workplace.
+    def index_documents(self, documents, fingerprints=None):
+        """This method indexes a batch of documents to the workplace.
         :param documents: Documents to be indexed into the Workplace Search
+        :param fingerprints: Dictionary of document id with its fingerprint, stored for the documents indexed
+            successfully
+        Returns:
+            result: Indexing result of the batch with the indexed and failed documents by their type
         """
-        if documents:
-            total_records_dict = self.get_records_by_types(documents)
-            for chunk in split_list_into_buckets(documents, constant.BATCH_SIZE):
-                try:
-                    response = self.workplace_search_custom_client.index_documents(
-                        chunk, constant.CONNECTION_TIMEOUT
-                    )
-                except IndexingError as exception:
-                    raise IndexingError(exception)
-                for result in response["results"]:
-                    if result["errors"]:
-                        failed_document_list = self.fetch_documents_by_id(result, documents)
-                        # Removing the failed document from the successfully indexed document count
-                        documents = [document for document in documents if document not in failed_document_list]
-                        self.logger.error(
-                            f"Error while indexing {result['id']}. Error: {result['errors']}"
-                        )
-            total_inserted_record_dict = self.get_records_by_types(documents)
-            for type, count in total_records_dict.items():
-                self.logger.info(f"Total {total_inserted_record_dict[type]} {type} indexed out of "
-                                 f"{count}." if total_inserted_record_dict else f"Total 0 {type} "
-                                 f"indexed out of {count}")
+        result = IndexingResult()
+        if not documents:
+            return result
+        result.total.update(document.get("type") for document in documents)
+        documents_by_id = {document.get("id"): document for document in documents}
+        responses = self.send_documents(documents)
+        failed_ids = set()
+        for response in responses:
+            if response["errors"]:
+                if str(response["id"]) not in failed_ids:
+                    failed_ids.add(str(response["id"]))
+                    failed_document = documents_by_id.get(response["id"]) or {}
+                    result.failed[failed_document.get("type")] += 1
+                result.errors.update(response["errors"])
+                self.logger.error(
+                    f"Error while indexing {response['id']}. Error: {response['errors']}"
+                )
+        result.indexed = result.total - result.failed
+        if fingerprints and self.fingerprint_store:
+            self.fingerprint_store.update({
+                document_id: fingerprint for document_id, fingerprint in fingerprints.items()
+                if str(document_id) not in failed_ids
+            })
+        for type, count in result.total.items():
+            self.logger.info(f"Total {result.indexed[type]} {type} indexed out of {count}.")
+        with self.indexing_result_lock:
+            self.indexing_result.update(result)
+        return result
+
+    def log_indexing_result(self):
+        """Logs the number of documents indexed and failed by their type and the errors of the failed documents for
+        all the batches indexed so far
+        Returns:
+            result: Indexing result of all the batches with the indexed and failed documents by their type
+        """
+        result = IndexingResult()
+        with self.indexing_result_lock:
+            result.update(self.indexing_result)
+        for type, count in sorted(result.total.items()):
+            self.logger.info(
+                f"Indexed {result.indexed[type]} of {count} {type} documents, {result.failed[type]} failed"
+            )
+        for error, count in result.errors.most_common():
+            self.logger.error(f"{count} documents failed to index with the error: {error}")
+        return result
+
+    def get_permissions_by_user(self):
+        """Fetches the permissions of all the users from the Workplace Search at once
+        Returns:
+            permissions_by_user: Dictionary of user name with the set of its permissions
+        """
+        permissions_by_user = {}
+        ws_permissions = self.workplace_search_custom_client.list_permissions()
+        for list_permission in (ws_permissions or {}).get("results") or []:
+            user_name = (
+                list_permission["user"]
+                if "user" in list_permission
+                else list_permission["external_user_properties"][0]["attribute_value"]
+            )
+            permissions_by_user[user_name] = set(list_permission.get("permissions") or [])
+        return permissions_by_user
 
     def workplace_add_permission(self, permission_dict):
-        """This method used to index the user permissions into Workplace Search
-        for the user in parameter user_name
-        :param user_name: A string value denoting the username of the user
-        :param permission: Permission that needs to be provided to the user
+        """This method used to index the user permissions into Workplace Search. The permissions of the users
+        are merged with their existing permissions and only the users getting new permissions are updated
+        :param permission_dict: Dictionary of user name with the permissions to be provided to the user
         """
         try:
+            permissions_by_user = self.get_permissions_by_user()
             for user, roles in permission_dict.items():
-                user_permissions = split_documents_into_equal_chunks(
-                    roles, PERMISSION_LIMIT
-                )
-                ws_permissions = self.workplace_search_custom_client.list_permissions()
-                for permissions in user_permissions:
-                    if ws_permissions:
-                        permission_lists = ws_permissions["results"]
-                        for list_permission in permission_lists:
-                            user_name = (
-                                list_permission["user"]
-                                if "user" in list_permission
-                                else list_permission["external_user_properties"][0][
-                                    "attribute_value"
-                                ]
-                            )
-                            if user == user_name:
-                                if list_permission["permissions"]:
-                                    permissions.extend(list_permission["permissions"])
-
+                permissions = permissions_by_user.get(user, set())
+                new_permissions = set(roles) - permissions
+                if not new_permissions:
+                    self.logger.debug(f"Permissions of {user} user are unchanged in the Workplace Search")
+                    continue
+                # Every request carries all the permissions of the user as they replace the existing ones in the
+                # Enterprise Search version>=8
+                for permission_chunk in split_documents_into_equal_chunks(
+                    sorted(new_permissions), PERMISSION_LIMIT
+                ):
+                    permissions = permissions | set(permission_chunk)
                     self.workplace_search_custom_client.add_permissions(
                         user,
-                        list(set(permissions)),
+                        sorted(permissions),
                     )
+                permissions_by_user[user] = permissions
                 self.logger.info(
                     f"Successfully indexed the permissions for {user} user into the "
                     "Workplace Search"
@@ -139,14 +249,43 @@ class SyncEnterpriseSearch:
             # Logic to delete documents from the workplace search
             self.workplace_search_custom_client.delete_documents(final_list)
 
+    def wait_for_batches(self, batches_in_flight, max_in_flight):
+        """Waits until at most max_in_flight batches are being indexed, raising the error of a failed batch
+        :param batches_in_flight: Set of the futures of the batches being indexed, updated in place
+        :param max_in_flight: Number of batches allowed to be indexed after waiting
+        """
+        while len(batches_in_flight) > max_in_flight:
+            done, _ = wait(batches_in_flight, return_when=FIRST_COMPLETED)
+            batches_in_flight.difference_update(done)
+            for future in done:
+                future.result()
+
     def perform_sync(self):
-        """Pull documents from the queue and synchronize it to the Enterprise Search."""
+        """Pull documents from the queue and synchronize it to the Enterprise Search. Up to indexing_concurrency
+        batches are indexed in parallel while the next documents are pulled from the queue."""
+        with ThreadPoolExecutor(max_workers=self.indexing_concurrency) as executor:
+            batches_in_flight = set()
+            try:
+                self.pull_and_index_documents(executor, batches_in_flight)
+            finally:
+                # The checkpoints are saved after this method returns, so every batch must be indexed by then
+                self.wait_for_batches(batches_in_flight, 0)
+
+    def pull_and_index_documents(self, executor, batches_in_flight):
+        """Pull documents from the queue until the end signal and submit their batches for indexing
+        :param executor: Executor indexing the batches
+        :param batches_in_flight: Set of the futures of the batches being indexed, updated in place
+        """
         signal_open = True
         while signal_open:
-            documents_to_index, deleted_document = [], []
+            # Documents to index with their size and fingerprint by their type and id, keeping the most recent
+            # version of each
+            documents_to_index, deleted_document = {}, []
+            # Running size of the documents to index, counted once per document as they are pulled from the queue
+            batch_size = 0
             while (
                     len(documents_to_index) < constant.BATCH_SIZE
-                    and len(str(documents_to_index)) < self.max_allowed_bytes
+                    and batch_size < self.max_allowed_bytes
             ):
                 documents = self.queue.get()
                 if documents.get("type") == "signal_close":
@@ -160,21 +299,52 @@ class SyncEnterpriseSearch:
                 elif documents.get("type") == "deletion":
                     deleted_document.extend(documents.get("data"))
                 else:
-                    documents_to_index.extend(documents.get("data"))
+                    for document in documents.get("data"):
+                        key = get_document_key(document)
+                        if key in documents_to_index:
+                            last_updated = documents_to_index[key][0].get("last_updated") or ""
+                        else:
+                            last_updated = self.get_indexed_version(key)
+                        if not is_newer_version(document, last_updated):
+                            continue
+                        fingerprint = None
+                        if self.fingerprint_store:
+                            fingerprint = get_document_fingerprint(document)
+                            if self.fingerprint_store.is_unchanged(document.get("id"), fingerprint):
+                                continue
+                        if key in documents_to_index:
+                            batch_size -= documents_to_index[key][1]
+                        document_size = get_document_size(document)
+                        documents_to_index[key] = (document, document_size, fingerprint)
+                        batch_size += document_size
             if documents_to_index:
-                documents_to_index = list(unique_everseen(documents_to_index))
-                for chunk in split_documents_into_equal_chunks(
-                    documents_to_index, constant.BATCH_SIZE
+                documents_with_sizes = list(documents_to_index.values())
+                self.remember_indexed_documents(document for document, _, _ in documents_with_sizes)
+                fingerprints = {
+                    document.get("id"): fingerprint for document, _, fingerprint in documents_with_sizes
+                    if fingerprint
+                }
+                for batch in split_documents_into_batches(
+                    [document for document, _, _ in documents_with_sizes],
+                    constant.BATCH_SIZE,
+                    self.max_allowed_bytes,
+                    [document_size for _, document_size, _ in documents_with_sizes],
                 ):
-                    for documents in split_documents_into_equal_bytes(
-                        chunk, self.max_allowed_bytes
-                    ):
-                        self.index_documents(chunk)
+                    batch_fingerprints = {
+                        document.get("id"): fingerprints[document.get("id")] for document in batch
+                        if document.get("id") in fingerprints
+                    }
+                    batches_in_flight.add(executor.submit(self.index_documents, batch, batch_fingerprints))
+                    self.wait_for_batches(batches_in_flight, self.indexing_concurrency)
             if deleted_document:
+                # A document must not be indexed again by a batch in flight after its deletion
+                self.wait_for_batches(batches_in_flight, 0)
                 deleted_document = list(unique_everseen(deleted_document))
                 for chunk in split_documents_into_equal_chunks(
                     deleted_document, constant.BATCH_SIZE
                 ):
                     self.delete_documents(chunk)
+                if self.fingerprint_store:
+                    self.fingerprint_store.remove(deleted_document)
             if not signal_open:
                 break
@@ -7,11 +7,9 @@
 
     It's possible to run full syncs and incremental syncs with this module.
 """
-import csv
-import os
-
 from . import constant
 from .local_storage import LocalStorage
+from .user_mapping import get_user_mapping
 
 
 class SyncMicrosoftTeams:
@@ -32,15 +30,8 @@ class SyncMicrosoftTeams:
         :param user: User for indexing the permissions
         :param roles: User roles
         """
-        rows = {}
-        mapping_sheet_path = self.config.get_value("microsoft_teams.user_mapping")
-        if (
-            mapping_sheet_path and os.path.exists(mapping_sheet_path) and os.path.getsize(mapping_sheet_path) > 0
-        ):
-            with open(mapping_sheet_path, encoding="UTF-8") as file:
-                for row in csv.reader(file):
-                    rows[row[0]] = row[1]
-        user_name = rows.get(user, user)
+        user_mapping = get_user_mapping(self.logger, self.config.get_value("microsoft_teams.user_mapping"))
+        user_name = user_mapping.get_workplace_user(user)
         permission_dict = {"user": user_name, "roles": roles}
         self.queue.append_to_queue("permissions", permission_dict)
 
@@ -53,7 +44,8 @@ class SyncMicrosoftTeams:
         return user_permissions, chats
 
     def fetch_user_chat_messages(
-        self, chats_obj, ids_list, user_drive, start_time, end_time, user_attachment_token, chats
+        self, chats_obj, ids_list, user_drive, start_time, end_time, user_attachment_token, exported_chat_messages,
+        chats
     ):
         """Fetches user chat messages and other chat objects from Microsoft Teams
         :param chats: List of chats to fetch its children objects
@@ -63,27 +55,22 @@ class SyncMicrosoftTeams:
         :param start_time: Start time for fetching the user chats data
         :param end_time: End time for fetching the user chats data
         :param user_attachment_token: Access token for fetching the user chat attachments
+        :param exported_chat_messages: Dictionary of chat id with its messages fetched through the getAllMessages API
         """
-        documents = chats_obj.get_user_chat_messages(
-            ids_list, user_drive, chats, start_time, end_time, user_attachment_token
-        )
-        self.queue.append_to_queue(constant.USER_CHATS_MESSAGE, documents)
+        # The documents of each chat object are queued as soon as they are fetched instead of all the chats at once
+        for documents in chats_obj.get_user_chat_messages(
+            ids_list, user_drive, chats, start_time, end_time, user_attachment_token, exported_chat_messages
+        ):
+            self.queue.append_to_queue(constant.USER_CHATS_MESSAGE, documents)
 
-    def fetch_user_chat_messages_for_deletion(
-        self, chats_obj, ids_list, user_drive, start_time, end_time, user_attachment_token, chats
-    ):
-        """Fetches user chat messages and other chat objects from Microsoft Teams for deletion
-        :param chats: List of chats to fetch its children objects
+    def fetch_user_chat_messages_for_deletion(self, chats_obj, start_time, end_time, chats):
+        """Lists the ids of the user chat messages and other chat objects from Microsoft Teams for deletion
+        :param chats: List of chats to list the ids of its children objects
         :param chats_obj: Chats class object to fetch the chats
-        :param ids_list: Document ids list from respective doc id file
-        :param user_drive: User Drive to store user related details
         :param start_time: Start time for fetching the user chats data
         :param end_time: End time for fetching the user chats data
-        :param user_attachment_token: Access token for fetching the user chat attachments
         """
-        return chats_obj.get_user_chat_messages(
-            ids_list, user_drive, chats, start_time, end_time, user_attachment_token
-        )
+        return chats_obj.get_user_chat_message_ids(chats, start_time, end_time)
 
     def fetch_teams(self, teams_obj, ids_list):
         """Fetches teams from Microsoft Teams
@@ -127,17 +114,14 @@ class SyncMicrosoftTeams:
         )
         self.queue.append_to_queue(constant.CHANNEL_MESSAGES, channel_message_documents)
 
-    def fetch_channel_messages_for_deletion(self, teams_obj, start_time, end_time, ids_list, channels):
-        """Fetches channel messages from Microsoft Teams for deletion
-        :param channels: List of channels to fetch channel messages from Microsoft Teams
+    def fetch_channel_messages_for_deletion(self, teams_obj, start_time, end_time, channels):
+        """Lists the ids of the channel messages from Microsoft Teams for deletion
+        :param channels: List of channels to list the channel messages from Microsoft Teams
         :param teams_obj: Class object to fetch teams and its objects
         :param start_time: Start time for fetching channel messages
         :param end_time: End time for fetching channel messages
-        :param ids_list: Document ids list from respective doc id file
         """
-        return teams_obj.get_channel_messages(
-            channels, ids_list, start_time, end_time
-        )
+        return teams_obj.get_channel_message_ids(channels, start_time, end_time)
 
     def fetch_channel_tabs(self, teams_obj, start_time, end_time, ids_list, channels):
         """Fetches channel tabs from Microsoft Teams
@@ -152,16 +136,15 @@ class SyncMicrosoftTeams:
         )
         self.queue.append_to_queue(constant.CHANNEL_TABS, tab_documents)
 
-    def fetch_channel_tabs_for_deletion(self, teams_obj, start_time, end_time, ids_list, channels):
+    def fetch_channel_tabs_for_deletion(self, teams_obj, start_time, end_time, channels):
         """Fetches channel tabs from Microsoft Teams for deletion
         :param channels: List of channels to fetch channel messages and tabs from Microsoft Teams
         :param teams_obj: Class object to fetch teams and its objects
         :param start_time: Start time for fetching channel messages and tabs
         :param end_time: End time for fetching channel messages and tabs
-        :param ids_list: Document ids list from respective doc id file
         """
         return teams_obj.get_channel_tabs(
-            channels, ids_list, start_time, end_time
+            channels, [], start_time, end_time
         )
 
     def fetch_channel_documents(self, teams_obj, start_time, end_time, ids_list, teams):
@@ -177,17 +160,14 @@ class SyncMicrosoftTeams:
         )
         self.queue.append_to_queue(constant.CHANNEL_DOCUMENTS, channel_documents)
 
-    def fetch_channel_documents_for_deletion(self, teams_obj, start_time, end_time, ids_list, teams):
-        """Fetches channel documents from Microsoft Teams for deletion
-        :param teams: List of teams to fetch channels from Microsoft Teams
+    def fetch_channel_documents_for_deletion(self, teams_obj, start_time, end_time, teams):
+        """Lists the ids of the channel documents from Microsoft Teams for deletion
+        :param teams: List of teams to list the channel documents from Microsoft Teams
         :param teams_obj: Class object to fetch teams and its objects
         :param start_time: Start time for fetching channel documents
         :param end_time: End time for fetching channel documents
-        :param ids_list: Document ids list from respective doc id file
         """
-        return teams_obj.get_channel_documents(
-            teams, ids_list, start_time, end_time
-        )
+        return teams_obj.get_channel_document_ids(teams, start_time, end_time)
 
     def fetch_calendars(self, calendar_obj, ids_list, start_time, end_time):
         """Fetches calendar events from Microsoft Teams
@@ -202,6 +182,17 @@ class SyncMicrosoftTeams:
         self.queue.append_to_queue(constant.CALENDAR, documents)
         return calendar_permissions
 
+    def fetch_calendar_changes(self, calendar_obj, ids_list, delta_links):
+        """Fetches the calendar events changed and deleted since the previous sync from Microsoft Teams
+        :param calendar_obj: Class object to fetch calendar events
+        :param ids_list: Document ids list from respective doc id file
+        :param delta_links: Dictionary of user id with its calendar view delta link
+        """
+        calendar_permissions, documents, deleted_ids = calendar_obj.get_calendar_changes(ids_list, delta_links)
+        self.queue.append_to_queue(constant.CALENDAR, documents)
+        self.queue.append_to_queue("deletion", deleted_ids)
+        return calendar_permissions
+
     def sync_permissions(self, user_permissions):
         """Sync permissions of Microsoft Objects to Workplace Search
         :param user_permissions: Dictionary having the user permissions to be indexed into
@@ -0,0 +1,105 @@
+#
+# Copyright Elasticsearch B.V. and/or licensed to Elasticsearch B.V. under one
+# or more contributor license agreements. Licensed under the Elastic License 2.0;
+# you may not use this file except in compliance with the Elastic License 2.0.
+#
+"""This module caches the drives of the users used for fetching the user chat attachments.
+
+    The drive and the "Microsoft Teams Chat Files" folder of a user are resolved at most
+    once per time-to-live, across the threads of a run and across the runs.
+"""
+import json
+import os
+import threading
+import time
+
+from . import constant
+
+
+class UserDriveCache:
+    """This class stores the drive id and the chat files folder id of the users in memory and on disk"""
+
+    def __init__(self, logger, ttl_hours, cache_path=constant.USER_DRIVE_CACHE_PATH):
+        self.logger = logger
+        self.ttl = ttl_hours * 3600
+        self.cache_path = cache_path
+        self.lock = threading.Lock()
+        self.user_locks = {}
+        self.user_drives = self.load()
+
+    def load(self):
+        """Loads the user drives which are not expired from the cache file
+        Returns:
+            user_drives: Dictionary of user id with its drive id, folder id and the time of the lookup
+        """
+        user_drives = {}
+        if not (os.path.exists(self.cache_path) and os.path.getsize(self.cache_path) > 0):
+            return user_drives
+        with open(self.cache_path, encoding="utf-8") as cache_file:
+            try:
+                user_drives = json.load(cache_file)
+            except ValueError as exception:
+                self.logger.exception(
+                    f"Error while parsing the json file of the user drive cache from path: {self.cache_path}. "
+                    f"Error: {exception}"
+                )
+                return {}
+        return {user_id: entry for user_id, entry in user_drives.items() if self.is_fresh(entry)}
+
+    def save(self):
+        """Saves the resolved user drives into the cache file"""
+        with self.lock:
+            user_drives = {
+                user_id: entry for user_id, entry in self.user_drives.items()
+                if entry["drive_id"] and entry["item_id"] and self.is_fresh(entry)
+            }
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        with open(self.cache_path, "w", encoding="utf-8") as cache_file:
+            try:
+                json.dump(user_drives, cache_file)
+            except ValueError as exception:
+                self.logger.exception(f"Error while updating the user drive cache file. Error: {exception}")
+
+    def is_fresh(self, entry):
+        """Checks if the cached entry of a user is within the time-to-live
+        :param entry: Cached entry of a user
+        """
+        return time.time() - entry["updated_at"] < self.ttl
+
+    def get_user_lock(self, user_id):
+        """Returns the lock used to resolve the drive of a user only once at a time
+        :param user_id: Id of the user
+        """
+        with self.lock:
+            return self.user_locks.setdefault(user_id, threading.Lock())
+
+    def get_cached_entry(self, user_id):
+        """Returns the cached entry of a user. The entries expire only between the runs, as the expired entries
+        are dropped while loading the cache file
+        :param user_id: Id of the user
+        """
+        with self.lock:
+            return self.user_drives.get(user_id)
+
+    def get_chat_files_folder(self, user_id, fetch_chat_files_folder):
+        """Returns the drive id and the chat files folder id of a user. The ids are fetched only if they are
+        not cached and only by one thread at a time for a user
+        :param user_id: Id of the user
+        :param fetch_chat_files_folder: Function fetching the drive id and the folder id of a user from
+            Microsoft Teams
+        Returns:
+            drive_id: Id of the drive of the user
+            item_id: Id of the "Microsoft Teams Chat Files" folder of the user
+        """
+        entry = self.get_cached_entry(user_id)
+        if not entry:
+            with self.get_user_lock(user_id):
+                entry = self.get_cached_entry(user_id)
+                if not entry:
+                    drive_id, item_id = fetch_chat_files_folder(user_id)
+                    entry = {"drive_id": drive_id, "item_id": item_id, "updated_at": time.time()}
+                    # Users without a drive are looked up again as the drive might not be reachable temporarily
+                    if drive_id:
+                        with self.lock:
+                            self.user_drives[user_id] = entry
+        return entry["drive_id"], entry["item_id"]
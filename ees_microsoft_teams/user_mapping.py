@@ -0,0 +1,90 @@
+#
+# Copyright Elasticsearch B.V. and/or licensed to Elasticsearch B.V. under one
+# or more contributor license agreements. Licensed under the Elastic License 2.0;
+# you may not use this file except in compliance with the Elastic License 2.0.
+#
+"""This module maps the Microsoft Teams users to the Workplace Search users.
+
+    The mapping CSV file is parsed once into an index shared by all the objects of a run,
+    and parsed again only when the modification time or the size of the file changes.
+"""
+import csv
+import os
+import threading
+
+user_mappings = {}
+user_mappings_lock = threading.Lock()
+
+
+def get_user_mapping(logger, mapping_path):
+    """Returns the user mapping shared by all the objects using the same mapping file
+    :param logger: Logger object
+    :param mapping_path: Path of the user mapping CSV file
+    """
+    with user_mappings_lock:
+        if mapping_path not in user_mappings:
+            user_mappings[mapping_path] = UserMapping(logger, mapping_path)
+        return user_mappings[mapping_path]
+
+
+class UserMapping:
+    """This class indexes the Workplace Search users by their Microsoft Teams user"""
+
+    def __init__(self, logger, mapping_path):
+        self.logger = logger
+        self.mapping_path = mapping_path
+        self.lock = threading.Lock()
+        self.file_signature = None
+        self.mapped_users = {}
+        self.normalized_users = {}
+
+    def get_file_signature(self):
+        """Returns the modification time and the size of the mapping file, None when there is no mapping"""
+        if not self.mapping_path:
+            return None
+        try:
+            file_stat = os.stat(self.mapping_path)
+        except OSError:
+            return None
+        return file_stat.st_mtime_ns, file_stat.st_size
+
+    def refresh(self):
+        """Parses the mapping file again if it changed since it was last parsed
+        Returns:
+            mapped_users: Dictionary of Microsoft Teams user with its Workplace Search user
+            normalized_users: Dictionary of lowercased Microsoft Teams user with its Workplace Search user
+        """
+        file_signature = self.get_file_signature()
+        with self.lock:
+            if file_signature == self.file_signature:
+                return self.mapped_users, self.normalized_users
+            mapped_users = {}
+            if file_signature and file_signature[1] > 0:
+                with open(self.mapping_path, encoding="UTF-8") as file:
+                    for row in csv.reader(file):
+                        mapped_users[row[0]] = row[1]
+                self.logger.debug(f"Loaded {len(mapped_users)} users from the user mapping: {self.mapping_path}")
+            self.mapped_users = mapped_users
+            self.normalized_users = {user.lower(): ws_user for user, ws_user in mapped_users.items()}
+            self.file_signature = file_signature
+            return self.mapped_users, self.normalized_users
+
+    def get_mapped_users(self):
+        """Returns the mapped users from the CSV file
+        Returns:
+            mapped_users: Dictionary of Microsoft Teams user with its Workplace Search user
+        """
+        mapped_users, _ = self.refresh()
+        return mapped_users
+
+    def get_workplace_user(self, user):
+        """Returns the Workplace Search user mapped to a Microsoft Teams user. The exact user is looked up first,
+        then the user regardless of its case
+        :param user: Microsoft Teams user
+        Returns:
+            user_name: Mapped Workplace Search user, the Microsoft Teams user itself when it is not mapped
+        """
+        mapped_users, normalized_users = self.refresh()
+        if user in mapped_users:
+            return mapped_users[user]
+        return normalized_users.get(user.lower(), user)
@@ -6,16 +6,18 @@
 """This module contains uncategorized utility methods.
 """
 
+import base64
+import json
 import time
 import urllib.parse
+from collections import Counter
 from datetime import datetime
 
-import pandas as pd
-from bs4 import BeautifulSoup
 from tika import parser
 
 from . import constant
 from .adapter import DEFAULT_SCHEMA
+from .html_converter import convert_html_to_text
 from more_itertools import chunked, divide
 
 TIMEOUT = 400
@@ -43,15 +45,23 @@ def url_encode(object_name):
     return name.replace("'", "''")
 
 
+def encode_sharing_url(url):
+    """ Encodes the url of a file into a sharing token used to access the file through the shares API
+        :param url: Url of the file
+        Returns:
+            sharing_token: Unpadded base64url encoded url prefixed with u!
+    """
+    encoded_url = base64.urlsafe_b64encode(url.encode("utf-8")).decode("utf-8").rstrip("=")
+    return f"u!{encoded_url}"
+
+
 def html_to_text(logger, content):
     """ This function is used to convert HTML into text
         :param logger: Logger object
         :param content: Provide html text
     """
     try:
-        soup = BeautifulSoup(content, "html.parser")
-        text = soup.get_text().strip()
-        return text
+        return convert_html_to_text(content)
     except AttributeError as exception:
         logger.exception(f"Error: {exception}")
 
@@ -190,12 +200,7 @@ def get_records_by_types(documents):
         Returns:
             data_frame_dict: Dictionary of type with its count
     """
-    if documents:
-        data_frame = pd.DataFrame(documents)
-        data_frame_size = data_frame.groupby('type').size()
-        data_frame_dict = data_frame_size.to_dict()
-        return data_frame_dict
-    return {}
+    return dict(Counter(document["type"] for document in documents))
 
 
 def is_document_in_present_data(document, document_id, key):
@@ -207,28 +212,82 @@ def is_document_in_present_data(document, document_id, key):
     return document[key] == document_id
 
 
-def split_documents_into_equal_bytes(documents, allowed_size):
+def get_document_key(document):
+    """Returns the key identifying a document across the batches i.e. its type and its id
+    :param document: Document to be indexed
+    """
+    return document.get("type"), document.get("id")
+
+
+def is_newer_version(document, last_updated):
+    """Checks if a document is updated after another version of it
+    :param document: Document to be indexed
+    :param last_updated: Last updated time of the other version, None when there is no other version
+    """
+    return last_updated is None or (document.get("last_updated") or "") > last_updated
+
+
+def deduplicate_documents(documents):
+    """Removes the duplicate documents having the same type and id, keeping their most recently updated version
+    in the position of their first occurrence
+    :param documents: Documents to be indexed
+    Returns:
+        unique_documents: List of the unique documents
+    """
+    latest_documents = {}
+    for document in documents:
+        key = get_document_key(document)
+        current_document = latest_documents.get(key)
+        if current_document is None or is_newer_version(document, current_document.get("last_updated") or ""):
+            latest_documents[key] = document
+    return list(latest_documents.values())
+
+
+def get_document_size(document):
+    """Returns the size in bytes of a document in the JSON request body sent to the Workplace Search, including its
+    separator from the next document
+    :param document: Document to be indexed
+    """
+    return len(json.dumps(document, default=str)) + 1
+
+
+def split_documents_into_equal_bytes(documents, allowed_size, document_sizes=None):
     """This method splits a list or dictionary into list based on allowed size limit.
     :param documents: List or Dictionary to be partitioned into chunks
     :param allowed_size: Maximum size allowed for indexing per request.
+    :param document_sizes: Sizes of the documents already computed with get_document_size
     Returns:
         list_of_chunks: List of list of dictionary containing the dictionaries to be indexed.
     """
-    list_of_chunks = []
-    chunk = []
+    return split_documents_into_batches(documents, len(documents) or 1, allowed_size, document_sizes)
+
+
+def split_documents_into_batches(documents, batch_size, allowed_size, document_sizes=None):
+    """This method splits a list of documents into batches holding at most batch_size documents and at most
+    allowed_size bytes. The body of a document larger than allowed_size is dropped to fit it in a batch.
+    :param documents: List of documents to be partitioned into batches
+    :param batch_size: Maximum number of documents in a batch
+    :param allowed_size: Maximum size allowed for indexing per request.
+    :param document_sizes: Sizes of the documents already computed with get_document_size
+    Returns:
+        list_of_batches: List of list of dictionary containing the dictionaries to be indexed.
+    """
+    if document_sizes is None:
+        document_sizes = [get_document_size(document) for document in documents]
+    list_of_batches = []
+    batch = []
     current_size = allowed_size
-    for document in documents:
-        document_size = len(str(document))
-        if document_size < current_size:
-            chunk.append(document)
+    for document, document_size in zip(documents, document_sizes):
+        if document_size < current_size and len(batch) < batch_size:
+            batch.append(document)
             current_size -= document_size
         else:
-            if chunk:
-                list_of_chunks.append(chunk)
+            if batch:
+                list_of_batches.append(batch)
             if document_size > allowed_size:
                 document["body"] = None
-                document_size = len(str(document))
-            chunk = [document]
+                document_size = get_document_size(document)
+            batch = [document]
             current_size = allowed_size - document_size
-    list_of_chunks.append(chunk)
-    return list_of_chunks
+    list_of_batches.append(batch)
+    return list_of_batches
@@ -22,7 +22,6 @@ install_requires = [
     "pytest",
     "pyyaml",
     "beautifulsoup4",
-    "pandas",
     "iteration_utilities",
     "cached_property==1.5.2; python_version < '3.8'",
     "pytest-cov",
@@ -0,0 +1,49 @@
+#
+# Copyright Elasticsearch B.V. and/or licensed to Elasticsearch B.V. under one
+# or more contributor license agreements. Licensed under the Elastic License 2.0;
+# you may not use this file except in compliance with the Elastic License 2.0.
+#
+"""Micro-benchmark of the HTML to text conversion of the message bodies.
+
+    Run it with `python tests/benchmark_html_converter.py` to compare the converter
+    against BeautifulSoup on the fixture corpus used by the unit tests.
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+from ees_microsoft_teams import html_converter  # noqa
+from test_html_converter import HTML_CORPUS  # noqa
+
+ROUNDS = 200
+
+
+def run_conversion(convert):
+    """Converts every message of the corpus with the given function
+    :param convert: Function converting the HTML content into text
+    """
+    for content in HTML_CORPUS:
+        convert(content)
+
+
+def main():
+    """Prints the time taken by each conversion method for the corpus"""
+    results = {
+        "BeautifulSoup": timeit.timeit(
+            lambda: run_conversion(html_converter.convert_with_beautiful_soup), number=ROUNDS
+        ),
+        "convert_html_to_text": timeit.timeit(
+            lambda: run_conversion(html_converter.convert_html_to_text), number=ROUNDS
+        ),
+    }
+    total_messages = len(HTML_CORPUS) * ROUNDS
+    for name, seconds in results.items():
+        print(f"{name}: {seconds:.3f}s for {total_messages} messages ({total_messages / seconds:,.0f} messages/s)")
+    print(f"Speedup: {results['BeautifulSoup'] / results['convert_html_to_text']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -510,3 +510,128 @@ def test_calendars_for_recurrence_event_daily(mock_users, mock_calendar_response
     }]
     assert source_permission == {'Conf Room Adams': ['123']}
     assert source_documents == target_documents
+
+
+def test_get_calendars_when_a_user_fails():
+    """Test that a user failing to fetch its calendar events does not stop the other users"""
+    # Setup
+    calendar = create_calendar_obj()
+    calendar.users_obj.get_all_users = Mock(return_value=[
+        {"userId": "user1", "displayName": "User 1"}, {"userId": "user2", "displayName": "User 2"}
+    ])
+
+    def get_user_calendars(ids_list, start_time, end_time, calendar_schema, delta_links, user):
+        if user["userId"] == "user1":
+            raise ValueError("failed")
+        return ["123"], [{"id": "123"}], []
+
+    calendar.get_user_calendars = Mock(side_effect=get_user_calendars)
+
+    # Execute
+    source_permission, source_documents = calendar.get_calendars([], "start", "end")
+
+    # Assert
+    assert source_permission == {"User 2": ["123"]}
+    assert source_documents == [{"id": "123"}]
+    with pytest.raises(ValueError):
+        calendar.get_calendars([], "start", "end", is_error_ignored=False)
+
+
+def test_get_calendar_changes(tmp_path):
+    """Test that the changed events are indexed and the deleted events are removed through the delta links"""
+    # Setup
+    configs, logger = settings()
+    calendar = MSTeamsCalendar(
+        'token', logger, configs, LocalStorage(logger), Mock(), str(tmp_path / "delta_links.json")
+    )
+    calendar.users_obj.get_all_users = Mock(return_value=[{"userId": "user1", "displayName": "User 1"}])
+    calendar.get_calendar_detail = Mock(return_value="body")
+    calendar.client.get_calendar_view_delta = Mock(side_effect=[
+        (None, None),
+        ([
+            {
+                "id": "event1", "isCancelled": False, "attendees": [], "onlineMeeting": None, "subject": "Meeting",
+                "createdDateTime": "2022-03-03T09:00:50Z", "lastModifiedDateTime": "2022-03-03T09:02:52Z",
+            },
+            {"id": "event2", "@removed": {"reason": "deleted"}},
+        ], "delta_link2"),
+    ])
+    ids_list = [
+        {"id": "event2", "type": "Calendar", "parent_id": "user1", "super_parent_id": ""},
+        {"id": "user2", "type": "User", "parent_id": "", "super_parent_id": ""},
+        {"id": "event3", "type": "Calendar", "parent_id": "user2", "super_parent_id": ""},
+    ]
+    delta_links = {"user1": "delta_link1", "user2": "delta_link3"}
+
+    # Execute
+    permissions, documents, deleted_ids = calendar.get_calendar_changes(ids_list, delta_links)
+    calendar.save_delta_links(delta_links)
+
+    # Assert
+    assert calendar.client.get_calendar_view_delta.call_args_list[0].args == ("delta_link1",)
+    assert "/users/user1/calendarView/delta?startDateTime=" in calendar.client.get_calendar_view_delta.call_args_list[
+        1].args[0]
+    assert permissions == {"User 1": ["event1"]}
+    assert [document["id"] for document in documents] == ["event1"]
+    assert sorted(deleted_ids) == ["event2", "event3"]
+    assert [item["id"] for item in ids_list] == ["user1", "event1"]
+    assert calendar.load_delta_links() == {"user1": "delta_link2"}
+
+
+def test_get_calendar_changes_on_full_sync(tmp_path):
+    """Test that the stored events missing from the full calendar view and the events of the removed users are
+    deleted from the doc-id storage when the full sync starts without any delta link"""
+    # Setup
+    configs, logger = settings()
+    local_storage = LocalStorage(logger, str(tmp_path / "doc_ids.db"))
+    local_storage.ids_path_dict = {}
+    calendar = MSTeamsCalendar(
+        'token', logger, configs, local_storage, Mock(), str(tmp_path / "delta_links.json")
+    )
+    calendar.users_obj.get_all_users = Mock(return_value=[{"userId": "user1", "displayName": "User 1"}])
+    calendar.get_calendar_detail = Mock(return_value="body")
+    calendar.client.get_calendar_view_delta = Mock(return_value=([
+        {
+            "id": "event1", "isCancelled": False, "attendees": [], "onlineMeeting": None, "subject": "Meeting",
+            "createdDateTime": "2022-03-03T09:00:50Z", "lastModifiedDateTime": "2022-03-03T09:02:52Z",
+        },
+    ], "delta_link1"))
+    ids_list = local_storage.get_documents_from_doc_id_storage("calendar")["global_keys"]
+    for item in [
+        {"id": "user1", "type": "User", "parent_id": "", "super_parent_id": ""},
+        {"id": "event1", "type": "Calendar", "parent_id": "user1", "super_parent_id": ""},
+        {"id": "event2", "type": "Calendar", "parent_id": "user1", "super_parent_id": ""},
+        {"id": "user2", "type": "User", "parent_id": "", "super_parent_id": ""},
+        {"id": "event3", "type": "Calendar", "parent_id": "user2", "super_parent_id": ""},
+    ]:
+        ids_list.add(item)
+    delta_links = {}
+
+    # Execute
+    _, documents, deleted_ids = calendar.get_calendar_changes(ids_list, delta_links)
+
+    # Assert
+    assert [document["id"] for document in documents] == ["event1"]
+    assert sorted(deleted_ids) == ["event2", "event3"]
+    assert sorted(item["id"] for item in ids_list) == ["event1", "user1"]
+    assert delta_links == {"user1": "delta_link1"}
+
+
+def test_get_calendar_ids():
+    """Test that only the ids of the calendar events which are not cancelled are listed"""
+    # Setup
+    calendar = create_calendar_obj()
+    calendar.users_obj.get_all_users = Mock(return_value=[{"userId": "user1", "displayName": "User 1"}])
+    calendar.client.get_calendars = Mock(return_value=[
+        {"id": "event1", "isCancelled": False}, {"id": "event2", "isCancelled": True}
+    ])
+
+    # Execute
+    documents = calendar.get_calendar_ids("start", "end")
+
+    # Assert
+    assert documents == [{"id": "event1"}]
+    assert calendar.client.get_calendars.call_args.kwargs["fields"] == ["id", "isCancelled"]
+    calendar.client.get_calendars = Mock(side_effect=ValueError("failed"))
+    with pytest.raises(ValueError):
+        calendar.get_calendar_ids("start", "end")
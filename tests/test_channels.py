@@ -350,3 +350,48 @@ def test_get_team_channels(source_teams, source_channels):
     # Assert
     assert target_teams == source_teams
     assert target_channels == source_channels
+
+
+def test_get_channel_message_ids():
+    """Test that the ids of the channel messages are listed without fetching their replies"""
+    # Setup
+    team_channel_obj = create_channel_obj()
+    team_channel_obj.client.get_channel_messages = Mock(return_value=[
+        {"id": "message1", "deletedDateTime": None}, {"id": "message2", "deletedDateTime": "2022-01-01T10:00:00Z"}
+    ])
+    team_channel_obj.get_message_replies = Mock()
+
+    # Execute
+    documents = team_channel_obj.get_channel_message_ids(
+        [{"team1": [{"id": "channel1", "title": "Channel"}]}], "start", "end"
+    )
+
+    # Assert
+    assert documents == [{"id": "message1"}]
+    team_channel_obj.get_message_replies.assert_not_called()
+
+
+def test_get_channel_document_ids():
+    """Test that the ids of the channel documents are listed recursively without downloading the files"""
+    # Setup
+    team_channel_obj = create_channel_obj()
+    team_channel_obj.client.get_channel_drives_and_children = Mock(side_effect=[
+        {"value": [{"id": "drive1", "name": "Documents"}]},
+        {"value": [{"id": "general"}]},
+    ])
+    team_channel_obj.client.get = Mock(return_value={"id": "root1", "name": "root"})
+    team_channel_obj.client.get_channel_documents = Mock(side_effect=[
+        [{"id": "folder1", "folder": {"childCount": 1}}, {"id": "file1", "file": {}}],
+        [{"id": "file2", "file": {}}],
+    ])
+    team_channel_obj.get_attachment_content = Mock()
+
+    # Execute
+    documents = team_channel_obj.get_channel_document_ids([{"id": "team1", "title": "Team"}], "start", "end")
+
+    # Assert
+    assert documents == [{"id": "folder1"}, {"id": "file1"}, {"id": "file2"}]
+    assert team_channel_obj.client.get_channel_documents.call_args.kwargs["fields"] == [
+        "id", "folder", "lastModifiedDateTime"
+    ]
+    team_channel_obj.get_attachment_content.assert_not_called()
@@ -6,6 +6,7 @@
 import logging
 import os
 import sys
+import threading
 
 from ees_microsoft_teams.connector_queue import ConnectorQueue  # noqa
 
@@ -67,3 +68,98 @@ def test_append_to_queue():
 
     # Assert
     assert current_message == expected_message
+
+
+def test_put_waits_when_queue_is_full():
+    """Tests that the producer waits until the consumer frees the queue"""
+    # Setup
+    queue = ConnectorQueue(logger, max_size=0, max_bytes=50)
+    queue.append_to_queue("document_list", ["a" * 20])
+    producer = threading.Thread(target=queue.append_to_queue, args=("document_list", ["b" * 20]))
+
+    # Execute
+    producer.start()
+    producer.join(0.1)
+    is_producer_waiting = producer.is_alive()
+    queue.get()
+    producer.join(1)
+
+    # Assert
+    assert is_producer_waiting
+    assert not producer.is_alive()
+    assert queue.get() == {"type": "document_list", "data": ["b" * 20]}
+    assert queue.total_bytes == 0
+
+
+def test_put_when_item_is_larger_than_max_bytes():
+    """Tests that an item larger than the byte limit is accepted by the empty queue"""
+    # Setup
+    queue = ConnectorQueue(logger, max_size=1, max_bytes=10)
+
+    # Execute
+    queue.append_to_queue("document_list", ["a" * 20])
+
+    # Assert
+    assert queue.qsize() == 1
+
+
+def test_release():
+    """Tests that the released queue does not block the producers"""
+    # Setup
+    queue = ConnectorQueue(logger, max_size=1)
+    queue.put("Example data")
+    producer = threading.Thread(target=queue.end_signal)
+    producer.start()
+
+    # Execute
+    queue.release()
+    producer.join(1)
+
+    # Assert
+    assert not producer.is_alive()
+    assert queue.qsize() == 2
+
+
+def test_spill_to_disk(tmp_path):
+    """Tests that the items beyond the byte limit are spilled to the disk and read back in order"""
+    # Setup
+    queue = ConnectorQueue(logger, max_size=1, max_bytes=50, spill_directory=str(tmp_path))
+    expected_messages = []
+
+    # Execute
+    for count in range(5):
+        queue.append_to_queue("document_list", [str(count) * 20])
+        expected_messages.append({"type": "document_list", "data": [str(count) * 20]})
+    queue.put_checkpoint("key", "2022-05-24T14:11:14Z", "full")
+    queue.end_signal()
+    spilled_files = list(tmp_path.glob("*/segment_*.jsonl.gz"))
+    source_messages = [queue.get() for _ in range(7)]
+    queue.close()
+
+    # Assert
+    assert queue.spilled_count == 0
+    assert len(spilled_files) == 1
+    assert source_messages[:5] == expected_messages
+    assert source_messages[5]["type"] == "checkpoint"
+    assert source_messages[6] == {"type": "signal_close"}
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_spill_to_disk_while_consuming(tmp_path):
+    """Tests that the items put after a segment is loaded keep their order"""
+    # Setup
+    queue = ConnectorQueue(logger, max_bytes=30, spill_directory=str(tmp_path))
+    source_messages = []
+
+    # Execute
+    for count in range(3):
+        queue.put(count * 10 ** 25)
+    source_messages.append(queue.get())
+    source_messages.append(queue.get())
+    for count in range(3, 5):
+        queue.put(count * 10 ** 25)
+    while queue.qsize():
+        source_messages.append(queue.get())
+
+    # Assert
+    assert source_messages == [count * 10 ** 25 for count in range(5)]
@@ -6,6 +6,7 @@ from unittest.mock import Mock
 from ees_microsoft_teams.configuration import Configuration  # noqa
 from ees_microsoft_teams.connector_queue import ConnectorQueue
 from ees_microsoft_teams.deletion_sync_command import DeletionSyncCommand  # noqa
+from ees_microsoft_teams.local_storage import LocalStorage
 
 CONFIG_FILE = os.path.join(
     os.path.join(os.path.dirname(__file__), "config"),
@@ -48,3 +49,80 @@ def test_start_consumer(caplog):
     queue = ConnectorQueue(logger)
     deletion_sync_job.start_consumer(queue)
     assert "Completed deletion of the Microsoft Teams objects" in caplog.text
+
+
+def test_remove_deleted_documents_from_global_keys():
+    """Test that the stored documents missing from Microsoft Teams and their missing descendants are removed."""
+    # Setup
+    args = argparse.Namespace()
+    args.config_file = CONFIG_FILE
+    deletion_sync_job = DeletionSyncCommand(args)
+    stored_documents = [
+        {"id": "team1", "type": "teams", "parent_id": "", "super_parent_id": ""},
+        {"id": "channel1", "type": "channels", "parent_id": "team1", "super_parent_id": ""},
+        {"id": "message1", "type": "channel_messages", "parent_id": "channel1", "super_parent_id": "team1"},
+        {"id": "team2", "type": "teams", "parent_id": "", "super_parent_id": ""},
+        {"id": "channel2", "type": "channels", "parent_id": "team2", "super_parent_id": ""},
+    ]
+    global_keys = list(stored_documents)
+    deleted_documents = []
+
+    # Execute
+    deletion_sync_job.remove_deleted_documents_from_global_keys(
+        [{"id": "team1"}, {"id": "message1"}, {"id": "team2"}], stored_documents, deleted_documents, global_keys,
+        "", ""
+    )
+
+    # Assert
+    assert deleted_documents == ["channel1", "channel2"]
+    assert global_keys == [stored_documents[0], stored_documents[2], stored_documents[3]]
+
+
+def test_remove_deleted_documents_from_global_keys_with_deep_tree():
+    """Test that a tree deeper than the recursion limit is reconciled."""
+    # Setup
+    args = argparse.Namespace()
+    args.config_file = CONFIG_FILE
+    deletion_sync_job = DeletionSyncCommand(args)
+    stored_documents = [
+        {"id": str(depth), "type": "channel_documents", "parent_id": str(depth - 1) if depth else "",
+         "super_parent_id": ""}
+        for depth in range(5000)
+    ]
+    global_keys = list(stored_documents)
+    deleted_documents = []
+
+    # Execute
+    deletion_sync_job.remove_deleted_documents_from_global_keys(
+        [{"id": str(depth)} for depth in range(0, 5000, 2)], stored_documents, deleted_documents, global_keys, "", ""
+    )
+
+    # Assert
+    assert deleted_documents == [str(depth) for depth in range(1, 5000, 2)]
+    assert global_keys == stored_documents[::2]
+
+
+def test_remove_deleted_documents_from_doc_id_storage(tmp_path):
+    """Test that the deleted documents are removed from the doc-id storage without rewriting the other entries."""
+    # Setup
+    args = argparse.Namespace()
+    args.config_file = CONFIG_FILE
+    deletion_sync_job = DeletionSyncCommand(args)
+    deletion_sync_job.local_storage = LocalStorage(logging.getLogger("unit_test"), str(tmp_path / "doc_ids.db"))
+    deletion_sync_job.local_storage.ids_path_dict = {}
+    storage_with_collection = deletion_sync_job.local_storage.get_documents_from_doc_id_storage("teams")
+    deletion_sync_job.local_storage.upsert_documents("teams", [
+        {"id": "team1", "type": "teams", "parent_id": "", "super_parent_id": ""},
+        {"id": "channel1", "type": "channels", "parent_id": "team1", "super_parent_id": ""},
+    ])
+    deleted_documents = []
+
+    # Execute
+    deletion_sync_job.remove_deleted_documents_from_global_keys(
+        [{"id": "team1"}], storage_with_collection["delete_keys"], deleted_documents,
+        storage_with_collection["global_keys"], "", ""
+    )
+
+    # Assert
+    assert deleted_documents == ["channel1"]
+    assert [item["id"] for item in storage_with_collection["global_keys"]] == ["team1"]
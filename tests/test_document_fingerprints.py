@@ -0,0 +1,49 @@
+#
+# Copyright Elasticsearch B.V. and/or licensed to Elasticsearch B.V. under one
+# or more contributor license agreements. Licensed under the Elastic License 2.0;
+# you may not use this file except in compliance with the Elastic License 2.0.
+#
+
+import logging
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from ees_microsoft_teams.document_fingerprints import (  # noqa
+    DocumentFingerprintStore, get_document_fingerprint)
+from ees_microsoft_teams.local_storage import LocalStorage  # noqa
+
+logger = logging.getLogger("unit_test_document_fingerprints")
+
+
+def test_get_document_fingerprint_includes_permissions():
+    """Test that the fingerprint changes with the permissions but not with their order"""
+    # Setup
+    document = {"id": "1", "title": "demo", "_allow_permissions": ["a", "b"]}
+
+    # Execute
+    fingerprint = get_document_fingerprint(document)
+
+    # Assert
+    assert fingerprint == get_document_fingerprint({"title": "demo", "_allow_permissions": ["b", "a"], "id": "1"})
+    assert fingerprint != get_document_fingerprint({"id": "1", "title": "demo", "_allow_permissions": ["a"]})
+    assert document["_allow_permissions"] == ["a", "b"]
+
+
+def test_fingerprints_are_stored_for_the_next_runs(tmp_path):
+    """Test that the stored fingerprints are found by the next runs and removed for the deleted documents"""
+    # Setup
+    storage_path = str(tmp_path / "doc_ids.db")
+    store = DocumentFingerprintStore(logger, LocalStorage(logger, storage_path))
+    store.update({"1": b"fingerprint1", 2: b"fingerprint2"})
+    store.update({"2": b"fingerprint3"})
+    store.remove(["1"])
+
+    # Execute
+    next_store = DocumentFingerprintStore(logger, LocalStorage(logger, storage_path))
+
+    # Assert
+    assert next_store.is_unchanged(2, b"fingerprint3")
+    assert not next_store.is_unchanged("2", b"fingerprint2")
+    assert not next_store.is_unchanged("1", b"fingerprint1")
+    assert next_store.local_storage.get_connection().execute("SELECT COUNT(*) FROM fingerprints").fetchone()[0] == 1
@@ -6,6 +6,7 @@
 import argparse
 import logging
 import os
+import subprocess
 import sys
 from unittest.mock import Mock
 
@@ -84,6 +85,27 @@ def test_index_documents(source_documents, mock_documents):
     assert len(result["results"]) == len(source_documents)
 
 
+def test_index_documents_records_latency(caplog):
+    """Test that the latency of the indexed batches is recorded and summarized"""
+    # Setup
+    caplog.set_level("INFO")
+    wrapper_obj = create_enterprise_search_wrapper_obj()
+    wrapper_obj.workplace_search_client.index_documents = Mock(
+        return_value={"results": [{"id": "0", "errors": []}]}
+    )
+
+    # Execute
+    wrapper_obj.index_documents([{"id": "0"}], 1000)
+    wrapper_obj.index_documents([{"id": "0"}, {"id": "1"}], 1000)
+    wrapper_obj.log_indexing_metrics()
+
+    # Assert
+    assert wrapper_obj.indexing_metrics["batches"] == 2
+    assert wrapper_obj.indexing_metrics["documents"] == 3
+    assert wrapper_obj.indexing_metrics["max_latency"] <= wrapper_obj.indexing_metrics["total_latency"]
+    assert "Indexed 3 documents in 2 batches." in caplog.text
+
+
 @pytest.mark.parametrize(
     "deleted_ids",
     [(["844424930334011", "543528180028451862"],)],
@@ -145,14 +167,32 @@ def test_list_permissions():
         )
 
     else:
-        mock_response = [
-            {"user": "example.user", "permissions": ["permission1", "permission2"]}
-        ]
+        mock_response = {
+            "results": [{"user": "example.user", "permissions": ["permission1", "permission2"]}]
+        }
         wrapper_obj.workplace_search_client.list_permissions = Mock(
             return_value=mock_response
         )
     target_list = wrapper_obj.list_permissions()
-    assert target_list == mock_response
+    assert target_list["results"] == mock_response["results"]
+
+
+def test_list_permissions_fetches_all_pages():
+    """Test that the permissions of every page are fetched from Workplace Search."""
+    # Setup
+    wrapper_obj = create_enterprise_search_wrapper_obj()
+    pages = [
+        {"meta": {"page": {"current": 1, "total_pages": 2}}, "results": [{"user": "user1", "permissions": ["1"]}]},
+        {"meta": {"page": {"current": 2, "total_pages": 2}}, "results": [{"user": "user2", "permissions": ["2"]}]},
+    ]
+    wrapper_obj.workplace_search_client.list_external_identities = Mock(side_effect=pages)
+    wrapper_obj.workplace_search_client.list_permissions = Mock(side_effect=pages)
+
+    # Execute
+    target_list = wrapper_obj.list_permissions()
+
+    # Assert
+    assert target_list["results"] == [{"user": "user1", "permissions": ["1"]}, {"user": "user2", "permissions": ["2"]}]
 
 
 def test_remove_permissions(caplog):
@@ -206,3 +246,25 @@ def test_add_permissions(caplog):
         f"Successfully indexed the permissions for {user_name} user into the Workplace Search"
         in caplog.text
     )
+
+
+def test_import_with_installed_client():
+    """Test that the modules are imported in a fresh interpreter with the installed client. The 7.x client pinned
+    in the requirements (make test ES_VERSION_V8=no) has no elastic_enterprise_search.exceptions module, so the
+    errors must be imported from the package itself"""
+    # Setup
+    script = (
+        "import elastic_enterprise_search\n"
+        "import ees_microsoft_teams.enterprise_search_wrapper\n"
+        "import ees_microsoft_teams.sync_enterprise_search\n"
+        "assert 'PayloadTooLargeError' in elastic_enterprise_search.__all__\n"
+    )
+
+    # Execute
+    result = subprocess.run(
+        [sys.executable, "-c", script], cwd=os.path.abspath(os.path.join(os.path.dirname(__file__), "..")),
+        capture_output=True, text=True
+    )
+
+    # Assert
+    assert result.returncode == 0, result.stderr
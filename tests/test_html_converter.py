@@ -0,0 +1,89 @@
+#
+# Copyright Elasticsearch B.V. and/or licensed to Elasticsearch B.V. under one
+# or more contributor license agreements. Licensed under the Elastic License 2.0;
+# you may not use this file except in compliance with the Elastic License 2.0.
+#
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from ees_microsoft_teams import html_converter  # noqa
+
+# Message bodies as returned by the Microsoft Graph API for channel messages, replies and chat messages
+HTML_CORPUS = [
+    "Hello world",
+    "  Hello world \n",
+    "Line one\r\nLine two",
+    "Tom & Jerry",
+    "x&",
+    "<p>Hello</p>",
+    "<div>Hi there</div>",
+    "<div><div>Nested <b>bold</b> and <i>italic</i></div></div>",
+    '<div><at id="0">Tony Stark</at> please review</div>',
+    '<p>Deployed <emoji id="1f600_grinningface" alt="\U0001f600" title="Grinning face"></emoji></p>',
+    '<attachment id="3a0f5b1c2f6e4c0b9b7f"></attachment>',
+    "<b>Section </b><br/>BeautifulSoup<ul><li>Example <b>1</b></li>",
+    '<a href="https://example.com/?a=1&amp;b=2" title="<b>">link</a>',
+    '<span\nstyle="color:red">multi line tag</span>',
+    "<p class=plain>unquoted attribute</p>",
+    "<DIV>Upper case</DIV>",
+    "a &amp; b &lt;c&gt; &quot;d&quot; &apos;e&#39;",
+    "&nbsp;padded&nbsp;",
+    "a&#160;b",
+    "a&#x41;b",
+    "x &foo; y",
+    "x&amp",
+    "&amp;lt;",
+    "a < b",
+    "<p>x</p><!-- comment -->y",
+    "<script>alert(1)</script>text",
+    "<style>p {color: red}</style>styled",
+    "<pre>\npreformatted</pre>",
+    '<img src="https://example.com/a.png" alt="image">caption',
+    "<table><tr><td>cell 1</td><td>cell 2</td></tr></table>",
+    "<p>unclosed",
+    "<p>a</p>   <p>b</p>",
+    "<p>a</p>\r\n<p>b</p>",
+    "<div>a</div> \n <div>b</div>",
+    "<p>a</p>\t\r<b>b</b>",
+    "<p>a</p>\x0c<br/>b",
+    "&lt;\n<div>  <p>a",
+    "<p>a</p>&nbsp; <p>b</p>",
+    "<p",
+    "",
+]
+
+
+@pytest.mark.parametrize("content", HTML_CORPUS)
+def test_convert_html_to_text_matches_beautiful_soup(content):
+    """Test that the converter gives the same text as BeautifulSoup for the fixture corpus"""
+    # Execute
+    target_text = html_converter.convert_html_to_text(content)
+
+    # Assert
+    assert target_text == html_converter.convert_with_beautiful_soup(content)
+
+
+@pytest.mark.parametrize(
+    "content, source_text",
+    [
+        ('<div><at id="0">Tony Stark</at> hi</div>', "Tony Stark hi"),
+        ('<p>Done <emoji id="1f44d" alt="\U0001f44d" title="Like"></emoji></p>', "Done "),
+        ("<p>R&amp;D</p>", "R&D"),
+    ],
+)
+def test_strip_teams_markup(content, source_text):
+    """Test that the common Microsoft Teams markup is converted without BeautifulSoup"""
+    assert html_converter.strip_teams_markup(content) == source_text
+
+
+@pytest.mark.parametrize(
+    "content",
+    ["<p>x</p><!-- comment -->", "<script>x</script>", "x &hellip; y", "a < b"],
+)
+def test_strip_teams_markup_for_unsupported_content(content):
+    """Test that the content not supported by the fast path is left for BeautifulSoup"""
+    assert html_converter.strip_teams_markup(content) is None
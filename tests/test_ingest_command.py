@@ -0,0 +1,153 @@
+#
+# Copyright Elasticsearch B.V. and/or licensed to Elasticsearch B.V. under one
+# or more contributor license agreements. Licensed under the Elastic License 2.0;
+# you may not use this file except in compliance with the Elastic License 2.0.
+#
+import argparse
+import logging
+import os
+import sys
+from unittest.mock import Mock, patch
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from ees_microsoft_teams.connector_queue import ConnectorQueue  # noqa
+from ees_microsoft_teams.ingest_command import IngestCommand  # noqa
+
+CONFIG_FILE = os.path.join(
+    os.path.join(os.path.dirname(__file__), "config"),
+    "microsoft_teams_connector.yml",
+)
+
+
+def create_ingest_command_obj():
+    """This function create object of IngestCommand class for test."""
+    args = argparse.Namespace()
+    args.name = "dummy"
+    args.config_file = CONFIG_FILE
+    return IngestCommand(args)
+
+
+def test_create_and_execute_pipelined_jobs_for_teams():
+    """Test that the channels of each team are followed by the jobs for its messages, tabs and documents"""
+    # Setup
+    ingest_obj = create_ingest_command_obj()
+    teams = [{"id": "team1", "title": "Team 1"}, {"id": "team2", "title": "Team 2"}]
+    sync_microsoft_teams = Mock()
+    sync_microsoft_teams.fetch_channels = Mock(
+        side_effect=lambda teams_obj, ids_list, teams: [
+            {teams[0]["id"]: [{"id": f"{teams[0]['id']}-channel1"}, {"id": f"{teams[0]['id']}-channel2"}]}
+        ]
+    )
+
+    # Execute
+    ingest_obj.create_and_execute_pipelined_jobs_for_teams(
+        2, sync_microsoft_teams, "teams_obj", "start", "end", [], teams
+    )
+
+    # Assert
+    assert sync_microsoft_teams.fetch_channels.call_count == 2
+    assert sync_microsoft_teams.fetch_channel_documents.call_count == 2
+    assert sync_microsoft_teams.fetch_channel_messages.call_count == 4
+    assert sync_microsoft_teams.fetch_channel_tabs.call_count == 4
+    fetched_channels = [call.args[-1] for call in sync_microsoft_teams.fetch_channel_messages.call_args_list]
+    assert {"team2": [{"id": "team2-channel1"}]} in [channel[0] for channel in fetched_channels]
+
+
+def test_create_and_execute_pipelined_jobs_for_teams_when_channels_fail(caplog):
+    """Test that a team failing to fetch its channels does not stop the other teams"""
+    # Setup
+    ingest_obj = create_ingest_command_obj()
+    teams = [{"id": "team1", "title": "Team 1"}, {"id": "team2", "title": "Team 2"}]
+    sync_microsoft_teams = Mock()
+
+    def fetch_channels(teams_obj, ids_list, teams):
+        if teams[0]["id"] == "team1":
+            raise ValueError("failed")
+        return [{"team2": [{"id": "channel"}]}]
+
+    sync_microsoft_teams.fetch_channels = Mock(side_effect=fetch_channels)
+
+    # Execute
+    ingest_obj.create_and_execute_pipelined_jobs_for_teams(
+        2, sync_microsoft_teams, "teams_obj", "start", "end", [], teams
+    )
+
+    # Assert
+    assert sync_microsoft_teams.fetch_channel_messages.call_count == 1
+    assert "Error while fetching the data from Microsoft Teams" in caplog.text
+
+
+def test_start_producer_and_consumer():
+    """Test that the consumer indexes the documents while the producer is fetching them"""
+    # Setup
+    ingest_obj = create_ingest_command_obj()
+    queue = ConnectorQueue(logging.getLogger("unit_test_ingest_command"), max_size=1)
+    consumed_documents = []
+
+    def start_producer(queue):
+        for count in range(5):
+            queue.append_to_queue("document_list", [count])
+        queue.end_signal()
+
+    def start_consumer(queue):
+        while True:
+            documents = queue.get()
+            if documents["type"] == "signal_close":
+                break
+            consumed_documents.extend(documents["data"])
+
+    ingest_obj.start_producer = start_producer
+    ingest_obj.start_consumer = start_consumer
+
+    # Execute
+    ingest_obj.start_producer_and_consumer(queue)
+
+    # Assert
+    assert consumed_documents == [0, 1, 2, 3, 4]
+
+
+def test_start_producer_and_consumer_when_producer_fails():
+    """Test that the consumer is stopped when the producer fails"""
+    # Setup
+    ingest_obj = create_ingest_command_obj()
+    queue = ConnectorQueue(logging.getLogger("unit_test_ingest_command"), max_size=1)
+    ingest_obj.start_producer = Mock(side_effect=ValueError("failed"))
+
+    def start_consumer(queue):
+        while queue.get()["type"] != "signal_close":
+            pass
+
+    ingest_obj.start_consumer = start_consumer
+
+    # Execute
+    with pytest.raises(ValueError):
+        ingest_obj.start_producer_and_consumer(queue)
+
+
+@patch("ees_microsoft_teams.ingest_command.MSALAccessToken")
+def test_create_jobs_for_user_chats_in_single_pool(mock_token):
+    """Test that all the user chats are fetched by a single call instead of one thread pool per partition"""
+    # Setup
+    ingest_obj = create_ingest_command_obj()
+    ingest_obj.get_access_token = Mock(return_value="token")
+    user_chat_object = Mock()
+    user_chat_object.get_active_chats = Mock(side_effect=lambda chats, start_time: chats)
+    ingest_obj.microsoft_user_chats_object = Mock(return_value=user_chat_object)
+    ingest_obj.local_storage = Mock()
+    ingest_obj.local_storage.get_documents_from_doc_id_storage = Mock(return_value={"global_keys": []})
+    ingest_obj.user_drive_cache = Mock()
+    chats = [{"id": f"chat{count}"} for count in range(10)]
+    sync_microsoft_teams = Mock()
+    sync_microsoft_teams.fetch_user_chats = Mock(return_value=({}, chats))
+    queue = Mock()
+
+    # Execute
+    ingest_obj.create_jobs_for_user_chats("full", sync_microsoft_teams, "start", "end", queue)
+
+    # Assert
+    sync_microsoft_teams.fetch_user_chat_messages.assert_called_once()
+    assert sync_microsoft_teams.fetch_user_chat_messages.call_args.args[-1] == chats
+    queue.put_checkpoint.assert_called_once_with("user_chats", "end", "full")
@@ -8,11 +8,12 @@ import logging
 import os
 import sys
 import json
+import sqlite3
 
 import pytest
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from ees_microsoft_teams.local_storage import LocalStorage  # noqa
+from ees_microsoft_teams.local_storage import FETCH_SIZE, LocalStorage  # noqa
 
 DIRECTORY_PATH = os.path.join(
     os.path.abspath(os.path.join(os.path.dirname(__file__), "..")),
@@ -20,8 +21,6 @@ DIRECTORY_PATH = os.path.join(
     "doc_ids"
 )
 
-DOC_ID_STORAGE_PATH = f"{DIRECTORY_PATH}/doc_ids.json"
-
 
 def create_local_storage_obj():
     """This function create object of LocalStorage class for test"""
@@ -42,51 +41,180 @@ def test_create_local_storage_directory():
     assert os.path.exists(DIRECTORY_PATH)
 
 
-def test_get_storage_with_collection():
-    """This method test get_storage_with_collection"""
+def test_get_storage_with_collection(tmp_path):
+    """This method test that the ids of the JSON file of the previous versions are migrated and loaded"""
     # Setup
-    local_storage_obj = create_local_storage_obj()
-    dummy_doc_ids_file = {
-        "global_keys": [
-            {
-                "id": "abc123",
-                "type": "channel messages",
-                "parent id": "xyz123",
-                "super_parent_id": "pqr123"
-            }
-        ],
-        "delete_keys": []
-    }
-    with open(DOC_ID_STORAGE_PATH, "w") as outfile:
-        json.dump(dummy_doc_ids_file, outfile, indent=4)
-    local_storage_obj.ids_path_dict["teams"] = DOC_ID_STORAGE_PATH
-    expected_response = {
-        "global_keys": [
-            {
-                "id": "abc123",
-                "type": "channel messages",
-                "parent id": "xyz123",
-                "super_parent_id": "pqr123"
-            }
-        ],
-        "delete_keys": [
-            {
-                "id": "abc123",
-                "type": "channel messages",
-                "parent id": "xyz123",
-                "super_parent_id": "pqr123"
-            }
-        ],
+    logger = logging.getLogger("unit_test_local_storage")
+    local_storage_obj = LocalStorage(logger, str(tmp_path / "doc_ids.db"))
+    document = {
+        "id": "abc123",
+        "type": "channel messages",
+        "parent_id": "xyz123",
+        "super_parent_id": "pqr123"
     }
+    doc_ids_path = str(tmp_path / "doc_ids.json")
+    with open(doc_ids_path, "w") as outfile:
+        json.dump({"global_keys": [document], "delete_keys": []}, outfile, indent=4)
+    local_storage_obj.ids_path_dict["teams"] = doc_ids_path
 
     # Execute
     actual_response = local_storage_obj.get_documents_from_doc_id_storage("teams")
-    print(actual_response)
-    print('=======================')
-    print(expected_response)
 
     # Assert
-    assert expected_response == actual_response
+    assert list(actual_response["global_keys"]) == [document]
+    assert list(actual_response["delete_keys"]) == [document]
+    assert not os.path.exists(doc_ids_path)
+    assert list(local_storage_obj.get_documents_from_doc_id_storage("teams")["global_keys"]) == [document]
+
+
+def test_update_storage(tmp_path):
+    """This method test that the doc-id storage holds the updated ids of each object type"""
+    # Setup
+    logger = logging.getLogger("unit_test_local_storage")
+    local_storage_obj = LocalStorage(logger, str(tmp_path / "doc_ids.db"))
+    local_storage_obj.ids_path_dict = {}
+    ids_list = local_storage_obj.get_documents_from_doc_id_storage("teams")["global_keys"]
+    for document_id in ["1", "2", "1"]:
+        local_storage_obj.insert_document_into_doc_id_storage(ids_list, document_id, "teams")
+    local_storage_obj.update_storage({"global_keys": ids_list}, "teams")
+    ids_list = local_storage_obj.get_documents_from_doc_id_storage("teams")["global_keys"]
+    local_storage_obj.remove_documents_from_doc_id_storage(
+        ids_list, [item for item in ids_list if item["id"] == "1"]
+    )
+    local_storage_obj.insert_document_into_doc_id_storage(ids_list, "3", "teams", "2")
+
+    # Execute
+    local_storage_obj.update_storage({"global_keys": ids_list}, "teams")
+
+    # Assert
+    assert list(local_storage_obj.get_documents_from_doc_id_storage("teams")["global_keys"]) == [
+        {"id": "2", "type": "teams", "parent_id": "", "super_parent_id": ""},
+        {"id": "3", "type": "teams", "parent_id": "2", "super_parent_id": ""},
+    ]
+    assert list(local_storage_obj.get_documents_from_doc_id_storage("calendar")["global_keys"]) == []
+
+
+def test_update_storage_with_list(tmp_path):
+    """This method test that a list of entries replaces the stored entries of the object type"""
+    # Setup
+    logger = logging.getLogger("unit_test_local_storage")
+    local_storage_obj = LocalStorage(logger, str(tmp_path / "doc_ids.db"))
+    local_storage_obj.ids_path_dict = {}
+    local_storage_obj.upsert_documents("teams", [{"id": "1", "type": "teams"}])
+    local_storage_obj.upsert_documents("calendar", [{"id": "2", "type": "calendar"}])
+
+    # Execute
+    local_storage_obj.update_storage({"global_keys": [{"id": "3", "type": "teams"}]}, "teams")
+
+    # Assert
+    assert [item["id"] for item in local_storage_obj.iterate_documents("teams")] == ["3"]
+    assert [item["id"] for item in local_storage_obj.iterate_documents("calendar")] == ["2"]
+
+
+def test_document_id_store_writes_batches_through(tmp_path):
+    """This method test that the entries added to a store are written to the database once a batch is complete"""
+    # Setup
+    logger = logging.getLogger("unit_test_local_storage")
+    local_storage_obj = LocalStorage(logger, str(tmp_path / "doc_ids.db"))
+    local_storage_obj.ids_path_dict = {}
+    ids_list = local_storage_obj.get_documents_from_doc_id_storage("teams")["global_keys"]
+
+    # Execute
+    for document_id in range(FETCH_SIZE + 1):
+        local_storage_obj.insert_document_into_doc_id_storage(ids_list, document_id, "teams")
+
+    # Assert
+    assert len(ids_list.pending_keys) == 1
+    assert sum(1 for _ in local_storage_obj.iterate_documents("teams")) == FETCH_SIZE
+    assert sum(1 for _ in ids_list) == FETCH_SIZE + 1
+
+
+def test_filter_documents(tmp_path):
+    """This method test that the entries of a type and a parent are looked up in a store and in a list"""
+    # Setup
+    logger = logging.getLogger("unit_test_local_storage")
+    local_storage_obj = LocalStorage(logger, str(tmp_path / "doc_ids.db"))
+    local_storage_obj.ids_path_dict = {}
+    documents = [
+        {"id": "user1", "type": "User", "parent_id": "", "super_parent_id": ""},
+        {"id": "event1", "type": "Meeting", "parent_id": "user1", "super_parent_id": ""},
+        {"id": "event2", "type": "Meeting", "parent_id": "user2", "super_parent_id": ""},
+    ]
+    ids_list = local_storage_obj.get_documents_from_doc_id_storage("calendar")["global_keys"]
+    for document in documents:
+        ids_list.add(document)
+
+    # Execute
+    for stored_ids in (ids_list, documents):
+        meetings = local_storage_obj.filter_documents(stored_ids, "Meeting")
+        user_meetings = local_storage_obj.filter_documents(stored_ids, "Meeting", "user1")
+
+        # Assert
+        assert sorted(item["id"] for item in meetings) == ["event1", "event2"]
+        assert list(user_meetings) == [documents[1]]
+
+
+def test_migrate_storage_to_dictionary_of_strings(tmp_path):
+    """This method test that the entries stored with the previous layout are migrated to the dictionary of strings"""
+    # Setup
+    logger = logging.getLogger("unit_test_local_storage")
+    storage_path = str(tmp_path / "doc_ids.db")
+    connection = sqlite3.connect(storage_path)
+    connection.execute(
+        "CREATE TABLE doc_ids (object_type TEXT NOT NULL, id TEXT NOT NULL, type TEXT NOT NULL, "
+        "parent_id TEXT NOT NULL, super_parent_id TEXT NOT NULL, "
+        "PRIMARY KEY (object_type, id, type, parent_id, super_parent_id)) WITHOUT ROWID"
+    )
+    connection.executemany(
+        "INSERT INTO doc_ids VALUES (?, ?, ?, ?, ?)",
+        [("teams", "1", "channel messages", "xyz123", "pqr123"), ("teams", "2", "channel messages", "xyz123", "")],
+    )
+    connection.commit()
+    connection.close()
+    local_storage_obj = LocalStorage(logger, storage_path)
+    local_storage_obj.ids_path_dict = {}
+
+    # Execute
+    global_keys = list(local_storage_obj.get_documents_from_doc_id_storage("teams")["global_keys"])
+
+    # Assert
+    assert global_keys == [
+        {"id": "1", "type": "channel messages", "parent_id": "xyz123", "super_parent_id": "pqr123"},
+        {"id": "2", "type": "channel messages", "parent_id": "xyz123", "super_parent_id": ""},
+    ]
+    connection = local_storage_obj.get_connection()
+    assert connection.execute("SELECT COUNT(*) FROM strings").fetchone()[0] == 5
+    assert connection.execute("SELECT DISTINCT typeof(type) FROM doc_ids").fetchall() == [("integer",)]
+    assert connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND name = 'doc_ids_by_parent'"
+    ).fetchone()
+
+
+def test_upsert_documents_after_rollback(tmp_path):
+    """This method test that the strings added by a rolled back transaction are not reused for other strings"""
+    # Setup
+    logger = logging.getLogger("unit_test_local_storage")
+    local_storage_obj = LocalStorage(logger, str(tmp_path / "doc_ids.db"))
+    local_storage_obj.ids_path_dict = {}
+
+    def failing_documents():
+        yield {"id": "1", "type": "teams"}
+        raise sqlite3.Error("failed")
+
+    with pytest.raises(sqlite3.Error):
+        local_storage_obj.upsert_documents("teams", failing_documents())
+
+    # Execute
+    local_storage_obj.upsert_documents("other", [{"id": "2", "type": "other"}])
+    local_storage_obj.upsert_documents("teams", [{"id": "3", "type": "teams"}])
+
+    # Assert
+    assert list(local_storage_obj.iterate_documents("teams")) == [
+        {"id": "3", "type": "teams", "parent_id": "", "super_parent_id": ""}
+    ]
+    assert list(local_storage_obj.iterate_documents("other")) == [
+        {"id": "2", "type": "other", "parent_id": "", "super_parent_id": ""}
+    ]
 
 
 @pytest.mark.parametrize(
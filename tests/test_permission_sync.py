@@ -7,7 +7,9 @@ import argparse
 import logging
 import os
 import sys
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
+
+import pytest
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
@@ -15,6 +17,7 @@ from ees_microsoft_teams.base_command import BaseCommand
 from ees_microsoft_teams.configuration import Configuration  # noqa
 from ees_microsoft_teams.permission_sync_command import \
     PermissionSyncCommand  # noqa
+from ees_microsoft_teams.user_mapping import UserMapping  # noqa
 from elastic_enterprise_search import __version__
 from packaging import version
 
@@ -83,3 +86,71 @@ def test_list_user_permissions():
         )
     target_permission = permission_sync_obj.list_user_permissions()
     assert target_permission == {"Dummy": ["19"]}
+
+
+def test_get_desired_permissions(tmp_path):
+    """Test that the permissions of the objects are merged by mapped and lowercased user"""
+    # Setup
+    permission_sync_obj = create_permission_sync_obj()
+    objects_permissions = [{"User1": ["team1"], "User2": ["team2"]}, {"user1": ["chat1"]}]
+    mapping_path = tmp_path / "user_mapping.csv"
+    mapping_path.write_text("User2,Mapped2\n", encoding="utf-8")
+    _, logger = settings()
+
+    # Execute
+    desired_permissions = permission_sync_obj.get_desired_permissions(
+        objects_permissions, UserMapping(logger, str(mapping_path))
+    )
+
+    # Assert
+    assert desired_permissions == {"user1": {"team1", "chat1"}, "mapped2": {"team2"}}
+
+
+def test_reconcile_permissions_removes_only_stale_permissions():
+    """Test that only the users having permissions not granted by Microsoft Teams anymore are updated"""
+    # Setup
+    permission_sync_obj = create_permission_sync_obj()
+    permission_sync_obj.list_user_permissions = Mock(
+        return_value={"User1": ["team1", "chat1"], "User2": ["team2"], "User3": ["team3"]}
+    )
+    client = permission_sync_obj.workplace_search_custom_client
+    client.add_permissions = Mock()
+    client.remove_permissions = Mock()
+
+    # Execute
+    _, logger = settings()
+    permission_sync_obj.reconcile_permissions([{"user1": ["team1"], "user2": ["team2"]}], UserMapping(logger, ""))
+
+    # Assert
+    if version.parse(__version__) >= ENTERPRISE_V8:
+        client.add_permissions.assert_called_once_with("User1", ["team1"])
+        client.remove_permissions.assert_called_once_with({"external_user_properties": [{"attribute_value": "User3"}]})
+    else:
+        client.add_permissions.assert_not_called()
+        assert sorted(call.args[0]["user"] for call in client.remove_permissions.call_args_list) == ["User1", "User3"]
+
+
+def test_remove_object_permissions_when_a_calendar_user_fails():
+    """Test that a user failing to fetch its calendar events aborts the permission removal"""
+    # Setup
+    args = argparse.Namespace()
+    args.config_file = CONFIG_FILE
+    base_cmd = BaseCommand(args)
+    base_cmd.get_access_token = Mock(return_value="token")
+    base_cmd.microsoft_team_channel_object = Mock()
+    base_cmd.microsoft_team_channel_object.return_value.get_team_members.return_value = {}
+    base_cmd.microsoft_user_chats_object = Mock()
+    base_cmd.microsoft_user_chats_object.return_value.get_user_chats.return_value = ({}, [])
+    calendar_object = base_cmd.microsoft_calendar_object("token")
+    calendar_object.users_obj = Mock()
+    calendar_object.users_obj.get_all_users.return_value = [{"userId": "user1", "displayName": "User 1"}]
+    calendar_object.get_user_calendars = Mock(side_effect=ValueError("failed"))
+    base_cmd.microsoft_calendar_object = Mock(return_value=calendar_object)
+
+    # Execute
+    with patch.object(PermissionSyncCommand, "reconcile_permissions") as mock_reconcile_permissions:
+        with pytest.raises(ValueError):
+            base_cmd.remove_object_permissions("2022-01-01T00:00:00Z")
+
+    # Assert
+    mock_reconcile_permissions.assert_not_called()
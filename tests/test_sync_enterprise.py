@@ -8,14 +8,20 @@ import argparse
 import logging
 import os
 import sys
+import threading
 
 import pytest
+from elastic_enterprise_search import PayloadTooLargeError, __version__
+from packaging import version
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from unittest.mock import Mock
 
 from ees_microsoft_teams.base_command import BaseCommand
 from ees_microsoft_teams.configuration import Configuration
+from ees_microsoft_teams.connector_queue import ConnectorQueue
+from ees_microsoft_teams.document_fingerprints import DocumentFingerprintStore
+from ees_microsoft_teams.local_storage import LocalStorage
 from ees_microsoft_teams.sync_enterprise_search import SyncEnterpriseSearch
 
 CONFIG_FILE = os.path.join(
@@ -23,6 +29,8 @@ CONFIG_FILE = os.path.join(
     "microsoft_teams_connector.yml",
 )
 
+ENTERPRISE_V8 = version.parse("8.0")
+
 USER_MAPPING = os.path.join(
     os.path.abspath(os.path.join(os.path.dirname(__file__), "..")),
     "user_mapping.csv",
@@ -39,6 +47,13 @@ def settings():
     return configuration, logger
 
 
+def create_payload_too_large_error():
+    """This function creates the error raised by the installed client when a request is rejected as too large."""
+    if version.parse(__version__) >= ENTERPRISE_V8:
+        return PayloadTooLargeError("Payload Too Large", meta=Mock(status=413), body={})
+    return PayloadTooLargeError("Payload Too Large", status=413)
+
+
 def create_sync_enterprise_obj():
     """This function create Workplace Search object for test.
     """
@@ -51,36 +66,6 @@ def create_sync_enterprise_obj():
     )
 
 
-def test_get_records_by_object_types():
-    """Test for grouping records by object type"""
-    # Setup
-    enterprise_obj = create_sync_enterprise_obj()
-    documents = [
-        {
-            "id": 0,
-            "title": "demo",
-            "body": "Not much. It is a made up thing.",
-            "url": "https://teams.microsoft.com/demo.txt",
-            "created_at": "2019-06-01T12:00:00+00:00",
-            "type": "User Chat Messages",
-        },
-        {
-            "id": 1,
-            "title": "demo1",
-            "body": "Not much. It is a made up thing.",
-            "url": "https://teams.microsoft.com/demo.txt",
-            "created_at": "2019-06-01T12:00:00+00:00",
-            "type": "Channel Chat message",
-        }
-    ]
-
-    # Execute
-    target_records_type = enterprise_obj.get_records_by_types(documents)
-
-    # Assert
-    assert target_records_type == {'User Chat Messages': 1, 'Channel Chat message': 1}
-
-
 @pytest.mark.parametrize(
     "source_documents, mock_documents",
     [
@@ -161,6 +146,111 @@ def test_index_document_when_error_occurs(
     assert error_msg in caplog.text
 
 
+def test_index_documents_returns_result_by_type_and_error():
+    """Test that the indexing result counts the indexed and failed documents by their type and error"""
+    # Setup
+    enterprise_obj = create_sync_enterprise_obj()
+    documents = [
+        {"id": "0", "type": "user_chats"},
+        {"id": "1", "type": "user_chats"},
+        {"id": "2", "type": "calendar"},
+    ]
+    enterprise_obj.workplace_search_custom_client.workplace_search_client.index_documents = Mock(
+        return_value={
+            "results": [
+                {"id": "0", "errors": []},
+                {"id": "1", "errors": ["Title is too long"]},
+                {"id": "2", "errors": ["Title is too long"]},
+            ]
+        }
+    )
+
+    # Execute
+    result = enterprise_obj.index_documents(documents)
+
+    # Assert
+    assert result.total == {"user_chats": 2, "calendar": 1}
+    assert result.indexed == {"user_chats": 1}
+    assert result.failed == {"user_chats": 1, "calendar": 1}
+    assert result.errors == {"Title is too long": 2}
+    assert enterprise_obj.indexing_result.failed == result.failed
+
+
+def test_log_indexing_result(caplog):
+    """Test that the indexed and failed documents of all the batches are logged by their type"""
+    # Setup
+    caplog.set_level("INFO")
+    enterprise_obj = create_sync_enterprise_obj()
+    enterprise_obj.workplace_search_custom_client.workplace_search_client.index_documents = Mock(
+        side_effect=[
+            {"results": [{"id": "0", "errors": []}, {"id": "1", "errors": ["Title is too long"]}]},
+            {"results": [{"id": "2", "errors": []}]},
+        ]
+    )
+    enterprise_obj.index_documents([{"id": "0", "type": "user_chats"}, {"id": "1", "type": "user_chats"}])
+    enterprise_obj.index_documents([{"id": "2", "type": "user_chats"}])
+
+    # Execute
+    result = enterprise_obj.log_indexing_result()
+
+    # Assert
+    assert result.indexed == {"user_chats": 2}
+    assert result.failed == {"user_chats": 1}
+    assert "Indexed 2 of 3 user_chats documents, 1 failed" in caplog.text
+    assert "1 documents failed to index with the error: Title is too long" in caplog.text
+
+
+def test_index_documents_splits_batch_rejected_as_too_large():
+    """Test that a batch rejected as too large is indexed in smaller batches and lowers the batch limit"""
+    # Setup
+    enterprise_obj = create_sync_enterprise_obj()
+    documents = [{"id": str(count), "type": "user_chats", "body": "a" * 40} for count in range(4)]
+
+    def index_documents(content_source_id, documents, request_timeout):
+        if len(documents) > 2:
+            raise create_payload_too_large_error()
+        return {"results": [{"id": document["id"], "errors": []} for document in documents]}
+
+    enterprise_obj.workplace_search_custom_client.workplace_search_client.index_documents = Mock(
+        side_effect=index_documents
+    )
+
+    # Execute
+    enterprise_obj.index_documents(documents)
+
+    # Assert
+    indexed_batches = [
+        call.kwargs["documents"]
+        for call in enterprise_obj.workplace_search_custom_client.workplace_search_client.index_documents.call_args_list
+    ]
+    assert indexed_batches == [documents, documents[:2], documents[2:]]
+    assert enterprise_obj.max_allowed_bytes < 10000000
+
+
+def test_index_documents_drops_body_of_document_rejected_as_too_large(caplog):
+    """Test that a single document rejected as too large is indexed without its body"""
+    # Setup
+    caplog.set_level("INFO")
+    enterprise_obj = create_sync_enterprise_obj()
+    document = {"id": "0", "type": "user_chats", "body": "a" * 40}
+
+    def index_documents(content_source_id, documents, request_timeout):
+        if documents[0]["body"]:
+            raise create_payload_too_large_error()
+        return {"results": [{"id": "0", "errors": []}]}
+
+    enterprise_obj.workplace_search_custom_client.workplace_search_client.index_documents = Mock(
+        side_effect=index_documents
+    )
+
+    # Execute
+    enterprise_obj.index_documents([document])
+
+    # Assert
+    assert document["body"] is None
+    assert "Total 1 user_chats indexed out of 1." in caplog.text
+
+
 def test_add_permission_to_workplace(caplog):
     """Test that add permission to Enterprise Search."""
     # Setup
@@ -178,6 +268,33 @@ def test_add_permission_to_workplace(caplog):
     mock.enterprise_obj.workplace_add_permission.assert_called()
 
 
+def test_add_permission_updates_only_changed_users():
+    """Test that the permissions are listed once and only the users getting new permissions are updated."""
+    # Setup
+    enterprise_obj = create_sync_enterprise_obj()
+    enterprise_obj.workplace_search_custom_client.list_permissions = Mock(
+        return_value={
+            "results": [
+                {"user": "user1", "permissions": ["permission1", "permission2"]},
+                {"user": "user2", "permissions": ["permission1"]},
+            ]
+        }
+    )
+    enterprise_obj.workplace_search_custom_client.add_permissions = Mock()
+
+    # Execute
+    enterprise_obj.workplace_add_permission(
+        {"user1": ["permission2"], "user2": ["permission2"], "user3": ["permission3"]}
+    )
+
+    # Assert
+    enterprise_obj.workplace_search_custom_client.list_permissions.assert_called_once()
+    assert [call.args for call in enterprise_obj.workplace_search_custom_client.add_permissions.call_args_list] == [
+        ("user2", ["permission1", "permission2"]),
+        ("user3", ["permission3"]),
+    ]
+
+
 @pytest.mark.parametrize(
     "deleted_ids",
     [
@@ -197,3 +314,123 @@ def test_sync_deleted_documents(deleted_ids):
     # Execute and Assert
     enterprise_obj.delete_documents(deleted_ids)
     enterprise_obj.workplace_search_custom_client.workplace_search_client.delete_documents.assert_called()
+
+
+def test_perform_sync_stops_batch_at_byte_limit():
+    """Test that the documents pulled from the queue are batched by their serialized size"""
+    # Setup
+    enterprise_obj = create_sync_enterprise_obj()
+    _, logger = settings()
+    enterprise_obj.queue = ConnectorQueue(logger)
+    enterprise_obj.max_allowed_bytes = 100
+    enterprise_obj.index_documents = Mock()
+    documents = [{"id": str(count), "body": "a" * 40} for count in range(3)]
+    for document in documents:
+        enterprise_obj.queue.append_to_queue("document_list", [document])
+    enterprise_obj.queue.end_signal()
+
+    # Execute
+    enterprise_obj.perform_sync()
+
+    # Assert
+    indexed_batches = [call.args[0] for call in enterprise_obj.index_documents.call_args_list]
+    assert all(not (documents[0] in batch and documents[2] in batch) for batch in indexed_batches)
+    assert any(documents[2] in batch for batch in indexed_batches)
+
+
+def test_perform_sync_indexes_each_batch_once():
+    """Test that each document is indexed once in batches limited by their size"""
+    # Setup
+    enterprise_obj = create_sync_enterprise_obj()
+    _, logger = settings()
+    enterprise_obj.queue = ConnectorQueue(logger)
+    enterprise_obj.max_allowed_bytes = 100
+    enterprise_obj.index_documents = Mock()
+    documents = [{"id": str(count), "body": "a" * 20} for count in range(3)]
+    enterprise_obj.queue.append_to_queue("document_list", documents)
+    enterprise_obj.queue.end_signal()
+
+    # Execute
+    enterprise_obj.perform_sync()
+
+    # Assert
+    indexed_batches = [call.args[0] for call in enterprise_obj.index_documents.call_args_list]
+    assert indexed_batches == [documents[:2], documents[2:]]
+
+
+def test_perform_sync_indexes_batches_concurrently():
+    """Test that the batches are indexed in parallel and all of them are indexed when perform_sync returns"""
+    # Setup
+    enterprise_obj = create_sync_enterprise_obj()
+    _, logger = settings()
+    enterprise_obj.queue = ConnectorQueue(logger)
+    enterprise_obj.max_allowed_bytes = 100
+    enterprise_obj.indexing_concurrency = 2
+    documents = [{"id": str(count), "body": "a" * 40} for count in range(2)]
+    batches_in_flight = threading.Barrier(2, timeout=5)
+    indexed_documents = []
+
+    def index_documents(batch, fingerprints):
+        batches_in_flight.wait()
+        indexed_documents.extend(batch)
+
+    enterprise_obj.index_documents = Mock(side_effect=index_documents)
+    enterprise_obj.queue.append_to_queue("document_list", documents)
+    enterprise_obj.queue.end_signal()
+
+    # Execute
+    enterprise_obj.perform_sync()
+
+    # Assert
+    assert sorted(indexed_documents, key=lambda document: document["id"]) == documents
+
+
+def test_perform_sync_skips_duplicate_documents():
+    """Test that the duplicate documents are indexed once across the batches unless they are updated"""
+    # Setup
+    enterprise_obj = create_sync_enterprise_obj()
+    _, logger = settings()
+    enterprise_obj.queue = ConnectorQueue(logger)
+    enterprise_obj.index_documents = Mock()
+    old_document = {"id": "1", "type": "Meeting", "last_updated": "2022-01-01T00:00:00Z"}
+    new_document = {"id": "1", "type": "Meeting", "last_updated": "2022-02-01T00:00:00Z"}
+    enterprise_obj.queue.append_to_queue("document_list", [old_document, dict(old_document)])
+    enterprise_obj.queue.put_checkpoint("calendar", "2022-05-24T14:11:14Z", "full")
+    enterprise_obj.queue.append_to_queue("document_list", [dict(old_document)])
+    enterprise_obj.queue.put_checkpoint("calendar", "2022-05-24T14:11:14Z", "full")
+    enterprise_obj.queue.append_to_queue("document_list", [new_document])
+    enterprise_obj.queue.end_signal()
+
+    # Execute
+    enterprise_obj.perform_sync()
+
+    # Assert
+    indexed_batches = [call.args[0] for call in enterprise_obj.index_documents.call_args_list]
+    assert indexed_batches == [[old_document], [new_document]]
+
+
+def test_perform_sync_skips_unchanged_documents(tmp_path):
+    """Test that the documents indexed with the same fingerprint are skipped and the failed ones are sent again"""
+    # Setup
+    enterprise_obj = create_sync_enterprise_obj()
+    _, logger = settings()
+    enterprise_obj.fingerprint_store = DocumentFingerprintStore(logger, LocalStorage(logger, str(tmp_path / "ids.db")))
+    documents = [{"id": str(count), "type": "teams", "title": "demo"} for count in range(2)]
+    enterprise_obj.workplace_search_custom_client.workplace_search_client.index_documents = Mock(
+        return_value={"results": [{"id": "0", "errors": []}, {"id": "1", "errors": ["not indexed"]}]}
+    )
+    for _ in range(2):
+        enterprise_obj.queue = ConnectorQueue(logger)
+        enterprise_obj.indexed_versions.clear()
+        enterprise_obj.queue.append_to_queue("document_list", [dict(document) for document in documents])
+        enterprise_obj.queue.end_signal()
+
+        # Execute
+        enterprise_obj.perform_sync()
+
+    # Assert
+    indexed_batches = [
+        call.kwargs["documents"]
+        for call in enterprise_obj.workplace_search_custom_client.workplace_search_client.index_documents.call_args_list
+    ]
+    assert indexed_batches == [documents, [documents[1]]]
@@ -6,6 +6,7 @@
 import logging
 import os
 import sys
+from unittest.mock import Mock
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
@@ -54,3 +55,19 @@ def test_add_permissions_to_queue():
 
     # Assert
     assert size == 1
+
+
+def test_fetch_user_chat_messages():
+    """Test that the documents of each chat object are queued as soon as they are fetched"""
+    # Setup
+    sync_obj = create_object_of_sync_microsoft_teams()
+    chats_obj = Mock()
+    chats_obj.get_user_chat_messages = Mock(return_value=iter([[{"id": "1"}], [], [{"id": "2"}, {"id": "3"}]]))
+
+    # Execute
+    sync_obj.fetch_user_chat_messages(chats_obj, [], {}, "start", "end", "token", {}, [{"id": "chat1"}])
+
+    # Assert
+    assert sync_obj.queue.qsize() == 2
+    assert sync_obj.queue.get()["data"] == [{"id": "1"}]
+    assert sync_obj.queue.get()["data"] == [{"id": "2"}, {"id": "3"}]
@@ -0,0 +1,94 @@
+#
+# Copyright Elasticsearch B.V. and/or licensed to Elasticsearch B.V. under one
+# or more contributor license agreements. Licensed under the Elastic License 2.0;
+# you may not use this file except in compliance with the Elastic License 2.0.
+#
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from ees_microsoft_teams.user_drive_cache import UserDriveCache  # noqa
+
+logger = logging.getLogger("unit_test_user_drive_cache")
+
+
+def test_get_chat_files_folder_fetches_once_per_user():
+    """Test that concurrent lookups of the same user fetch its drive only once"""
+    # Setup
+    cache = UserDriveCache(logger, 24, cache_path="")
+    barrier = threading.Barrier(5)
+
+    def fetch_chat_files_folder(user_id):
+        time.sleep(0.05)
+        return f"{user_id}-drive", f"{user_id}-folder"
+
+    fetch = Mock(side_effect=fetch_chat_files_folder)
+
+    def lookup(_):
+        barrier.wait()
+        return cache.get_chat_files_folder("user1", fetch)
+
+    # Execute
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        results = list(executor.map(lookup, range(5)))
+
+    # Assert
+    assert fetch.call_count == 1
+    assert results == [("user1-drive", "user1-folder")] * 5
+
+
+def test_get_chat_files_folder_when_drive_is_missing():
+    """Test that the users without a drive are not cached"""
+    # Setup
+    cache = UserDriveCache(logger, 24, cache_path="")
+    fetch = Mock(return_value=(None, None))
+
+    # Execute
+    cache.get_chat_files_folder("user1", fetch)
+    target_ids = cache.get_chat_files_folder("user1", fetch)
+
+    # Assert
+    assert target_ids == (None, None)
+    assert fetch.call_count == 2
+
+
+def test_save_and_load(tmp_path):
+    """Test that the cached drives are reused by the next run until they expire"""
+    # Setup
+    cache_path = str(tmp_path / "user_drives.json")
+    cache = UserDriveCache(logger, 24, cache_path=cache_path)
+    cache.get_chat_files_folder("user1", Mock(return_value=("drive1", "folder1")))
+    cache.get_chat_files_folder("user2", Mock(return_value=("drive2", None)))
+
+    # Execute
+    cache.save()
+    next_run_cache = UserDriveCache(logger, 24, cache_path=cache_path)
+    fetch = Mock()
+
+    # Assert
+    assert next_run_cache.get_chat_files_folder("user1", fetch) == ("drive1", "folder1")
+    fetch.assert_not_called()
+    assert "user2" not in next_run_cache.user_drives
+
+
+def test_load_drops_expired_entries(tmp_path):
+    """Test that the entries older than the time-to-live are fetched again"""
+    # Setup
+    cache_path = str(tmp_path / "user_drives.json")
+    with open(cache_path, "w", encoding="utf-8") as cache_file:
+        json.dump(
+            {"user1": {"drive_id": "drive1", "item_id": "folder1", "updated_at": time.time() - 2 * 3600}}, cache_file
+        )
+
+    # Execute
+    cache = UserDriveCache(logger, 1, cache_path=cache_path)
+
+    # Assert
+    assert cache.user_drives == {}
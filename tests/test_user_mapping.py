@@ -0,0 +1,47 @@
+#
+# Copyright Elasticsearch B.V. and/or licensed to Elasticsearch B.V. under one
+# or more contributor license agreements. Licensed under the Elastic License 2.0;
+# you may not use this file except in compliance with the Elastic License 2.0.
+#
+
+import logging
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from ees_microsoft_teams.user_mapping import UserMapping, get_user_mapping  # noqa
+
+logger = logging.getLogger("unit_test_user_mapping")
+
+
+def test_get_workplace_user(tmp_path):
+    """Test that the users are looked up by their exact name first and then regardless of their case"""
+    # Setup
+    mapping_path = tmp_path / "user_mapping.csv"
+    mapping_path.write_text("Dummy User,dummy\nDUMMY USER,other\nSecond User,second\n", encoding="utf-8")
+    user_mapping = UserMapping(logger, str(mapping_path))
+
+    # Execute and Assert
+    assert user_mapping.get_workplace_user("DUMMY USER") == "other"
+    assert user_mapping.get_workplace_user("second user") == "second"
+    assert user_mapping.get_workplace_user("Unmapped User") == "Unmapped User"
+
+
+def test_mapping_is_parsed_again_only_when_the_file_changes(tmp_path):
+    """Test that the mapping file is parsed once until its size or modification time changes"""
+    # Setup
+    mapping_path = tmp_path / "user_mapping.csv"
+    mapping_path.write_text("Dummy User,dummy\n", encoding="utf-8")
+    user_mapping = get_user_mapping(logger, str(mapping_path))
+
+    # Execute
+    with patch("ees_microsoft_teams.user_mapping.csv.reader", wraps=__import__("csv").reader) as reader:
+        for _ in range(3):
+            user_mapping.get_workplace_user("Dummy User")
+        mapping_path.write_text("Dummy User,dummy\nSecond User,second\n", encoding="utf-8")
+        mapped_user = get_user_mapping(logger, str(mapping_path)).get_workplace_user("Second User")
+
+    # Assert
+    assert reader.call_count == 2
+    assert mapped_user == "second"
@@ -11,12 +11,13 @@ import sys
 import pytest
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 from ees_microsoft_teams.configuration import Configuration
 from ees_microsoft_teams.microsoft_teams_user_messages import \
     MSTeamsUserMessage
 from ees_microsoft_teams.local_storage import LocalStorage
+from ees_microsoft_teams.microsoft_teams_client import MSTeamsClient
 
 CONFIG_FILE = os.path.join(
     os.path.join(os.path.dirname(__file__), "config"),
@@ -230,9 +231,262 @@ def test_get_user_chat_messages(chat_data, mock_chat_messages_document, source_d
     # Execute
     user_message_obj.client.get_user_chat_messages = Mock(return_value=mock_chat_messages_document)
     user_message_obj.fetch_tabs = Mock(return_value=[])
-    target_documents = user_message_obj.get_user_chat_messages(
-        [1, 2], {}, chat_data, '2020-12-08T23:53:05.801Z', '2020-12-08T23:53:05.801Z', 'token'
-    )
+    target_documents = [
+        document for documents in user_message_obj.get_user_chat_messages(
+            [1, 2], {}, chat_data, '2020-12-08T23:53:05.801Z', '2020-12-08T23:53:05.801Z', 'token'
+        ) for document in documents
+    ]
 
     # Assert
     assert source_documents == target_documents
+
+
+def test_get_chat_export_users():
+    """Test that every chat is exported through only one of its members"""
+    # Setup
+    user_message_obj = create_user_message_obj()
+    chats = [
+        {"id": "chat1", "members": [{"userId": "user1"}, {"userId": "user2"}]},
+        {"id": "chat2", "members": [{"userId": "user2"}, {"userId": "user3"}]},
+        {"id": "chat3", "members": [{"userId": "user3"}, {"userId": None}]},
+        {"id": "chat4", "members": [{"userId": None}]},
+    ]
+
+    # Execute
+    export_users = user_message_obj.get_chat_export_users(chats)
+
+    # Assert
+    assert export_users == {"user2": {"chat1", "chat2"}, "user3": {"chat3"}}
+
+
+def test_get_exported_chat_messages():
+    """Test that the exported messages are routed to their chats"""
+    # Setup
+    user_message_obj = create_user_message_obj()
+    chats = [
+        {"id": "chat1", "members": [{"userId": "user1"}]},
+        {"id": "chat2", "members": [{"userId": "user1"}]},
+    ]
+    messages = [
+        {"id": "1", "chatId": "chat1"},
+        {"id": "2", "chatId": "chat3"},
+        {"id": "3", "chatId": "chat1"},
+    ]
+
+    # Execute
+    with patch.object(MSTeamsClient, "get_all_user_chat_messages", return_value=messages) as mock_export:
+        exported_chat_messages = user_message_obj.get_exported_chat_messages(chats, "start", "end", "token")
+
+    # Assert
+    assert exported_chat_messages == {"chat1": [messages[0], messages[2]], "chat2": []}
+    mock_export.assert_called_once_with(
+        "https://graph.microsoft.com/v1.0/users/user1/chats/getAllMessages", "start", "end", "user1"
+    )
+
+
+def test_get_exported_chat_messages_when_export_fails():
+    """Test that the chats of a user whose export failed are left to the per-chat fallback"""
+    # Setup
+    user_message_obj = create_user_message_obj()
+    chats = [
+        {"id": "chat1", "members": [{"userId": "user1"}]},
+        {"id": "chat2", "members": [{"userId": "user2"}]},
+    ]
+
+    def get_all_user_chat_messages(url, start_time, end_time, user_id):
+        return None if user_id == "user1" else [{"id": "1", "chatId": "chat2"}]
+
+    # Execute
+    with patch.object(MSTeamsClient, "get_all_user_chat_messages", side_effect=get_all_user_chat_messages):
+        exported_chat_messages = user_message_obj.get_exported_chat_messages(chats, "start", "end", "token")
+
+    # Assert
+    assert exported_chat_messages == {"chat2": [{"id": "1", "chatId": "chat2"}]}
+
+
+def test_get_all_user_chat_messages_when_export_is_refused():
+    """Test that a refused export is reported as failed instead of empty"""
+    # Setup
+    configs, logger = settings()
+    client = MSTeamsClient(logger, "token", configs)
+    response = Mock(status_code=403, reason="Forbidden")
+    response.json = Mock(return_value={"error": {"code": "Forbidden"}})
+
+    # Execute
+    with patch("ees_microsoft_teams.microsoft_teams_requests.requests.get", return_value=response):
+        messages = client.get_all_user_chat_messages(
+            "https://graph.microsoft.com/v1.0/users/user1/chats/getAllMessages", "start", "end", "user1"
+        )
+
+    # Assert
+    assert messages is None
+
+
+def test_get_user_chat_messages_from_exported_messages():
+    """Test that the exported messages are used instead of fetching the messages of the chat"""
+    # Setup
+    user_message_obj = create_user_message_obj()
+    user_message_obj.client.get_user_chat_messages = Mock(return_value=[])
+    user_message_obj.fetch_tabs = Mock(return_value=[])
+    chat = {"id": "chat1", "topic": "Topic", "webUrl": "http://test.com", "members": []}
+    message = {
+        "id": "1", "lastModifiedDateTime": "2021-03-28T20:48:29.832Z", "createdDateTime": "2021-03-28T20:48:29.832Z",
+        "deletedDateTime": None, "from": None, "eventDetail": None, "attachments": [],
+        "body": {"content": "Hello world"}
+    }
+
+    # Execute
+    target_documents = [
+        document for documents in user_message_obj.get_user_chat_messages(
+            [], {}, [chat], "start", "end", "token", {"chat1": [message]}
+        ) for document in documents
+    ]
+
+    # Assert
+    user_message_obj.client.get_user_chat_messages.assert_not_called()
+    assert target_documents[0]["body"] == "Hello world"
+
+
+def test_get_attachments_from_content_url():
+    """Test that the attachment is resolved from its url without looking up the user drive"""
+    # Setup
+    user_message_obj = create_user_message_obj()
+    attachment_client = Mock()
+    attachment_client.get_shared_drive_item = Mock(return_value={
+        "id": "file1",
+        "webUrl": "https://contoso-my.sharepoint.com/file.docx",
+        "file": {"mimeType": "application/msword"},
+        "@microsoft.graph.downloadUrl": "https://download",
+        "parentReference": {"driveId": "drive1", "id": "folder1"},
+    })
+    user_drive = Mock()
+    ids_list = []
+
+    # Execute
+    with patch("ees_microsoft_teams.microsoft_teams_user_messages.requests.get", return_value=Mock(content=b"x")), \
+            patch("ees_microsoft_teams.microsoft_teams_user_messages.extract_api_response", return_value="content"):
+        target_documents = user_message_obj.get_attachments(
+            "user1", "chat", "file.docx", "attachment1", "chat1", "2021-03-28T20:48:29.832Z", ids_list, user_drive,
+            attachment_client, "https://contoso-my.sharepoint.com/file.docx"
+        )
+
+    # Assert
+    user_drive.get_chat_files_folder.assert_not_called()
+    attachment_client.get_user_chat_attachment_drive_children.assert_not_called()
+    assert target_documents[0]["id"] == "attachment1"
+    assert target_documents[0]["body"] == "content"
+    assert {
+        "id": "attachment1", "type": "User Chat Attachments", "parent_id": "folder1", "super_parent_id": "drive1"
+    } in ids_list
+
+
+def test_get_user_chat_messages_fetches_attachments_and_tabs():
+    """Test that the messages, attachments and tabs of the chats are merged into the documents"""
+    # Setup
+    user_message_obj = create_user_message_obj()
+    chats = [
+        {"id": f"chat{index}", "topic": "Topic", "webUrl": "http://test.com", "members": []} for index in range(3)
+    ]
+    message = {
+        "id": "1", "lastModifiedDateTime": "2021-03-28T20:48:29.832Z", "createdDateTime": "2021-03-28T20:48:29.832Z",
+        "deletedDateTime": None, "from": {"user": {"id": "user1", "displayName": "Tony Stark"}},
+        "eventDetail": None, "body": {"content": "Hello world"},
+        "attachments": [{"id": "attachment1", "name": "file.docx", "contentType": "reference", "contentUrl": "url"}],
+    }
+    user_message_obj.client.get_user_chat_messages = Mock(return_value=[message])
+    user_message_obj.fetch_tabs = Mock(side_effect=lambda chat_id, *args: [{"id": f"{chat_id}-tab"}])
+    user_message_obj.get_attachments = Mock(side_effect=lambda *args: [{"id": f"{args[4]}-attachment"}])
+
+    # Execute
+    target_documents = list(user_message_obj.get_user_chat_messages(
+        [], {}, chats, "start", "end", "token"
+    ))
+
+    # Assert
+    assert len(target_documents) == 9
+    assert all(len(documents) == 1 for documents in target_documents)
+    target_documents = [document for documents in target_documents for document in documents]
+    target_ids = [document["id"] for document in target_documents]
+    for index in range(3):
+        assert f"chat{index}-tab" in target_ids
+        assert f"chat{index}-attachment" in target_ids
+    assert user_message_obj.get_attachments.call_args_list[0].args[-1] == "url"
+
+
+def test_get_user_chat_messages_when_messages_fail(caplog):
+    """Test that an error while fetching the objects of a chat is logged without stopping the other chats"""
+    # Setup
+    user_message_obj = create_user_message_obj()
+    chats = [
+        {"id": f"chat{index}", "topic": "Topic", "webUrl": "http://test.com", "members": []} for index in range(2)
+    ]
+    message = {
+        "id": "1", "lastModifiedDateTime": "2021-03-28T20:48:29.832Z", "createdDateTime": "2021-03-28T20:48:29.832Z",
+        "deletedDateTime": None, "from": None, "eventDetail": None, "attachments": [],
+        "body": {"content": "Hello world"}
+    }
+
+    def get_user_chat_messages(url, start_time, end_time, chat_id):
+        if chat_id == "chat0":
+            raise ValueError("failed")
+        return [message]
+
+    user_message_obj.client.get_user_chat_messages = Mock(side_effect=get_user_chat_messages)
+    user_message_obj.fetch_tabs = Mock(side_effect=lambda chat_id, *args: [{"id": f"{chat_id}-tab"}])
+
+    # Execute
+    target_documents = [
+        document for documents in user_message_obj.get_user_chat_messages([], {}, chats, "start", "end", "token")
+        for document in documents
+    ]
+
+    # Assert
+    assert sorted(document["id"] for document in target_documents) == ["1", "chat0-tab", "chat1-tab"]
+    assert "Error while fetching user chats details for chat: chat0" in caplog.text
+
+
+def test_get_active_chats():
+    """Test that the chats without any activity since the start time are skipped"""
+    # Setup
+    user_message_obj = create_user_message_obj()
+    chats = [
+        {"id": "dormant", "lastUpdatedDateTime": "2021-01-01T10:00:00.000Z", "lastMessagePreview": None},
+        {"id": "updated", "lastUpdatedDateTime": "2022-01-01T10:00:00.511Z"},
+        {
+            "id": "new_message", "lastUpdatedDateTime": "2021-01-01T10:00:00.000Z",
+            "lastMessagePreview": {"createdDateTime": "2022-01-01T10:00:00.000Z"}
+        },
+        {"id": "same_second", "lastUpdatedDateTime": "2022-01-01T00:00:00.511Z"},
+        {"id": "unknown"},
+    ]
+
+    # Execute
+    active_chats = user_message_obj.get_active_chats(chats, "2022-01-01T00:00:00Z")
+
+    # Assert
+    assert [chat["id"] for chat in active_chats] == ["updated", "new_message", "same_second", "unknown"]
+
+
+def test_get_user_chat_message_ids():
+    """Test that the ids of the chat objects are listed without converting or downloading their contents"""
+    # Setup
+    user_message_obj = create_user_message_obj()
+    chat = {"id": "chat1", "members": []}
+    user_message_obj.client.get_user_chat_messages = Mock(return_value=[
+        {
+            "id": "message1", "deletedDateTime": None,
+            "attachments": [{"id": "attachment1", "name": "file.txt", "contentType": "reference"}],
+        },
+        {"id": "message2", "deletedDateTime": "2022-01-01T10:00:00Z", "attachments": []},
+    ])
+    user_message_obj.client.get_user_chat_tabs = Mock(return_value=[{"id": "tab1"}])
+    user_message_obj.get_attachments = Mock()
+
+    # Execute
+    with patch("ees_microsoft_teams.microsoft_teams_user_messages.html_to_text") as mock_html_to_text:
+        documents = user_message_obj.get_user_chat_message_ids([chat], "start", "end")
+
+    # Assert
+    assert documents == [{"id": "message1"}, {"id": "attachment1"}, {"id": "tab1"}]
+    mock_html_to_text.assert_not_called()
+    user_message_obj.get_attachments.assert_not_called()
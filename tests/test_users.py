@@ -4,15 +4,18 @@
 # you may not use this file except in compliance with the Elastic License 2.0.
 #
 
+import json
 import logging
 import os
 import sys
+from unittest.mock import Mock
 
 import pytest
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from ees_microsoft_teams.configuration import Configuration  # noqa
 from ees_microsoft_teams.microsoft_teams_users import MSTeamsUsers  # noqa
+from ees_microsoft_teams.microsoft_teams_requests import ResponseException  # noqa
 
 CONFIG_FILE = os.path.join(
     os.path.join(os.path.dirname(__file__), "config"),
@@ -30,35 +33,43 @@ def settings():
     return configuration, logger
 
 
-def create_users_obj():
+def create_users_obj(directory_path):
     """This function create user object for test.
     """
-    configs, _ = settings()
-    return MSTeamsUsers('token', configs)
+    configs, logger = settings()
+    return MSTeamsUsers('token', logger, configs, directory_path)
 
 
 @pytest.mark.parametrize(
-    "request_return_value, source_users",
+    "request_return_values, source_users",
     [
         (
-            {
-                "@odata.context": "https://graph.microsoft.com/v1.0/$metadata#users",
-                "value": [
-                    {
-                        "businessPhones": [],
-                        "displayName": "Conf Room Adams",
-                        "givenName": "null",
-                        "jobTitle": "null",
-                        "mail": "Adams@M365x214355.onmicrosoft.com",
-                        "mobilePhone": "null",
-                        "officeLocation": "null",
-                        "preferredLanguage": "null",
-                        "surname": "null",
-                        "userPrincipalName": "Adams@M365x214355.onmicrosoft.com",
-                        "id": "6e7b768e-07e2-4810-8459-485f84f8f204"
-                    }
-                ]
-            },
+            [
+                {
+                    "@odata.context": "https://graph.microsoft.com/v1.0/$metadata#users",
+                    "@odata.nextLink": "https://graph.microsoft.com/v1.0/users/delta?$skiptoken=page2",
+                    "value": [
+                        {
+                            "displayName": "Conf Room Adams",
+                            "mail": "Adams@M365x214355.onmicrosoft.com",
+                            "userPrincipalName": "Adams@M365x214355.onmicrosoft.com",
+                            "id": "6e7b768e-07e2-4810-8459-485f84f8f204"
+                        }
+                    ]
+                },
+                {
+                    "@odata.context": "https://graph.microsoft.com/v1.0/$metadata#users",
+                    "@odata.deltaLink": "https://graph.microsoft.com/v1.0/users/delta?$deltatoken=token1",
+                    "value": [
+                        {
+                            "displayName": "Printer",
+                            "mail": None,
+                            "userPrincipalName": "printer@M365x214355.onmicrosoft.com",
+                            "id": "87d349ed-44d7-43e1-9a83-5f2406dee5bd"
+                        }
+                    ]
+                },
+            ],
             [{
                 'mail': 'Adams@M365x214355.onmicrosoft.com',
                 'userId': '6e7b768e-07e2-4810-8459-485f84f8f204',
@@ -68,12 +79,100 @@ def create_users_obj():
         )
     ],
 )
-def test_get_all_users(requests_mock, request_return_value, source_users):
+def test_get_all_users(requests_mock, tmp_path, request_return_values, source_users):
     """Test for getting all users from Microsoft Teams"""
-    user_obj = create_users_obj()
-    request_header = {"Authorization": "Bearer token"}
+    # Setup
+    directory_path = str(tmp_path / "users.json")
+    user_obj = create_users_obj(directory_path)
     requests_mock.get(
-        'https://graph.microsoft.com/v1.0/users', headers=request_header, json=request_return_value, status_code=200
+        'https://graph.microsoft.com/v1.0/users/delta',
+        [{"json": response, "status_code": 200} for response in request_return_values]
     )
+
+    # Execute
     target_users = user_obj.get_all_users()
+
+    # Assert
     assert source_users == target_users
+    assert "$select=id,displayName,mail,userPrincipalName" in requests_mock.request_history[0].url
+    with open(directory_path, encoding="utf-8") as directory_file:
+        directory = json.load(directory_file)
+    assert directory["delta_link"] == "https://graph.microsoft.com/v1.0/users/delta?$deltatoken=token1"
+    assert len(directory["users"]) == 2
+
+
+def test_get_all_users_from_delta_link(tmp_path):
+    """Test that only the changed users are fetched when the directory is stored locally"""
+    # Setup
+    directory_path = str(tmp_path / "users.json")
+    with open(directory_path, "w", encoding="utf-8") as directory_file:
+        json.dump({
+            "users": {
+                "user1": {"id": "user1", "displayName": "User 1", "mail": "user1@test.com", "userPrincipalName": "u1"},
+                "user2": {"id": "user2", "displayName": "User 2", "mail": "user2@test.com", "userPrincipalName": "u2"},
+            },
+            "delta_link": "delta_link1",
+        }, directory_file)
+    user_obj = create_users_obj(directory_path)
+    user_obj.client.get_users = Mock(return_value=(
+        [{"id": "user1", "@removed": {"reason": "changed"}}, {"id": "user2", "displayName": "Renamed"}],
+        "delta_link2"
+    ))
+
+    # Execute
+    user_obj.get_all_users()
+    target_users = user_obj.get_all_users()
+
+    # Assert
+    user_obj.client.get_users.assert_called_once_with("delta_link1")
+    assert target_users == [
+        {"mail": "user2@test.com", "userId": "user2", "displayName": "Renamed", "mailAddress": "u2"}
+    ]
+
+
+def test_get_all_users_when_delta_link_expires(tmp_path):
+    """Test that all the users are fetched again when the stored delta link is not accepted"""
+    # Setup
+    directory_path = str(tmp_path / "users.json")
+    with open(directory_path, "w", encoding="utf-8") as directory_file:
+        json.dump({
+            "users": {"user1": {"id": "user1", "displayName": "User 1", "mail": "user1@test.com"}},
+            "delta_link": "delta_link1",
+        }, directory_file)
+    user_obj = create_users_obj(directory_path)
+    user_obj.client.get_users = Mock(side_effect=[
+        (None, None), ([{"id": "user2", "displayName": "User 2", "mail": "user2@test.com"}], "delta_link2")
+    ])
+
+    # Execute
+    target_users = user_obj.get_all_users()
+
+    # Assert
+    assert [user["userId"] for user in target_users] == ["user2"]
+    user_obj.client.get_users.assert_called_with("https://graph.microsoft.com/v1.0/users/delta")
+
+
+def test_get_all_users_when_fetch_fails(tmp_path):
+    """Test that the users stored locally are used when the users could not be fetched, and that an error is raised
+    when no user is stored"""
+    # Setup
+    directory_path = str(tmp_path / "users.json")
+    user_obj = create_users_obj(directory_path)
+    user_obj.client.get_users = Mock(return_value=(None, None))
+
+    # Execute and Assert
+    with pytest.raises(ResponseException):
+        user_obj.get_all_users()
+
+    # Setup
+    with open(directory_path, "w", encoding="utf-8") as directory_file:
+        json.dump({
+            "users": {"user1": {"id": "user1", "displayName": "User 1", "mail": "user1@test.com"}},
+            "delta_link": "delta_link1",
+        }, directory_file)
+
+    # Execute
+    target_users = user_obj.get_all_users()
+
+    # Assert
+    assert [user["userId"] for user in target_users] == ["user1"]
@@ -160,6 +160,42 @@ def test_split_documents_into_equal_chunks():
     assert len(target_chunk) == source_chunk
 
 
+def test_get_document_size():
+    """Tests that the size of a document is the size of its JSON encoding with its separator"""
+    # Setup
+    document = {"id": "1", "body": "caf\u00e9"}
+
+    # Execute
+    document_size = utils.get_document_size(document)
+
+    # Assert
+    assert document_size == len('{"id": "1", "body": "caf\\u00e9"}') + 1
+
+
+def test_split_documents_into_equal_bytes_with_document_sizes():
+    """Tests that the given document sizes are used instead of computing them again"""
+    # Setup
+    document_to_split = [{"name": "dummy1"}, {"name": "dummy2"}, {"name": "dummy3"}]
+
+    # Execute
+    returned_document = utils.split_documents_into_equal_bytes(document_to_split, 100, [60, 30, 60])
+
+    # Assert
+    assert returned_document == [[{"name": "dummy1"}, {"name": "dummy2"}], [{"name": "dummy3"}]]
+
+
+def test_split_documents_into_batches():
+    """Tests that the batches are limited by both the number of documents and their size"""
+    # Setup
+    document_to_split = [{"name": f"dummy{count}"} for count in range(5)]
+
+    # Execute
+    returned_document = utils.split_documents_into_batches(document_to_split, 2, 100, [10, 10, 10, 60, 40])
+
+    # Assert
+    assert returned_document == [document_to_split[0:2], document_to_split[2:4], document_to_split[4:]]
+
+
 def test_split_documents_into_equal_bytes_with_lowest_possible_size():
     """Tests split functionality based on size"""
     # Setup
@@ -275,3 +311,30 @@ def test_get_data_from_http_response(response):
 
     # Assert
     assert source_document == target_document
+
+
+def test_encode_sharing_url():
+    """Test that encode the url of a file into a sharing token"""
+    target_token = utils.encode_sharing_url(
+        "https://onedrive.live.com/redir?resid=1231244193912!12&authKey=1201919!12921!1"
+    )
+    assert target_token == (
+        "u!aHR0cHM6Ly9vbmVkcml2ZS5saXZlLmNvbS9yZWRpcj9yZXNpZD0xMjMxMjQ0MTkzOTEyITEyJmF1dGhLZXk9MTIwMTkxOSExMjkyMSEx"
+    )
+
+
+def test_deduplicate_documents():
+    """Tests that the most recently updated version of the duplicate documents is kept"""
+    # Setup
+    documents = [
+        {"id": "1", "type": "Meeting", "last_updated": "2022-01-01T00:00:00Z", "body": "old"},
+        {"id": "1", "type": "User Chat Messages", "last_updated": "2022-01-01T00:00:00Z"},
+        {"id": "1", "type": "Meeting", "last_updated": "2022-02-01T00:00:00Z", "body": "new"},
+        {"id": "1", "type": "Meeting", "last_updated": "2021-12-01T00:00:00Z", "body": "older"},
+    ]
+
+    # Execute
+    unique_documents = utils.deduplicate_documents(documents)
+
+    # Assert
+    assert unique_documents == [documents[2], documents[1]]